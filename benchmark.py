@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import glob
+import math
+import time
+import argparse
+import multiprocessing
+from vehicle_routing.vrp import VRP
+import vehicle_routing.cvrplib as cvrplib
+from vehicle_routing.metrics import peak_rss_mb
+
+def gap(cost, bks):
+    return round(100 * (cost - bks) / bks, 4)
+
+def run_instance(vrp_path, time_limit, fleet_slack, solver_kwargs):
+    """
+    Solve a single CVRPLIB instance with process_VRP and return its benchmark record.
+    Meant to run in a fresh process so that the peak memory belongs to this run alone.
+    """
+    instance = cvrplib.read_instance(vrp_path)
+    bks_routes, bks = cvrplib.read_solution(os.path.splitext(vrp_path)[0] + '.sol')
+
+    num_vehicles = max(len(bks_routes), cvrplib.num_vehicles_from_name(instance['name']) or 0)
+    num_vehicles = math.ceil(num_vehicles * (1 + fleet_slack))
+    depot, orders, vehicles = cvrplib.build_problem(instance, num_vehicles=num_vehicles)
+
+    curve = []
+
+    def on_solution(routing):
+        # The solver objective is scaled and includes the drop penalties, so the gap
+        # is taken on the EUC_2D cost of the routes, as for the final solution
+        cost = cvrplib.route_cost(instance, cvrplib.routes_from_search(vrp_instance, routing))
+        curve.append({
+            'time': round(time.perf_counter() - start, 4),
+            'objective': routing.CostVar().Value(),
+            'cost': cost,
+            'gap': gap(cost, bks)
+        })
+
+    vrp_instance = VRP(depot, orders, vehicles)
+    start = time.perf_counter()
+    result = vrp_instance.process_VRP(edge_weight_type='euclidean', time_limit=time_limit,
+                solution_callback=on_solution, **solver_kwargs)
+    wall_time = time.perf_counter() - start
+
+    record = {
+        'instance': instance['name'],
+        'dimension': instance['dimension'],
+        'capacity': instance['capacity'],
+        'num_vehicles': num_vehicles,
+        'time_limit': time_limit,
+        'bks': bks,
+        'wall_time': round(wall_time, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'phases': vrp_instance.metrics.phases,
+        'curve': curve
+    }
+
+    if result is None:
+        record.update({'cost': None, 'gap': None, 'dropped': len(orders), 'routes': 0})
+        return record
+
+    routes = cvrplib.routes_from_vrp(vrp_instance)
+    cost = cvrplib.route_cost(instance, routes)
+    record.update({
+        'cost': cost,
+        'gap': gap(cost, bks),
+        'dropped': len(orders) - sum(len(route) for route in routes),
+        'routes': len(routes)
+    })
+    return record
+
+def _run_instance(args):
+    return run_instance(*args)
+
+def run_benchmark(instance_paths, time_limits, fleet_slack=0.1, **solver_kwargs):
+    """
+    Benchmark process_VRP over CVRPLIB instances, once per (instance, time limit) pair.
+    Every run is solved in its own process.
+
+    Returns:
+        List of benchmark records (see run_instance()).
+    """
+    jobs = [(path, time_limit, fleet_slack, solver_kwargs) for path in instance_paths for time_limit in time_limits]
+    # maxtasksperchild=1 gives every run a fresh process and therefore its own peak RSS
+    with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.map(_run_instance, jobs, chunksize=1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the solver on the bundled CVRPLIB X instances.')
+    parser.add_argument('instances', nargs='*',
+        default=sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input', 'X', '*.vrp'))),
+        help='.vrp files to solve, each with its .sol next to it (default: input/X/*.vrp)')
+    parser.add_argument('--time-limits', type=int, nargs='+', default=[30], help='time limits in seconds')
+    parser.add_argument('--fleet-slack', type=float, default=0.1, help='extra vehicles as a fraction of the BKS fleet')
+    parser.add_argument('--first-sol-strategy', default='AUTOMATIC')
+    parser.add_argument('--metaheuristic', default='AUTOMATIC')
+    parser.add_argument('--output', default='benchmark_results.json', help='path of the JSON report')
+    args = parser.parse_args()
+
+    records = run_benchmark(args.instances, args.time_limits, fleet_slack=args.fleet_slack,
+                    first_sol_strategy=args.first_sol_strategy, initial_metaheuristic=args.metaheuristic,
+                    transit_matrix=True)
+    with open(args.output, 'w') as f:
+        json.dump({'created': time.time(), 'results': records}, f, indent=2)
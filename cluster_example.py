@@ -15,29 +15,10 @@ if __name__ == '__main__':
     mock_pickup_filename = os.path.dirname(__file__) + r'\mock\pickups_testing.xlsx'
     depot, orders, vehicles = helper.generate_problem_from_file(mock_dispatch_filename, mock_pickup_filename)
     
-    num_orders = len(orders)
     points_per_cluster = 50
-    clusters = clustering.clustered(depot, orders, points_per_cluster)
-    vehicles_per_cluster= math.ceil(len(vehicles)/len(clusters))
-    all_routes=[]
-
-    clustered_total_distance = 0
-    for i in range(len(clusters)):
-        subvrp_instance = VRP(depot, clusters[i], vehicles[i*vehicles_per_cluster: min((i+1)*vehicles_per_cluster, len(vehicles))]) #check for the case: if no of clusters not a factor of no of vehicles
-        manager, routing, solution = subvrp_instance.process_VRP()
-        plan_output, dropped, total_distance = helper.vehicle_output_string(manager, routing, solution)
-        clustered_total_distance += total_distance
-        routes_list = subvrp_instance.get_routes()
-        all_routes.append(routes_list)
-
-    new_routes_list = {}
-    i = 0
-    for route in all_routes:
-        for key, route in route.items():
-            new_routes_list[i] = route
-            i += 1
-
-    print("clusterd total distance: ", clustered_total_distance)
+    routes_list, timings = clustering.solve_clustered(depot, orders, vehicles, points_per_cluster)
+    for timing in timings:
+        print("cluster {cluster}: {orders} orders, {vehicles} vehicles, solved in {time:.2f}s".format(**timing))
     # manager, routing, solution = vrp_instance.process_VRP(edge_weight_type='osrm')
     # manager, routing, solution = vrp_instance.process_VRP(edge_weight_type='haversine')
 
@@ -58,10 +39,9 @@ if __name__ == '__main__':
 
     # vrp_instance.vehicle_output_plot(block=False)
 
-    vrp_instance=VRP(depot, orders, vehicles, RoutesList(new_routes_list))
+    vrp_instance=VRP(depot, orders, vehicles, routes_list)
     
-    route_list = vrp_instance.routes_list
-    for vehicle_idx, route in routes_list.items():
+    for vehicle_idx, route in vrp_instance.get_routes().items():
         if route == -1:
             continue
         for i in range(3):
@@ -0,0 +1,45 @@
+import os
+import sys
+import argparse
+import subprocess
+
+# Modules the headless solve path (Customers, Fleet, process_VRP) must not import
+HEAVY_MODULES = ['pandas', 'geopandas', 'matplotlib', 'shapefile', 'requests', 'sklearn', 'networkx', 'scipy', 'shapely']
+
+def measure(module, python=sys.executable):
+    """
+    Import module in a fresh interpreter under -X importtime.
+
+    Returns:
+        (total import time of the module in ms, list of heavy modules it imported)
+    """
+    code = 'import sys, {0}; print(",".join(m for m in {1!r} if m in sys.modules))'.format(module, HEAVY_MODULES)
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            total_us = int(fields[1])
+
+    heavy = [m for m in result.stdout.strip().split(',') if m]
+    return total_us / 1000, heavy
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the import time of the solver against a budget.')
+    parser.add_argument('--module', default='vehicle_routing.vrp')
+    parser.add_argument('--budget-ms', type=float, default=500)
+    parser.add_argument('--runs', type=int, default=5, help='the best of this many runs is reported')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best_ms = min(total_ms for total_ms, heavy in runs)
+    heavy = runs[0][1]
+
+    print('import {0}: {1:.1f} ms (budget {2:.0f} ms)'.format(args.module, best_ms, args.budget_ms))
+    if heavy:
+        print('heavy modules imported: ' + ', '.join(heavy))
+
+    sys.exit(0 if best_ms <= args.budget_ms and not heavy else 1)
@@ -3,43 +3,109 @@ import streamlit as st
 st.set_page_config(page_title="Route Formation", page_icon="🛵")
 
 import os
-import math
-import random 
-import numpy as np
-import networkx as nx
-import geopandas as gpd
-from shapely.geometry import Point
-import matplotlib.pyplot as plt
-import shapefile as shp
-
-from vehicle_routing.vrp import VRP 
+import time
+import tempfile
+import threading
+
+from vehicle_routing.vrp import VRP
+from vehicle_routing.city_graph import CityGraph
+from vehicle_routing.matrix_store import MatrixStore
 import vehicle_routing.helper as helper
+import vehicle_routing.plotting as plotting
+
+TIME_LIMIT = 300
+MATRIX_DIR = os.path.join(tempfile.gettempdir(), 'vrp_matrices')
+
+@st.cache_data(show_spinner="Reading the orders...")
+def load_problem(delivery_file, pickup_file):
+    # Keyed by the contents of uploaded files; every caller gets its own copy of the orders
+    return helper.generate_problem_from_file(delivery_file, pickup_file)
+
+@st.cache_resource(show_spinner="Loading the city layer...")
+def load_city_graph():
+    city_graph = CityGraph()
+    city_graph.city
+    return city_graph
+
+@st.cache_resource
+def load_matrix_store():
+    # Shared by every session: the store locks its files itself
+    return MatrixStore(MATRIX_DIR)
+
+class BackgroundSolve():
+    """
+    A process_VRP run in a worker thread, recording every improved solution and
+    stopped at the next solution once stop is set.
+
+    The solve keeps the Python transit callbacks (transit_matrix=False): the solver
+    holds the GIL while it searches, and the callbacks are what hand it back to the
+    page regularly.
+    """
+    def __init__(self, vrp_instance, isReroute=False, time_limit=TIME_LIMIT):
+        self.vrp_instance = vrp_instance
+        self.time_limit = time_limit
+        self.improvements = []
+        self.result = None
+        self.error = None
+        self.stop = threading.Event()
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.run, args=(isReroute, load_matrix_store()), daemon=True)
+        self.thread.start()
+
+    def run(self, isReroute, matrix_store):
+        try:
+            self.result = self.vrp_instance.solve_anytime(on_solution=self.improvements.append, stop=self.stop,
+                            edge_weight_type='haversine', isReroute=isReroute, time_limit=self.time_limit,
+                            matrix_store=matrix_store)
+        except Exception as e:
+            self.error = e
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
 
 def get_vrp_instance(delivery_file, pickup_file) -> None:
-    depot, orders, vehicles = helper.generate_problem_from_file(delivery_file, pickup_file)
+    depot, orders, vehicles = load_problem(delivery_file, pickup_file)
     vrp_instance = VRP(depot, orders, vehicles)
+    vrp_instance.city_graph = load_city_graph()
     return vrp_instance
 
-def run_vrp(vrp_instance, isReroute=False):
-    manager, routing, solution = vrp_instance.process_VRP(edge_weight_type='haversine', isReroute=isReroute)
-    plan_output, dropped, total_distance = helper.vehicle_output_string(manager, routing, solution)
-    print(plan_output)
-    print('dropped nodes: ' + ', '.join(dropped))
-    print("Total Distance: ", total_distance)
-    # vrp_instance.vehicle_output_plot(block=False)
-    fig = vrp_instance.vehicle_return_plot(city_graph=True)
-    print("plot created")
-    st.pyplot(fig)
-   
 def plot(vrp_instance):
-    fig = vrp_instance.vehicle_return_plot(city_graph=True)
-    print("plot created")
-    st.pyplot(fig)
+    st.session_state['plot'] = plotting.to_png(vrp_instance.vehicle_return_plot(city_graph=True))
 
 def plot_scatter(vrp_instance, dynamic=False):
-    fig = vrp_instance.vehicle_return_scatter(city_graph=True, dynamic=dynamic)
-    print("plot created")
-    st.pyplot(fig)
+    st.session_state['plot'] = plotting.to_png(vrp_instance.vehicle_return_scatter(city_graph=True, dynamic=dynamic))
+
+def show_solve(solve):
+    """
+    Show the progress of a running solve, rerunning the page until it is over, or
+    the routes once it is.
+    """
+    if solve.running:
+        elapsed = time.time() - solve.start_time
+        text = "Searching... {0:.0f}s".format(elapsed)
+        if solve.improvements:
+            text += ", best objective {0}".format(solve.improvements[-1].objective)
+        st.progress(min(elapsed / solve.time_limit, 1.0), text=text)
+        if solve.improvements:
+            st.line_chart({'objective': [improvement.objective for improvement in solve.improvements]})
+        if st.button("Cancel", disabled=solve.stop.is_set()):
+            solve.stop.set()
+        time.sleep(0.5)
+        st.rerun()
+
+    del st.session_state['solve']
+    if solve.error is not None:
+        st.error("Routing failed: {0}".format(solve.error))
+    elif solve.result is None:
+        st.error("No solution found")
+    else:
+        manager, routing, solution = solve.result
+        plan_output, dropped, total_distance = helper.vehicle_output_string(manager, routing, solution)
+        print(plan_output)
+        print('dropped nodes: ' + ', '.join(dropped))
+        print("Total Distance: ", total_distance)
+        plot(solve.vrp_instance)
 
 def st_ui():
     st.title("Capacitated Vehicle Routing with Dynamic Pickups")
@@ -50,43 +116,52 @@ def st_ui():
     if pickup_file is None:
         pickup_file = './mock/pickups_testing.xlsx'
 
-    load_button = st.sidebar.button("Load")
+    # The routes can't change under a running solve
+    solving = 'solve' in st.session_state
+
+    load_button = st.sidebar.button("Load", disabled=solving)
 
     st.sidebar.header("Generate Routes")
-    route_button = st.sidebar.button("Route")
+    route_button = st.sidebar.button("Route", disabled=solving)
 
     st.sidebar.header("Skip Time")
     minutes_slider = st.sidebar.slider("Pick the amount of minutes to skip", 0, 60, 30, 5)
     if 'vrp_instance' not in st.session_state:
         vrp_instance = get_vrp_instance(delivery_file=delivery_file, pickup_file=pickup_file)
         st.session_state['vrp_instance'] = vrp_instance
-    
-    skip_time_button = st.sidebar.button("Skip Time")
+
+    skip_time_button = st.sidebar.button("Skip Time", disabled=solving)
 
     st.sidebar.header("Add Dynamic Pickups")
-    dynamic_pickup_button = st.sidebar.button("Add Dynamic")
+    dynamic_pickup_button = st.sidebar.button("Add Dynamic", disabled=solving)
 
     st.sidebar.header("Reroute Routes")
-    reroute_button = st.sidebar.button("Reroute")
+    reroute_button = st.sidebar.button("Reroute", disabled=solving)
 
     if load_button:
         st.session_state['vrp_instance'] = get_vrp_instance(delivery_file=delivery_file, pickup_file=pickup_file)
         plot_scatter(st.session_state['vrp_instance'])
 
     if route_button:
-        run_vrp(st.session_state['vrp_instance'])
+        st.session_state['solve'] = BackgroundSolve(st.session_state['vrp_instance'])
 
     if skip_time_button:
         st.session_state['vrp_instance'].routes_list.skip_time(minutes_slider)
         plot(st.session_state['vrp_instance'])
-    
+
     if dynamic_pickup_button:
         for i in range(5):
             st.session_state['vrp_instance'].add_dynamic_order(helper.generate_random_order(type=2))
         plot(st.session_state['vrp_instance'])
 
     if reroute_button:
-        run_vrp(st.session_state['vrp_instance'], isReroute=True)
+        st.session_state['solve'] = BackgroundSolve(st.session_state['vrp_instance'], isReroute=True)
+
+    if 'solve' in st.session_state:
+        show_solve(st.session_state['solve'])
+
+    if 'plot' in st.session_state:
+        st.image(st.session_state['plot'])
 
 
 if __name__ == '__main__':
@@ -40,5 +40,7 @@ if __name__ == '__main__':
     print('dropped nodes: ' + ', '.join(dropped))
     print('Total Distance: ', total_distance)
 
-    vrp_instance.export_shapefile(shapefilename='_reroute')
-    vrp_instance.vehicle_output_plot_routes(shapefilename='_reroute')
\ No newline at end of file
+    export_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shapefile')
+    os.makedirs(export_dir, exist_ok=True)
+    geometries = vrp_instance.export_routes(os.path.join(export_dir, '_reroute.gpkg'))
+    vrp_instance.vehicle_output_plot_routes(geometries=geometries)
\ No newline at end of file
@@ -0,0 +1,51 @@
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.anytime import Plateau
+
+def random_instance(num_orders=60):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=num_orders)
+    return VRP(depot, orders, vehicles)
+
+def test_iter_solutions_yields_improving_objectives():
+    vrp_instance = random_instance()
+    solutions = list(vrp_instance.iter_solutions(time_limit=2, transit_matrix=True))
+
+    objectives = [solution.objective for solution in solutions]
+    assert len(objectives) >= 2
+    assert all(a > b for a, b in zip(objectives, objectives[1:]))
+    assert all(a <= b for a, b in zip([s.elapsed for s in solutions], [s.elapsed for s in solutions][1:]))
+    # The last one is the solution the instance ends up with
+    assert objectives[-1] == vrp_instance.metrics.objective
+    routed = {node for solution in solutions[-1:] for route in solution.routes.values() for node in route[1:-1]}
+    assert routed == {order for order in vrp_instance.orders if order.status == 2}
+
+def test_breaking_out_stops_the_search():
+    vrp_instance = random_instance()
+    solutions = vrp_instance.iter_solutions(time_limit=30, transit_matrix=True)
+    solution = next(solutions)
+    solutions.close()
+    # Stopped at the first solution rather than running for the time limit
+    assert vrp_instance.metrics.phases['total'] < 10
+    assert vrp_instance.metrics.objective == solution.objective
+
+def test_on_solution_returning_false_stops_the_search():
+    vrp_instance = random_instance()
+    seen = []
+    assert vrp_instance.solve_anytime(on_solution=lambda improvement: seen.append(improvement) or False,
+                time_limit=30, transit_matrix=True) is not None
+    assert len(seen) == 1
+    assert vrp_instance.metrics.phases['total'] < 10
+
+def test_plateau():
+    plateau = Plateau(window=1.0, min_improvement=0.01)
+    plateau.update(0.0, 1000)
+    plateau.update(0.5, 900)
+    assert not plateau.reached(1.2)
+    plateau.update(1.6, 895)
+    # Less than 1% better than a second ago
+    assert plateau.reached(1.6)
+    assert not plateau.reached(0.9)
@@ -0,0 +1,50 @@
+import random
+import numpy as np
+import pytest
+import shapely
+import vehicle_routing.helper as helper
+from vehicle_routing.city_graph import CityGraph
+
+@pytest.fixture(scope='module')
+def orders():
+    random.seed(0)
+    np.random.seed(0)
+    return [helper.generate_random_order() for _ in range(300)]
+
+@pytest.fixture
+def city_graph(tmp_path, orders):
+    return CityGraph(orders, cache_dir=str(tmp_path))
+
+def test_adjacency_matches_pairwise_touches(city_graph):
+    geometries = np.asarray(city_graph.ward_tree.geometries)
+    touches = shapely.touches(geometries[:, None], geometries[None, :])
+    np.fill_diagonal(touches, False)
+    assert np.array_equal(city_graph.adjacency.toarray().astype(bool), touches)
+    assert city_graph.G.number_of_edges() == touches.sum() // 2
+
+def test_ward_assignment_matches_a_point_in_polygon_scan(city_graph, orders):
+    geometries = city_graph.ward_tree.geometries
+    expected = []
+    for order in orders:
+        point = shapely.Point(order.lon, order.lat)
+        containing = [i for i, geometry in enumerate(geometries) if geometry.contains(point)]
+        expected.append(containing[-1] if containing else -1)
+    assert city_graph.assign_wards().tolist() == expected
+    assert (city_graph.assign_wards() >= 0).any()
+
+def test_the_cache_gives_the_same_wards_and_priorities(tmp_path, orders):
+    parsed = CityGraph(orders, cache_dir=str(tmp_path))
+    parsed_priorities = parsed.get_priorities()
+    assert parsed.cache_file().startswith(str(tmp_path))
+
+    cached = CityGraph(orders, cache_dir=str(tmp_path))
+    cached_priorities = cached.get_priorities()
+    # Read from the cache, the GeoJSON is not parsed again
+    assert cached._city is None
+
+    assert np.array_equal(cached.ward_ids, parsed.ward_ids)
+    assert (cached.adjacency != parsed.adjacency).nnz == 0
+    assert np.array_equal(cached.areas, parsed.areas)
+    assert np.array_equal(cached.centroids, parsed.centroids)
+    assert cached.assign_wards().tolist() == parsed.assign_wards().tolist()
+    assert cached_priorities == pytest.approx(parsed_priorities)
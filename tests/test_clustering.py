@@ -0,0 +1,84 @@
+import math
+import random
+import numpy as np
+import pytest
+import vehicle_routing.helper as helper
+import vehicle_routing.clustering as clustering
+
+def random_problem(num_orders, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    return helper.generate_random_problem(num_orders=num_orders)
+
+def routed_orders(routes_list):
+    return [node for route in routes_list.routes_list.values() if route != -1 for node in route.route[1:-1]]
+
+def test_split_vehicles_is_proportional():
+    vehicles = list(range(10))
+    blocks = clustering.split_vehicles(vehicles, [[0] * 10, [0] * 30, [0] * 20])
+    assert [len(block) for block in blocks] == [2, 5, 3]
+    assert sum(blocks, []) == vehicles
+    with pytest.raises(ValueError):
+        clustering.split_vehicles(vehicles[:2], [[0]] * 3)
+
+def test_solve_clustered_routes_every_order_once():
+    depot, orders, vehicles = random_problem(100)
+    routes_list, timings = clustering.solve_clustered(depot, orders, vehicles, 50, workers=1,
+                                time_limit=1, transit_matrix=True)
+
+    assert [t['orders'] for t in timings] == [50, 50]
+    assert sorted(routes_list.routes_list) == list(range(len(vehicles)))
+    routed = routed_orders(routes_list)
+    assert len(routed) == len({id(o) for o in routed})
+    assert {id(o) for o in routed} == {id(o) for o in orders if o.status == 2}
+    # The orders of a route are the originals, assigned to the vehicle of the route
+    for vehicle_idx, route in routes_list.routes_list.items():
+        if route != -1:
+            assert all(node.vehicle is vehicles[vehicle_idx] for node in route.route[1:-1])
+
+def baseline_clusters(depot, orders, points_per_cluster):
+    # The sweep loop the vectorized one replaced, without its plot and copies
+    polar_angles = (np.arctan2(np.array([o.lon - depot.lon for o in orders]),
+                        np.array([o.lat - depot.lat for o in orders])) * 180 / np.pi).tolist()
+    polar_angles = [a + 360 if a < 0 else a for a in polar_angles]
+    orders = [order for _, order in sorted(zip(polar_angles, orders))]
+    polar_angles = sorted(polar_angles)
+
+    clusters_n = len(orders) // points_per_cluster
+    points_per_cluster = math.ceil(len(orders) / clusters_n)
+    cluster = []
+    min_spread = math.inf
+    for angle in range(0, 360, 5):
+        later = [a for a in polar_angles if a > angle]
+        if not later:
+            break
+        idx = polar_angles.index(later[0])
+        temp = orders[idx:] + orders[:idx]
+        temp_p = polar_angles[idx:] + polar_angles[:idx]
+        clusters_temp = [temp[c * points_per_cluster: (c + 1) * points_per_cluster] for c in range(clusters_n)]
+        m = max(np.std(temp_p[c * points_per_cluster: (c + 1) * points_per_cluster]) for c in range(clusters_n))
+        if m < min_spread:
+            min_spread = m
+            cluster = clusters_temp
+    return cluster
+
+@pytest.mark.parametrize('num_orders, points_per_cluster, seed', [(100, 25, 0), (237, 40, 1), (180, 60, 2)])
+def test_sweep_matches_the_baseline_loop(num_orders, points_per_cluster, seed):
+    depot, orders, _ = random_problem(num_orders, seed)
+    clusters = clustering.clustered(depot, orders, points_per_cluster)
+    expected = baseline_clusters(depot, orders, points_per_cluster)
+    assert [[id(o) for o in cluster] for cluster in clusters] == [[id(o) for o in cluster] for cluster in expected]
+
+def test_solve_decomposed_keeps_every_order_and_only_improvements():
+    depot, orders, vehicles = random_problem(100)
+    routes_list, stats = clustering.solve_decomposed(depot, orders, vehicles, 25, time_budget=8, workers=2,
+                                window_routes=2, transit_matrix=True)
+
+    routed = routed_orders(routes_list)
+    assert len(routed) == len({id(o) for o in routed})
+    assert {id(o) for o in routed} == {id(o) for o in orders if o.status == 2}
+    assert len(stats['clusters']) == 4
+    assert stats['rounds']
+    for round_stats in stats['rounds']:
+        assert round_stats['improved'] <= round_stats['windows']
+        assert round_stats['gain'] >= 0 and (round_stats['gain'] > 0) == (round_stats['improved'] > 0)
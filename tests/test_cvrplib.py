@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import benchmark
+import vehicle_routing.cvrplib as cvrplib
+from vehicle_routing.customers import Customers
+
+INSTANCE = os.path.join(os.path.dirname(__file__), '..', 'input', 'X', 'X-n125-k30.vrp')
+SOLUTION = os.path.splitext(INSTANCE)[0] + '.sol'
+
+def test_best_known_solution_is_feasible_and_costs_its_stated_cost():
+    instance = cvrplib.read_instance(INSTANCE)
+    assert (instance['name'], instance['dimension'], instance['capacity'], instance['depot']) == ('X-n125-k30', 125, 188, 1)
+    assert len(instance['coords']) == len(instance['demands']) == 125
+
+    routes, cost = cvrplib.read_solution(SOLUTION)
+    assert len(routes) == cvrplib.num_vehicles_from_name(instance['name']) == 30
+    assert sorted(sum(routes, [])) == list(range(2, 126))
+    assert all(sum(instance['demands'][c] for c in route) <= instance['capacity'] for route in routes)
+    assert cvrplib.route_cost(instance, routes) == cost == 55539
+
+def test_euclidean_matrix_is_in_the_units_of_the_instance():
+    instance = cvrplib.read_instance(INSTANCE)
+    depot, orders, vehicles = cvrplib.build_problem(instance)
+    assert len(orders) == 124 and len(vehicles) == 30
+    assert [int(order.AWB) for order in orders] == list(range(2, 126))
+
+    customers = Customers(depot, orders)
+    customers.make_distance_mat(method='euclidean')
+    ids = [instance['depot']] + [int(order.AWB) for order in orders]
+    expected = np.array([[cvrplib.euc_2d(instance['coords'][a], instance['coords'][b]) for b in ids] for a in ids])
+    # Rounded up rather than to the nearest integer
+    assert np.abs(customers.distmat - expected).max() <= 1
+
+def test_benchmark_run_records_a_feasible_solution():
+    record = benchmark.run_instance(INSTANCE, 2, 0.1, {'transit_matrix': True})
+    assert record['instance'] == 'X-n125-k30' and record['num_vehicles'] == 33
+    assert record['dropped'] == 0
+    assert record['cost'] >= record['bks'] and record['gap'] >= 0
+    # The routes kept are the best of those the search went through
+    assert min(point['cost'] for point in record['curve']) == record['cost']
@@ -0,0 +1,84 @@
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+import numpy as np
+import geopandas as gpd
+import pytest
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+
+class StubRoute(BaseHTTPRequestHandler):
+    """
+    The route service of OSRM: a leg goes straight to the midpoint and on to the
+    destination.
+    """
+    legs = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        (source, destination) = [list(map(float, c.split(','))) for c in urlsplit(self.path).path.split('/')[-1].split(';')]
+        self.legs.append((tuple(source), tuple(destination)))
+        middle = [(source[0] + destination[0]) / 2, (source[1] + destination[1]) / 2]
+        body = json.dumps({'code': 'Ok', 'routes': [{'geometry': {'coordinates': [source, middle, destination]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def base_url():
+    StubRoute.legs.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubRoute)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{0}/'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def vrp_instance():
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=30)
+    vrp_instance = VRP(depot, orders, vehicles)
+    assert vrp_instance.process_VRP(time_limit=1, transit_matrix=True) is not None
+    return vrp_instance
+
+def used_routes(vrp_instance):
+    return {vehicle_idx: route for vehicle_idx, route in vrp_instance.get_routes().items() if route != -1}
+
+def test_routes_follow_the_legs_of_their_stops(vrp_instance, base_url):
+    geometries = vrp_instance.route_geometries(base_url=base_url)
+    routes = used_routes(vrp_instance)
+    assert geometries['Vehicle'].tolist() == list(routes)
+
+    for line, route in zip(geometries.geometry, routes.values()):
+        stops = [(node.lon, node.lat) for node in route.route]
+        points = list(line.coords)
+        # Two points per leg, and every stop on the line in the order of the route
+        assert len(points) == 2 * (len(stops) - 1) + 1
+        assert points[::2] == pytest.approx(stops)
+
+def test_only_the_changed_legs_are_fetched_again(vrp_instance, base_url):
+    vrp_instance.route_geometries(base_url=base_url)
+    first = len(StubRoute.legs)
+    assert first == len(set(StubRoute.legs))
+
+    vrp_instance.route_geometries(base_url=base_url)
+    assert len(StubRoute.legs) == first
+
+    # Two stops of a route swapped: the three legs around them change
+    route = next(route for route in used_routes(vrp_instance).values() if len(route.route) > 4)
+    route.route[1], route.route[2] = route.route[2], route.route[1]
+    vrp_instance.route_geometries(base_url=base_url)
+    assert 0 < len(StubRoute.legs) - first <= 3
+
+def test_export_routes_writes_a_geopackage(vrp_instance, base_url, tmp_path):
+    path = str(tmp_path / 'routes.gpkg')
+    geometries = vrp_instance.export_routes(path, base_url=base_url)
+    written = gpd.read_file(path, layer='routes')
+    assert written['Route'].tolist() == geometries['Route'].tolist()
+    assert written.geometry.geom_equals(geometries.geometry).all()
@@ -0,0 +1,80 @@
+import random
+import numpy as np
+import pytest
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.vehicle import Vehicle
+from vehicle_routing.customers import Order
+
+MAX_ROUTE_DISTANCE = 150_000
+
+def solved_instance(**solver_kwargs):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=50)
+    # Spare vehicles, so that there is room for the inserted orders
+    vehicles += [Vehicle(25, start=depot, end=depot) for _ in range(2)]
+    vrp_instance = VRP(depot, orders, vehicles)
+    assert vrp_instance.process_VRP(time_limit=1, transit_matrix=True, **solver_kwargs) is not None
+    return vrp_instance
+
+def route_length(vrp_instance, route):
+    path = [node.current_vrp_index for node in route.route]
+    return int(vrp_instance.customers.distmat[path[:-1], path[1:]].sum())
+
+def test_insertion_keeps_the_limits_of_the_solve():
+    vrp_instance = solved_instance(max_route_distance=MAX_ROUTE_DISTANCE)
+    assert vrp_instance.solve_limits['max_route_distance'] == MAX_ROUTE_DISTANCE
+
+    # More than 100km from the depot: a detour to it breaks the limit of any route
+    far = Order(1, [vrp_instance.depot.lat + 1, vrp_instance.depot.lon], 2)
+    assert vrp_instance.insert_order_fast(far) is None
+    assert far.status == 0
+
+    near = Order(1, [vrp_instance.depot.lat + 0.001, vrp_instance.depot.lon], 2)
+    vehicle_idx, pos = vrp_instance.insert_order_fast(near)
+    route = vrp_instance.get_routes()[vehicle_idx]
+    assert route.route[pos] is near
+    assert near.status == 2
+    for route in vrp_instance.get_routes().values():
+        if route != -1:
+            assert route_length(vrp_instance, route) <= MAX_ROUTE_DISTANCE
+
+def test_insertion_keeps_time_windows():
+    vrp_instance = solved_instance()
+    # Next to the depot and opening later than it can be reached: a spare vehicle
+    # fits it at least, waiting for the window to open
+    order = Order(1, [vrp_instance.depot.lat + 0.001, vrp_instance.depot.lon], 1, start_time=60, end_time=300)
+    assert vrp_instance.insert_order_fast(order) is not None
+    assert order.status == 2
+    assert 60 <= order.predicted_time <= 300
+    for route in vrp_instance.get_routes().values():
+        if route == -1:
+            continue
+        for node in route.route[1:-1]:
+            if node.type == 1 and node.start_time and node.end_time:
+                assert node.start_time <= node.predicted_time <= node.end_time
+
+def test_insertion_grows_a_memory_mapped_matrix():
+    vrp_instance = solved_instance(max_matrix_bytes=1024)
+    assert isinstance(vrp_instance.customers.distmat, np.memmap)
+
+    orders = [Order(1, [vrp_instance.depot.lat + 0.001 * i, vrp_instance.depot.lon], 2) for i in range(1, 4)]
+    for order in orders:
+        assert vrp_instance.insert_order_fast(order) is not None
+    distmat = vrp_instance.customers.distmat
+    assert isinstance(distmat.base, np.memmap)
+    assert distmat.shape == (vrp_instance.customers.number, vrp_instance.customers.number)
+    assert distmat[orders[0].current_vrp_index, orders[2].current_vrp_index] > 0
+
+def test_insertion_needs_a_previous_solve():
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=10)
+    with pytest.raises(ValueError):
+        VRP(depot, orders, vehicles).insert_order_fast(helper.generate_random_order())
+
+def test_insertion_rejects_a_solve_without_distance_matrix():
+    # The insertion costs are read from the dense distance matrix of the solve
+    vrp_instance = solved_instance()
+    vrp_instance.customers.distmat = None
+    with pytest.raises(ValueError):
+        vrp_instance.insert_order_fast(helper.generate_random_order())
@@ -0,0 +1,70 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+import vehicle_routing.helper as helper
+import vehicle_routing.loader as loader
+
+def edd(days):
+    return (datetime.now() + timedelta(days=days, hours=1)).strftime('%d-%m-%Y')
+
+@pytest.fixture
+def files(tmp_path):
+    deliveries = pd.DataFrame({
+        'lat': [12.91, None, 12.93, 12.94],
+        'lon': [77.51, 77.52, 77.53, 77.54],
+        'AWB': ['A1', 'A2', 'A3', 'A4'],
+        'product_id': ['P1', 'P2', 'P3', 'P4'],
+        'EDD': [edd(2), edd(1), None, edd(-3)],
+        'ignored': [1, 2, 3, 4]})
+    pickups = pd.DataFrame({'lat': [12.95, 12.96], 'lon': [77.55, 77.56], 'product_id': ['P5', 'P6']})
+    paths = {}
+    for name, df in (('delivery', deliveries), ('pickup', pickups)):
+        paths[name] = str(tmp_path / '{0}.xlsx'.format(name))
+        df.to_excel(paths[name], index=False)
+        df.to_csv(str(tmp_path / '{0}.csv'.format(name)), index=False)
+    return paths
+
+def same(a, b):
+    # Missing EDDs are NaT, which compares unequal to itself
+    return np.array_equal(a, b, equal_nan=a.dtype.kind == 'M')
+
+def baseline_orders(path_to_delivery, path_to_pickup):
+    # The row by row parse the loader replaced
+    orders = []
+    for _, row in pd.read_excel(path_to_delivery).iterrows():
+        if pd.notnull(row['lat']) and pd.notnull(row['lon']):
+            if pd.notnull(row['EDD']):
+                deadline = math.ceil((datetime.strptime(row['EDD'], '%d-%m-%Y') - datetime.now()).total_seconds() / (60 * 60 * 24))
+            else:
+                deadline = 0
+            orders.append(([row['lat'], row['lon']], 1, row['AWB'], row['product_id'], deadline))
+    for _, row in pd.read_excel(path_to_pickup).iterrows():
+        orders.append(([row['lat'], row['lon']], 2, None, row['product_id'], 0))
+    return orders
+
+def test_problem_matches_the_baseline_excel_parse(files):
+    _, orders, _ = helper.generate_problem_from_file(files['delivery'], files['pickup'])
+    assert [(o.coordinates, o.type, o.AWB, o.SKU, o.deadline) for o in orders] \
+        == baseline_orders(files['delivery'], files['pickup'])
+
+def test_csv_and_excel_load_the_same_columns(files):
+    for kind in ('delivery', 'pickup'):
+        excel = loader.load(files[kind], kind)
+        csv = loader.load(files[kind].replace('.xlsx', '.csv'), kind, chunksize=1)
+        assert excel.keys() == csv.keys()
+        for column in excel:
+            assert same(excel[column], csv[column]), column
+
+def test_unchanged_files_are_read_from_the_cache(files, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    parsed = loader.load(files['delivery'], 'delivery', cache_dir=cache_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('parsed again')
+
+    monkeypatch.setattr(loader, 'read_table', fail)
+    cached = loader.load(files['delivery'], 'delivery', cache_dir=cache_dir)
+    assert all(same(parsed[column], cached[column]) for column in parsed)
+    assert np.isnat(cached['EDD'][1])
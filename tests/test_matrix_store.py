@@ -0,0 +1,111 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from vehicle_routing.customers import Node
+from vehicle_routing.matrix_store import MatrixStore
+
+def make_nodes(start, stop):
+    return [Node([12.9 + i * 0.01, 77.5 + i * 0.001], 1) for i in range(start, stop)]
+
+def distances(sources, destinations):
+    return np.ceil(np.array([[abs(a.lat - b.lat) * 1e5 + abs(a.lon - b.lon) * 1e4 for b in destinations]
+                    for a in sources]).reshape(len(sources), len(destinations)))
+
+class Counting():
+    """
+    The distances, recording the (sources, destinations) sizes of every call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, sources, destinations):
+        self.calls.append((len(sources), len(destinations)))
+        return distances(sources, destinations)
+
+def test_miss_computes_the_whole_matrix(tmp_path):
+    nodes = make_nodes(0, 5)
+    compute = Counting()
+    distmat = MatrixStore(str(tmp_path)).get_matrix(nodes, 'haversine', compute)
+    assert distmat.dtype == np.int32
+    assert np.array_equal(distmat, distances(nodes, nodes))
+    assert compute.calls == [(5, 5)]
+
+def test_hit_computes_nothing_and_keeps_the_matrix_file(tmp_path):
+    nodes = make_nodes(0, 5)
+    MatrixStore(str(tmp_path)).get_matrix(nodes, 'haversine', distances)
+    matrix_file = os.path.join(str(tmp_path), 'haversine.npz')
+    stamp = os.stat(matrix_file).st_ino, os.stat(matrix_file).st_mtime_ns
+
+    compute = Counting()
+    # A new store, as in the next session
+    distmat = MatrixStore(str(tmp_path)).get_matrix(nodes[::-1], 'haversine', compute)
+    assert compute.calls == []
+    assert np.array_equal(distmat, distances(nodes[::-1], nodes[::-1]))
+    assert (os.stat(matrix_file).st_ino, os.stat(matrix_file).st_mtime_ns) == stamp
+
+def test_partial_overlap_computes_only_the_new_locations(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    store.get_matrix(make_nodes(0, 4), 'haversine', distances)
+
+    nodes = make_nodes(2, 7)
+    compute = Counting()
+    distmat = store.get_matrix(nodes, 'haversine', compute)
+    assert np.array_equal(distmat, distances(nodes, nodes))
+    # Rows of the 3 new locations, then the columns of the new locations from the 2 known ones
+    assert compute.calls == [(3, 5), (2, 3)]
+
+    # Known locations that were never needed together before
+    nodes = make_nodes(0, 2) + make_nodes(5, 7)
+    compute = Counting()
+    assert np.array_equal(store.get_matrix(nodes, 'haversine', compute), distances(nodes, nodes))
+    assert compute.calls == [(4, 4)]
+
+def test_eviction_keeps_the_locations_used_last_across_sessions(tmp_path):
+    # Room for 4 locations
+    max_bytes = 4 * 4 * 4
+    a, b, c = make_nodes(0, 2), make_nodes(2, 4), make_nodes(4, 6)
+    MatrixStore(str(tmp_path), max_bytes=max_bytes).get_matrix(a, 'haversine', distances)
+    MatrixStore(str(tmp_path), max_bytes=max_bytes).get_matrix(b, 'haversine', distances)
+    # A hit on a makes b the least recently used
+    MatrixStore(str(tmp_path), max_bytes=max_bytes).get_matrix(a, 'haversine', distances)
+    MatrixStore(str(tmp_path), max_bytes=max_bytes).get_matrix(c, 'haversine', distances)
+
+    compute = Counting()
+    store = MatrixStore(str(tmp_path), max_bytes=max_bytes)
+    store.get_matrix(a, 'haversine', compute)
+    assert compute.calls == []
+    store.get_matrix(b, 'haversine', compute)
+    assert compute.calls == [(2, 2)]
+
+def test_unroutable_pairs_get_a_finite_distance(tmp_path):
+    nodes = make_nodes(0, 3)
+
+    def no_route_to_the_last(sources, destinations):
+        result = distances(sources, destinations)
+        result[:, [d is nodes[-1] for d in destinations]] = np.nan
+        return result
+
+    # Computed, then read back in a new session
+    for store in [MatrixStore(str(tmp_path), unroutable_distance=10 ** 8) for _ in range(2)]:
+        distmat = store.get_matrix(nodes, 'osrm', no_route_to_the_last)
+        assert distmat.dtype == np.int32
+        assert (distmat[:, 2] == 10 ** 8).all()
+        assert np.array_equal(distmat[:, :2], distances(nodes, nodes[:2]))
+
+def solve_cluster(path, start):
+    # One process of a clustered solve sharing the store
+    nodes = make_nodes(start, start + 30)
+    return np.array_equal(MatrixStore(path).get_matrix(nodes, 'haversine', distances), distances(nodes, nodes))
+
+def test_concurrent_writers(tmp_path):
+    starts = list(range(0, 160, 10))
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(solve_cluster, [str(tmp_path)] * len(starts), starts))
+
+    nodes = make_nodes(0, 180)
+    compute = Counting()
+    distmat = MatrixStore(str(tmp_path)).get_matrix(nodes, 'haversine', compute)
+    assert np.array_equal(distmat, distances(nodes, nodes))
+    # Every location made it into the store, only pairs across the clusters are missing
+    assert compute.calls == [(180, 180)]
+    assert [f for f in os.listdir(str(tmp_path)) if f.endswith('.tmp')] == []
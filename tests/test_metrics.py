@@ -0,0 +1,43 @@
+import json
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.metrics import SolveMetrics
+
+def test_process_vrp_records_its_phases():
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=40)
+    vrp_instance = VRP(depot, orders, vehicles)
+    assert vrp_instance.process_VRP(time_limit=1, transit_matrix=True) is not None
+
+    metrics = vrp_instance.metrics
+    assert all(seconds >= 0 for seconds in metrics.phases.values())
+    parts = sum(metrics.phases[name] for name in ('matrix', 'model', 'first_solution', 'local_search'))
+    assert abs(parts - metrics.phases['total']) < 0.05
+    assert metrics.solutions >= len(metrics.trajectory) >= 1
+    # The trajectory only keeps improvements, and ends at the returned solution
+    objectives = [objective for _, objective in metrics.trajectory]
+    assert objectives == sorted(objectives, reverse=True)
+    assert objectives[-1] == metrics.objective
+    assert metrics.dropped == sum(order.status == 1 for order in orders)
+    assert json.loads(metrics.to_json())['objective'] == metrics.objective
+
+def test_prometheus_exposition():
+    metrics = SolveMetrics(labels={'instance': 'a "b"'})
+    with metrics.phase('matrix'):
+        pass
+    metrics.start_search()
+    metrics.add_solution(10)
+    metrics.add_solution(12)
+    metrics.add_solution(8)
+    metrics.finish(objective=8, dropped=0)
+
+    assert metrics.trajectory[0][1] == 10 and metrics.trajectory[-1][1] == 8 and len(metrics.trajectory) == 2
+    text = metrics.to_prometheus()
+    assert '# TYPE vrp_solve_phase_seconds gauge' in text
+    assert 'vrp_solve_phase_seconds{instance="a \\"b\\"",phase="matrix"} ' in text
+    assert 'vrp_solve_solutions{instance="a \\"b\\""} 3' in text
+    assert 'vrp_solve_objective{instance="a \\"b\\""} 8' in text
+    assert text.endswith('\n')
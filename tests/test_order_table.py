@@ -0,0 +1,53 @@
+import pickle
+import numpy as np
+from vehicle_routing.customers import Order
+from vehicle_routing.order_table import OrderTable, OrderView
+
+def make_orders():
+    orders = [Order(2, [12.97, 77.59], 1, start_time=10, end_time=50, deadline=1),
+              Order(1, [12.98, 77.60], 2, AWB='A1', deadline=3),
+              Order(3, [12.99, 77.61], 1, deadline=0)]
+    orders[1].priority = 2
+    return orders
+
+def test_views_read_and_write_the_columns():
+    orders = make_orders()
+    table = OrderTable.from_orders(orders)
+    for view, order in zip(table, orders):
+        assert isinstance(view, OrderView)
+        for name in ('lat', 'lon', 'type', 'volume', 'status', 'deadline', 'start_time', 'end_time', 'AWB'):
+            assert getattr(view, name) == getattr(order, name)
+    assert table[1].start_time is None
+
+    table[2].status = 2
+    table[2].predicted_time = 35
+    assert table.status.tolist() == [0, 0, 2]
+    assert table[2].predicted_time == 35
+    assert table[0].predicted_time is None
+
+def test_penalties_match_the_orders():
+    orders = make_orders()
+    table = OrderTable.from_orders(orders)
+    assert np.allclose(table.carryforward_penalties(), [o.carryforward_penalty for o in orders])
+    assert table[1].carryforward_penalty == orders[1].carryforward_penalty
+
+def test_append_adds_a_row():
+    table = OrderTable.from_orders(make_orders())
+    view = table.append([13.0, 77.7], 2, volume=4, start_time=5, end_time=9)
+    assert len(table) == 4 and table[3] is view
+    assert (view.coordinates, view.volume, view.start_time, view.end_time) == ([13.0, 77.7], 4, 5, 9)
+
+def test_pickled_views_share_one_table():
+    table = OrderTable.from_orders(make_orders() * 100)
+    orders = pickle.loads(pickle.dumps(table.orders))
+
+    assert all(isinstance(order, OrderView) for order in orders)
+    assert all(order._table is orders[0]._table for order in orders)
+    assert orders[0]._table.orders == orders
+    # Writes through a view are seen in the columns of the unpickled table
+    orders[5].status = 2
+    assert orders[0]._table.status[5] == 2
+    assert table.status[5] == 0
+
+    # One table, not one object per view: about the size of the pickled table itself
+    assert len(pickle.dumps(table.orders)) < 1.1 * len(pickle.dumps(table))
@@ -0,0 +1,97 @@
+import json
+import math
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pytest
+import requests
+from vehicle_routing import osrm
+from vehicle_routing.customers import Node
+
+# Destinations at this latitude have no route
+UNREACHABLE_LAT = 13.5
+
+class StubOSRM(BaseHTTPRequestHandler):
+    """
+    The table service of OSRM: distances (or durations) between the (lon, lat) coordinates of the
+    path, for the sources= and destinations= indices. Every request fails with a 503
+    the first time it is seen.
+    """
+    seen = set()
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if self.path not in self.seen:
+            self.seen.add(self.path)
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        coordinates = [tuple(map(float, c.split(','))) for c in url.path.split('/')[-1].split(';')]
+        sources = [int(i) for i in query['sources'][0].split(';')]
+        destinations = [int(i) for i in query['destinations'][0].split(';')]
+        self.requests.append((len(coordinates), len(sources), len(destinations)))
+        distances = [[None if coordinates[d][1] == UNREACHABLE_LAT else distance(coordinates[s], coordinates[d])
+                        for d in destinations] for s in sources]
+
+        body = json.dumps({'code': 'Ok', query['annotations'][0] + 's': distances}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1]) * 1e5
+
+@pytest.fixture
+def base_url():
+    StubOSRM.seen.clear()
+    StubOSRM.requests.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOSRM)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}/'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+def make_nodes(n, lat=12.9):
+    return [Node([lat + i * 0.001, 77.5 + (i % 7) * 0.002], 1) for i in range(n)]
+
+def expected(sources, destinations):
+    return np.array([[distance((s.lon, s.lat), (d.lon, d.lat)) for d in destinations] for s in sources])
+
+def test_table_assembles_the_blocks(base_url):
+    sources, destinations = make_nodes(120), make_nodes(70, lat=12.95)
+    session = osrm.make_session(retries=2, backoff_factor=0)
+    result = osrm.table(sources, destinations, base_url=base_url, session=session)
+
+    assert result.shape == (120, 70)
+    assert np.allclose(result, expected(sources, destinations))
+    # 3 x 2 blocks of at most 50 sources and 50 destinations, each retried once
+    assert sorted(StubOSRM.requests) == sorted([(s + d, s, d) for s in (50, 50, 20) for d in (50, 20)])
+    assert len(StubOSRM.seen) == 6
+
+def test_table_defaults_to_the_sources(base_url):
+    nodes = make_nodes(60)
+    result = osrm.table(nodes, base_url=base_url, session=osrm.make_session(backoff_factor=0))
+    assert np.allclose(result, expected(nodes, nodes))
+    assert np.allclose(np.diag(result), 0)
+
+def test_unreachable_destinations_are_nan(base_url):
+    sources = make_nodes(3)
+    destinations = make_nodes(2) + [Node([UNREACHABLE_LAT, 77.5], 1)]
+    result = osrm.fetch_block(osrm.make_session(backoff_factor=0), sources, destinations, base_url=base_url,
+                annotation='duration')
+    assert np.isnan(result[:, 2]).all()
+    assert np.allclose(result[:, :2], expected(sources, destinations[:2]))
+
+def test_failed_requests_raise_once_the_retries_are_used_up(base_url):
+    session = osrm.make_session(retries=0, backoff_factor=0)
+    with pytest.raises(requests.RequestException):
+        osrm.table(make_nodes(5), base_url=base_url, session=session)
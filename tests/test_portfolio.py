@@ -0,0 +1,51 @@
+import time
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.matrix_store import MatrixStore
+
+CONFIGS = [('PATH_CHEAPEST_ARC', 'GUIDED_LOCAL_SEARCH', 0), ('SAVINGS', 'GUIDED_LOCAL_SEARCH', 0),
+           ('PATH_CHEAPEST_ARC', 'GUIDED_LOCAL_SEARCH', 1), ('PARALLEL_CHEAPEST_INSERTION', 'GUIDED_LOCAL_SEARCH', 0)]
+
+def random_instance(num_orders=40):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=num_orders)
+    return VRP(depot, orders, vehicles)
+
+def test_portfolio_keeps_the_deadline():
+    vrp_instance = random_instance()
+    start = time.time()
+    # Two rounds of two runs
+    results = vrp_instance.solve_portfolio(configs=CONFIGS, time_limit=4, workers=2)
+    assert time.time() - start < 4 + 0.5
+    assert len(results) == len(CONFIGS)
+    assert results[0]['objective'] is not None
+
+def test_portfolio_leaves_the_instance_as_process_VRP_does(tmp_path):
+    vrp_instance = random_instance()
+    store = MatrixStore(str(tmp_path))
+    vrp_instance.solve_portfolio(configs=CONFIGS[:2], time_limit=3, workers=2, matrix_store=store,
+        max_route_distance=150_000)
+
+    # The shared matrix came from the store
+    assert (tmp_path / 'haversine.npz').exists()
+    assert vrp_instance.customers.distmat is not None
+    assert vrp_instance.customers.number == len(vrp_instance.orders) + 1
+    assert vrp_instance.fleet.vehicle_list == vrp_instance.vehicles
+    assert vrp_instance.solve_limits['max_route_distance'] == 150_000
+    assert vrp_instance.metrics.objective is not None
+    assert vrp_instance.metrics.labels['first_sol_strategy'] in ('PATH_CHEAPEST_ARC', 'SAVINGS')
+
+    for vehicle_idx, route in vrp_instance.get_routes().items():
+        if route == -1:
+            continue
+        assert route.route[0] is vrp_instance.vehicles[vehicle_idx].start
+        for node in route.route:
+            assert vrp_instance.customers.customers[node.current_vrp_index] is node
+
+    # A dynamic order can be inserted into the winning routes
+    order = helper.generate_random_order(type=2)
+    vrp_instance.insert_order_fast(order)
+    assert vrp_instance.customers.customers[-1] is order
@@ -0,0 +1,105 @@
+import json
+import random
+import asyncio
+import numpy as np
+import pytest
+import vehicle_routing.helper as helper
+from vehicle_routing.service import DispatchService, handle_connection
+
+def problem_body(num_orders=30):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=num_orders)
+    return {'depot': [depot.lat, depot.lon], 'vehicles': [int(v.actual_volume_capacity) for v in vehicles],
+            'orders': [{'lat': o.lat, 'lon': o.lon, 'type': int(np.ravel(o.type)[0])} for o in orders]}
+
+async def request(port, method, path, body=None, raw=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b'')
+    writer.write('{0} {1} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {2}\r\n\r\n'.format(method, path, len(data)).encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+async def wait_for(port, job_id, timeout=60):
+    for _ in range(int(timeout / 0.1)):
+        status, job = await request(port, 'GET', '/jobs/' + job_id)
+        assert status == 200
+        if job['status'] not in ('queued', 'running'):
+            return job
+        await asyncio.sleep(0.1)
+    raise AssertionError('job {0} did not finish'.format(job_id))
+
+def run_service(scenario):
+    async def main():
+        service = DispatchService(workers=1, max_time_limit=2)
+        service.start()
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), '127.0.0.1', 0)
+        try:
+            async with server:
+                return await scenario(server.sockets[0].getsockname()[1])
+        finally:
+            service.close()
+    return asyncio.run(main())
+
+def test_solve_add_orders_and_reroute():
+    async def scenario(port):
+        status, created = await request(port, 'POST', '/problems', problem_body())
+        assert status == 201
+        problem = '/problems/' + created['problem_id']
+
+        status, submitted = await request(port, 'POST', problem + '/solve', {'time_limit': 1})
+        assert status == 202
+        # One job at a time per problem
+        status, _ = await request(port, 'POST', problem + '/orders', {'lat': 12.97, 'lon': 77.6})
+        assert status == 409
+        job = await wait_for(port, submitted['job_id'])
+        assert job['status'] == 'done'
+
+        status, routes = await request(port, 'GET', problem + '/routes')
+        assert status == 200 and routes == job['result']
+        visited = sorted(stop['order'] for route in routes['routes'] for stop in route['stops'] if stop['order'] is not None)
+        assert sorted(visited + routes['dropped']) == list(range(30))
+
+        status, added = await request(port, 'POST', problem + '/orders', {'orders': [{'lat': 12.97, 'lon': 77.6}]})
+        assert status == 200 and added == {'orders': [30]}
+        status, submitted = await request(port, 'POST', problem + '/reroute', {'time_limit': 1})
+        assert status == 202
+        job = await wait_for(port, submitted['job_id'])
+        assert job['status'] == 'done' and job['reroute']
+        visited = [stop['order'] for route in job['result']['routes'] for stop in route['stops']]
+        assert 30 in visited or 30 in job['result']['dropped']
+
+    run_service(scenario)
+
+def test_bad_requests():
+    async def scenario(port):
+        assert (await request(port, 'GET', '/problems/nope/routes'))[0] == 404
+        assert (await request(port, 'POST', '/problems', raw=b'{not json'))[0] == 400
+        assert (await request(port, 'POST', '/problems', {'orders': []}))[0] == 400
+        status, created = await request(port, 'POST', '/problems', problem_body(5))
+        problem = '/problems/' + created['problem_id']
+        # Nothing to reroute before the first solve
+        assert (await request(port, 'POST', problem + '/reroute', {}))[0] == 409
+        assert (await request(port, 'POST', problem + '/orders', {'lat': 'x'}))[0] == 400
+        assert (await request(port, 'PUT', problem + '/routes'))[0] == 405
+
+    run_service(scenario)
+
+def test_cancel_a_queued_job():
+    async def scenario(port):
+        jobs = []
+        for _ in range(2):
+            _, created = await request(port, 'POST', '/problems', problem_body())
+            _, submitted = await request(port, 'POST', '/problems/{0}/solve'.format(created['problem_id']), {'time_limit': 2})
+            jobs.append(submitted['job_id'])
+
+        # The single worker is busy with the first job, the second one is waiting
+        status, cancelled = await request(port, 'DELETE', '/jobs/' + jobs[1])
+        assert status == 200 and cancelled['status'] == 'cancelled'
+        assert (await wait_for(port, jobs[0]))['status'] == 'done'
+        assert (await wait_for(port, jobs[1]))['status'] == 'cancelled'
+
+    run_service(scenario)
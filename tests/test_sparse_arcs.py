@@ -0,0 +1,37 @@
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+
+def random_instance(num_orders):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=num_orders)
+    return VRP(depot, orders, vehicles)
+
+def test_routes_only_use_nearest_neighbour_arcs():
+    vrp_instance = random_instance(100)
+    assert vrp_instance.process_VRP(time_limit=1, neighbours=10, sparse_min_nodes=0) is not None
+    assert vrp_instance.customers.distmat is None
+
+    sparse = vrp_instance.customers.sparse_distmat
+    for route in vrp_instance.get_routes().values():
+        if route == -1:
+            continue
+        path = [node.current_vrp_index for node in route.route]
+        for from_node, to_node in zip(path[:-1], path[1:]):
+            assert to_node in vrp_instance.customers.neighbour_nodes(from_node)
+            assert sparse[from_node, to_node] > 0
+
+def test_small_instances_are_solved_densely():
+    vrp_instance = random_instance(50)
+    assert vrp_instance.process_VRP(time_limit=1, neighbours=10) is not None
+    assert vrp_instance.customers.distmat is not None
+
+def test_falls_back_to_the_dense_matrix_when_orders_are_dropped(caplog):
+    vrp_instance = random_instance(100)
+    # With a single neighbour the chains break up, more routes are needed than there are vehicles
+    assert vrp_instance.process_VRP(time_limit=1, neighbours=1, sparse_min_nodes=0) is not None
+    assert vrp_instance.customers.distmat is not None
+    assert vrp_instance.metrics.dropped == 0
+    assert 'solving densely' in caplog.text
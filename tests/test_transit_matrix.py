@@ -0,0 +1,27 @@
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.customers import matrix_output, transit_matrix_rows
+
+def random_instance(num_orders=30):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=num_orders)
+    return VRP(depot, orders, vehicles)
+
+def test_transit_matrix_rows_reads_a_memory_mapped_matrix_row_by_row():
+    distmat = matrix_output((3, 4), max_bytes=0)
+    distmat[:] = np.arange(12).reshape(3, 4)
+    rows = transit_matrix_rows(distmat)
+    assert rows == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]]
+    assert all(type(value) is int for row in rows for value in row)
+
+def test_the_registered_matrices_are_the_int32_matrix_and_its_times():
+    vrp_instance = random_instance()
+    assert vrp_instance.process_VRP(time_limit=1, transit_matrix=True) is not None
+    customers = vrp_instance.customers
+    # The matrix of the solve, not an int64 copy of it
+    assert customers.return_dist_matrix() is customers.distmat
+    assert customers.distmat.dtype == np.int32
+    assert transit_matrix_rows(customers.total_time_rows()) == customers.make_total_time_mat().tolist()
@@ -0,0 +1,51 @@
+import random
+import numpy as np
+import vehicle_routing.helper as helper
+from vehicle_routing.vrp import VRP
+from vehicle_routing.route import Route, RoutesList
+from vehicle_routing.warm_start import WarmStartStore
+
+def solved_instance(store):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=40)
+    vrp_instance = VRP(depot, orders, vehicles)
+    assert vrp_instance.process_VRP(time_limit=1, transit_matrix=True, warm_start=store) is not None
+    return vrp_instance
+
+def stored(path):
+    return WarmStartStore(path)._load()
+
+def test_initial_routes_repeat_the_recorded_routes(tmp_path):
+    vrp_instance = solved_instance(WarmStartStore(str(tmp_path)))
+    routes = vrp_instance.routes_list.get_initial_routes()
+
+    # The next day, from a new store on the same directory
+    initial = WarmStartStore(str(tmp_path)).initial_routes(vrp_instance.customers, vrp_instance.fleet)
+    assert initial == routes
+
+def test_reroutes_are_not_recorded(tmp_path):
+    store = WarmStartStore(str(tmp_path))
+    vrp_instance = solved_instance(store)
+    before = stored(str(tmp_path))
+
+    # Every vehicle delivers its first order, its route then starts there
+    for route in vrp_instance.get_routes().values():
+        if route != -1 and len(route.route) > 3:
+            route.next_node(3)
+            route.next_node(3)
+    assert vrp_instance.process_VRP(isReroute=True, time_limit=1, transit_matrix=True, warm_start=store) is not None
+    assert stored(str(tmp_path)) == before
+
+def test_routes_from_an_order_keep_the_earlier_entries(tmp_path):
+    random.seed(0)
+    np.random.seed(0)
+    depot, orders, vehicles = helper.generate_random_problem(num_orders=4)
+    store = WarmStartStore(str(tmp_path))
+    store.record(RoutesList({0: Route([depot] + orders[:2] + [depot], vehicles[0])}))
+
+    # A route starting at the current order of the vehicle, the second order moved to another vehicle
+    store.record(RoutesList({1: Route([orders[0], orders[1], orders[2], depot], vehicles[0])}))
+    routes = stored(str(tmp_path))
+    assert len(routes) == 2
+    assert [routes[key] for key in store._keys(orders[:2])] == [(0, 1 / 3), (0, 2 / 3)]
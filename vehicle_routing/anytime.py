@@ -0,0 +1,167 @@
+import time
+import queue
+import threading
+
+class Improvement():
+    """
+    An improved solution reported by the solver while it is still searching.
+
+        Attributes:
+        -----------
+        objective: int
+            Objective value of the solution.
+        elapsed: float
+            Seconds since the solve started.
+        routes: Dict[int, List[Node]]
+            The nodes visited by every used vehicle, from its start to its end.
+    """
+    def __init__(self, objective, elapsed, routes):
+        self.objective = objective
+        self.elapsed = elapsed
+        self.routes = routes
+
+    def __repr__(self):
+        return 'Improvement(objective={0}, elapsed={1:.2f}s, vehicles={2})'.format(self.objective, self.elapsed, len(self.routes))
+
+class Plateau():
+    """
+    Detects that the search stopped paying off: the best objective improved by less
+    than min_improvement (relative) over the last window seconds.
+
+        Attributes:
+        -----------
+        window: float
+            Length of the window in seconds.
+        min_improvement: float
+            Relative improvement over the window below which the search is stopped.
+    """
+    def __init__(self, window, min_improvement=0.001):
+        self.window = window
+        self.min_improvement = min_improvement
+        # (elapsed, best objective) at every improvement
+        self.history = []
+
+    def update(self, elapsed, best):
+        if not self.history or best < self.history[-1][1]:
+            self.history.append((elapsed, best))
+
+    def reached(self, elapsed):
+        earlier = [best for t, best in self.history if t <= elapsed - self.window]
+        if not earlier:
+            return False
+        return earlier[-1] - self.history[-1][1] <= self.min_improvement * abs(earlier[-1])
+
+class AnytimeMonitor():
+    """
+    The solution callback of an anytime solve (see VRP.solve_anytime). It is invoked
+    by RoutingModel.AddAtSolutionCallback at every solution the search accepts,
+    extracts the routes of those that improve on the best so far and stops the search
+    when on_solution returns False, the plateau is reached or the stop event is set.
+
+    The plateau is only checked when the solver reports a solution; the time_limit of
+    the solve still bounds a search that stalls without reporting any.
+
+        Attributes:
+        -----------
+        vrp_instance: VRP
+        on_solution: function
+            on_solution(Improvement) -> bool, return False to stop the search.
+        plateau: Plateau
+        stop: threading.Event
+            Set from another thread to stop the search at the next solution.
+        improvements: List[Improvement]
+            All the improvements reported so far.
+    """
+    def __init__(self, vrp_instance, on_solution=None, plateau=None, stop=None):
+        self.vrp_instance = vrp_instance
+        self.on_solution = on_solution
+        self.plateau = plateau
+        self.stop = stop
+        self.improvements = []
+        self.start_time = time.time()
+        self.stopped = False
+
+    def extract_routes(self, routing):
+        customers = self.vrp_instance.customers
+        routes = {}
+        for vehicle_idx in range(routing.vehicles()):
+            node = routing.Start(vehicle_idx)
+            if routing.IsEnd(routing.NextVar(node).Value()):
+                continue
+            route = []
+            while not routing.IsEnd(node):
+                route.append(customers.customers[customers.manager.IndexToNode(node)])
+                node = routing.NextVar(node).Value()
+            route.append(customers.customers[customers.manager.IndexToNode(node)])
+            routes[vehicle_idx] = route
+        return routes
+
+    def __call__(self, routing):
+        elapsed = time.time() - self.start_time
+        objective = routing.CostVar().Value()
+
+        if not self.improvements or objective < self.improvements[-1].objective:
+            improvement = Improvement(objective, elapsed, self.extract_routes(routing))
+            self.improvements.append(improvement)
+            if self.on_solution is not None and self.on_solution(improvement) is False:
+                self.stopped = True
+
+        if self.plateau is not None:
+            self.plateau.update(elapsed, self.improvements[-1].objective)
+            if self.plateau.reached(elapsed):
+                self.stopped = True
+
+        if self.stop is not None and self.stop.is_set():
+            self.stopped = True
+
+        if self.stopped:
+            routing.solver().FinishCurrentSearch()
+
+def iter_solutions(vrp_instance, plateau_window=None, plateau_improvement=0.001, **kwargs):
+    """
+    Solve in a background thread, yielding an Improvement for every improved solution.
+
+    The solver holds the GIL while it searches, so it is paused from the moment a
+    solution is yielded until the next one is requested. Closing the generator (e.g.
+    breaking out of the loop) stops the search; vrp_instance is then updated with the
+    best solution found, as at the end of process_VRP.
+
+    Returns (as the value of StopIteration):
+        The result of process_VRP.
+    """
+    handoff = queue.Queue()
+    resume = threading.Event()
+    closing = threading.Event()
+
+    def on_solution(improvement):
+        if closing.is_set():
+            return False
+        handoff.put(('solution', improvement))
+        resume.wait()
+        resume.clear()
+        return not closing.is_set()
+
+    def solve():
+        try:
+            result = vrp_instance.solve_anytime(on_solution=on_solution, plateau_window=plateau_window,
+                        plateau_improvement=plateau_improvement, **kwargs)
+            handoff.put(('done', result))
+        except BaseException as e:
+            handoff.put(('error', e))
+
+    thread = threading.Thread(target=solve, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = handoff.get()
+            if kind == 'solution':
+                yield value
+                resume.set()
+            elif kind == 'done':
+                return value
+            else:
+                raise value
+    finally:
+        closing.set()
+        resume.set()
+        thread.join()
@@ -1,77 +1,244 @@
 import os
 import math
+import hashlib
+import numpy as np
 import networkx as nx
 import geopandas as gpd
-from shapely.geometry import Point
+from scipy import sparse
+import shapely
+from shapely import STRtree
+
+WARDS_FILE = os.path.join(os.path.dirname(__file__), '../wards/bangalore.geojson')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '../wards/.cache')
+# Bump when the layout of the cache file changes
+CACHE_VERSION = 1
 
 class CityGraph():
-    def __init__(self, orders=None):
+    """
+    The ward layer of the city and the graph of adjacent wards, used to prioritise
+    orders by the Katz centrality of their ward.
+
+    Nothing is loaded until one of the ward attributes is first used. The ward
+    geometries (as WKB), the adjacency matrix and the ward areas and centroids are
+    cached in CACHE_DIR, keyed by the hash of the source file, so later processes
+    skip parsing the GeoJSON and rebuilding the adjacency.
+
+        Attributes:
+        -----------
+        city: GeoDataFrame
+            The wards, for plotting.
+        ward_list: Dict[int, dict]
+            Name and geometry of each ward by ward number.
+        ward_ids: np.ndarray
+            Ward numbers, in the order of the rows of every ward array.
+        adjacency: scipy.sparse.csr_matrix
+            Ward adjacency matrix.
+        areas, centroids: np.ndarray
+            Area and (x, y) centroid of each ward.
+        G: networkx.Graph
+            Graph of adjacent wards.
+    """
+    def __init__(self, orders=None, wards_file=WARDS_FILE, cache_dir=CACHE_DIR):
+        self.wards_file = wards_file
+        self.cache_dir = cache_dir
+        self._wards = None
+        self._city = None
+        self._G = None
+
         if orders is not None:
             self.orders = self.process_orders(orders)
         else:
             self.orders = None
-            
-        self.ward_list = self.process_wards()
-        self.G = self.prepare_graph()
 
     def set_orders(self, orders):
         self.orders = self.process_orders(orders)
 
     def process_orders(self, orders):
-        for order in orders:
-            order.point = Point(order.lon, order.lat)
+        # Ward membership is recomputed lazily for the new orders
+        self.order_wards = None
         return orders
 
+    @property
+    def ward_list(self):
+        return self._load_wards()['ward_list']
+
+    @property
+    def ward_ids(self):
+        return self._load_wards()['ward_ids']
+
+    @property
+    def adjacency(self):
+        return self._load_wards()['adjacency']
+
+    @property
+    def areas(self):
+        return self._load_wards()['areas']
+
+    @property
+    def centroids(self):
+        return self._load_wards()['centroids']
+
+    @property
+    def ward_tree(self):
+        return self._load_wards()['ward_tree']
+
+    @property
+    def city(self):
+        if self._city is None:
+            wards = self._load_wards()
+            self._city = gpd.GeoDataFrame({
+                    'KGISWardNo': wards['ward_ids'],
+                    'KGISWardName': wards['names']
+                }, geometry=wards['geometries'], crs=wards['crs'])
+        return self._city
+
+    @property
+    def G(self):
+        if self._G is None:
+            self._G = self.prepare_graph()
+        return self._G
+
+    def cache_file(self):
+        with open(self.wards_file, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        name = os.path.splitext(os.path.basename(self.wards_file))[0]
+        return os.path.join(self.cache_dir, '{0}-v{1}-{2}.npz'.format(name, CACHE_VERSION, digest))
+
+    def _load_wards(self):
+        if self._wards is not None:
+            return self._wards
+
+        cache_file = self.cache_file()
+        if os.path.exists(cache_file):
+            wards = self._read_cache(cache_file)
+        else:
+            wards = self.process_wards()
+            self._write_cache(cache_file, wards)
+
+        wards['ward_list'] = {
+            num: {'name': name, 'geometry': geo}
+            for num, name, geo in zip(wards['ward_ids'].tolist(), wards['names'].tolist(), wards['geometries'])
+        }
+        wards['ward_tree'] = STRtree(wards['geometries'])
+        self._wards = wards
+        return wards
+
     def process_wards(self):
-        self.city = gpd.read_file(os.path.join(os.path.dirname(__file__), '../wards/bangalore.geojson'))
-        self.city['KGISWardNo'] = self.city['KGISWardNo'].astype('int')
+        """
+        Parse the ward layer and derive the adjacency, areas and centroids of the wards.
+        """
+        self._city = gpd.read_file(self.wards_file)
+        self._city['KGISWardNo'] = self._city['KGISWardNo'].astype('int')
+
+        geometries = self._city.geometry.values.to_numpy()
+        centroids = shapely.centroid(geometries)
+
+        return {
+            'ward_ids': self._city['KGISWardNo'].to_numpy(),
+            'names': self._city['KGISWardName'].to_numpy().astype(str),
+            'geometries': geometries,
+            'adjacency': self.prepare_adjacency(geometries),
+            'areas': shapely.area(geometries),
+            'centroids': np.column_stack([shapely.get_x(centroids), shapely.get_y(centroids)]),
+            'crs': self._city.crs.to_wkt() if self._city.crs is not None else None
+        }
 
-        wards = {}
+    def _write_cache(self, cache_file, wards):
+        wkb = shapely.to_wkb(wards['geometries'])
+        offsets = np.cumsum([0] + [len(w) for w in wkb])
+        adjacency = wards['adjacency']
 
-        for i in self.city.iterrows():
-            num = i[1]['KGISWardNo']
-            name = i[1]['KGISWardName']
-            geo = i[1]['geometry']
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = cache_file + '.tmp.npz'
+        np.savez(tmp_file, ward_ids=wards['ward_ids'], names=wards['names'],
+                wkb=np.frombuffer(b''.join(wkb), dtype=np.uint8), wkb_offsets=offsets,
+                indptr=adjacency.indptr, indices=adjacency.indices,
+                areas=wards['areas'], centroids=wards['centroids'],
+                crs=np.array(wards['crs'] or ''))
+        os.replace(tmp_file, cache_file)
 
-            wards[num] = {
-                'name': name,
-                'geometry': geo
+    def _read_cache(self, cache_file):
+        with np.load(cache_file) as data:
+            wkb = data['wkb'].tobytes()
+            offsets = data['wkb_offsets']
+            geometries = shapely.from_wkb([wkb[offsets[i]: offsets[i + 1]] for i in range(len(offsets) - 1)])
+
+            n = len(data['ward_ids'])
+            indices = data['indices']
+            adjacency = sparse.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, data['indptr']), shape=(n, n))
+
+            return {
+                'ward_ids': data['ward_ids'],
+                'names': data['names'],
+                'geometries': geometries,
+                'adjacency': adjacency,
+                'areas': data['areas'],
+                'centroids': data['centroids'],
+                'crs': str(data['crs']) or None
             }
 
-        return wards
-    
+    def prepare_adjacency(self, geometries):
+        """
+        Return the sparse (CSR) adjacency matrix of the ward geometries.
+        Wards are adjacent when their geometries touch. Only the pairs whose bounding boxes
+        intersect in an STRtree are tested, each pair once.
+        """
+        src, dst = STRtree(geometries).query(geometries)
+        upper = src < dst
+        src, dst = src[upper], dst[upper]
+        touching = shapely.touches(geometries[src], geometries[dst])
+        src, dst = src[touching], dst[touching]
+
+        n = len(geometries)
+        adjacency = sparse.coo_matrix((np.ones(2 * len(src), dtype=np.int8),
+                            (np.concatenate([src, dst]), np.concatenate([dst, src]))),
+                            shape=(n, n)).tocsr()
+        return adjacency
+
     # Add edges to the graph, connecting each ward to its neighboring wards
     def prepare_graph(self):
-        if self.ward_list is None:
+        G = nx.Graph()
+        G.add_nodes_from(self.ward_ids.tolist())
+
+        src, dst = sparse.triu(self.adjacency, k=1).nonzero()
+        G.add_edges_from(zip(self.ward_ids[src].tolist(), self.ward_ids[dst].tolist()))
+        return G
+
+    def assign_wards(self):
+        """
+        Return, for every order, the position in ward_ids of the ward containing it
+        (-1 if none), found with a single bulk query of the wards against an STRtree
+        of the order points (so that the ward polygons are the prepared side).
+        """
+        if self.orders is None:
             raise TypeError
 
-        G = nx.Graph()
-        for i in self.ward_list.keys():
-            G.add_node(i)
+        if self.order_wards is None:
+            lats = np.fromiter((order.lat for order in self.orders), dtype=float, count=len(self.orders))
+            lons = np.fromiter((order.lon for order in self.orders), dtype=float, count=len(self.orders))
+            points = shapely.points(lons, lats)
+            ward_idx, order_idx = STRtree(points).query(self.ward_tree.geometries, predicate='contains')
 
-        for i in self.ward_list.keys():
-            for j in self.ward_list.keys():
-                if i <= j:
-                    continue
+            # An order on a shared boundary goes to the last of its wards in ward_ids order
+            self.order_wards = np.full(len(self.orders), -1)
+            last = np.lexsort((ward_idx, order_idx))
+            self.order_wards[order_idx[last]] = ward_idx[last]
+            self._ward_hits = ward_idx
 
-                if self.ward_list[i]['geometry'].touches(self.ward_list[j]['geometry']):
-                    G.add_edge(i, j)
-        return G
+        return self.order_wards
 
     def calculate_order_density(self):
         if self.ward_list is None:
             raise TypeError
-        if self.orders is None:
-            raise TypeError
+
+        self.assign_wards()
+        counts = np.bincount(self._ward_hits, minlength=len(self.ward_ids))
+        density = counts / (self.areas / 1000000)
 
         beta = {}
-        for i in self.ward_list.keys():
-            self.ward_list[i]['order_density'] = 0
-            for order in self.orders:
-                if self.ward_list[i]['geometry'].contains(order.point):
-                    self.ward_list[i]['order_density'] += 1
-            self.ward_list[i]['order_density'] /= (self.ward_list[i]['geometry'].area / 1000000)
-            beta[i] = self.ward_list[i]['order_density']
+        for i, ward_density in zip(self.ward_ids.tolist(), density.tolist()):
+            self.ward_list[i]['order_density'] = ward_density
+            beta[i] = ward_density
         
         self.beta = beta
 
@@ -86,10 +253,11 @@ class CityGraph():
 
         for i in self.ward_list:
             priorities[i] = katz_centrality[i]
-        
-        for i in self.ward_list:
-            for order in self.orders:
-                if self.ward_list[i]['geometry'].contains(order.point):
-                    order.priority = priorities[i]
+
+        ward_priorities = np.array([priorities[i] for i in self.ward_ids])
+        order_wards = self.assign_wards()
+        for order, ward_idx in zip(self.orders, order_wards.tolist()):
+            if ward_idx >= 0:
+                order.priority = ward_priorities[ward_idx]
 
         return priorities
\ No newline at end of file
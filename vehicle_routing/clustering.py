@@ -1,11 +1,18 @@
-import matplotlib.pyplot as plt
-import numpy as np
-import copy
+import os
+import time
 import math
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from vehicle_routing.route import Route, RoutesList
+
+logger = logging.getLogger(__name__)
 
 def plot_clusters(depot, clusters):
+    import matplotlib.pyplot as plt
+
     for cluster in clusters:
-        print(len(cluster))
+        logger.debug('cluster of %d orders', len(cluster))
         lat = []
         lon = []
         for order in cluster:
@@ -15,42 +22,391 @@ def plot_clusters(depot, clusters):
     plt.scatter(depot.lon, depot.lat, s=70, c='black')
     plt.show()
             
-def clustered(depot, orders, points_per_cluster):
-    num_orders = len(orders)
-    shifted_lat = np.array([i.lat - depot.lat for i in orders])
-    shifted_lon = np.array([i.lon - depot.lon for i in orders])
-    polar_angles = (np.arctan2(shifted_lon,shifted_lat)*180/np.pi).tolist()
+def sweep_indices(depot, lats, lons, points_per_cluster, angle_step=5):
+    """
+    Partition the orders into clusters of about points_per_cluster orders by sweeping
+    around the depot.
+
+    The orders are sorted by polar angle around the depot, and the sweep is started
+    at every angle_step degrees. For each start, the rotated sequence is cut into
+    equally sized clusters and the start with the smallest maximum angular standard
+    deviation over its clusters is kept. The standard deviations of all starts are
+    evaluated at once from prefix sums over the sorted angles.
+
+    Arguments:
+    ------------------
+    depot: Node
+    lats, lons: array-like
+        Coordinates of the orders.
+    points_per_cluster: int
+
+    Returns:
+        List of numpy index arrays into the orders, one per cluster.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    num_orders = len(lats)
+    if num_orders == 0:
+        return []
 
-    for i in range(len(polar_angles)):
-        if polar_angles[i] < 0:
-            polar_angles[i]+=360
+    polar_angles = np.degrees(np.arctan2(lons - depot.lon, lats - depot.lat))
+    polar_angles[polar_angles < 0] += 360
 
-    orders = [order for _, order in sorted(zip(polar_angles, orders))]
-    polar_angles = sorted(polar_angles)
+    # Ties in the angle are broken by latitude, the ordering of Order objects
+    order_idx = np.lexsort((lats, polar_angles))
+    polar_angles = polar_angles[order_idx]
 
-    clusters_n = num_orders//points_per_cluster
+    clusters_n = max(1, num_orders // points_per_cluster)
     points_per_cluster = math.ceil(num_orders / clusters_n)
-    cluster = []
-    min_spread = math.inf
-    for angle in range(0, 360, 5):
-        clusters_temp = []
-        clusters_polar_temp = []
-        
-        if len([i for i in polar_angles if i>angle]) > 0:
-            idx = polar_angles.index([i for i in polar_angles if i>angle][0])
-            temp = orders[idx:] + orders[:idx]
-            # print("temp", temp)
-            temp_p = polar_angles[idx:] + polar_angles[:idx]
-            for c in range(clusters_n):
-                clusters_temp.append(temp[c*points_per_cluster: min(len(orders), (c+1)*points_per_cluster)])
-                # print("cluster temp", clusters_temp)
-                clusters_polar_temp.append(temp_p[c*points_per_cluster: (c+1)*points_per_cluster])
-                # print(np.std(temp_p[c*clusters_n: (c+1)*clusters_n]))
-            m = max([np.std(clusters_polar_temp[k]) for k in range(clusters_n)])
-            if m < min_spread:
-                min_spread = m
-                cluster = copy.deepcopy(clusters_temp)
+
+    # Index of the first order past each start angle; starts past the last order are skipped
+    starts = np.searchsorted(polar_angles, np.arange(0, 360, angle_step), side='right')
+    starts = starts[starts < num_orders]
+    starts = starts[np.sort(np.unique(starts, return_index=True)[1])]
+
+    # Window sums over the sequence repeated twice cover every rotation.
+    # Angles are centred first to limit the cancellation in the variance.
+    doubled = np.concatenate([polar_angles, polar_angles]) - 180
+    prefix = np.concatenate([[0], np.cumsum(doubled)])
+    prefix_sq = np.concatenate([[0], np.cumsum(doubled ** 2)])
+
+    bounds = np.minimum(np.arange(clusters_n + 1) * points_per_cluster, num_orders)
+    bounds = bounds[np.concatenate([[True], np.diff(bounds) > 0])]
+    sizes = np.diff(bounds)
+
+    lo = starts[:, None] + bounds[None, :-1]
+    hi = starts[:, None] + bounds[None, 1:]
+    mean = (prefix[hi] - prefix[lo]) / sizes
+    var = np.maximum((prefix_sq[hi] - prefix_sq[lo]) / sizes - mean ** 2, 0)
+    spread = np.sqrt(var).max(axis=1)
+
+    best = starts[np.argmin(spread)]
+    rotated = np.roll(order_idx, -best)
+    return [rotated[bounds[c]: bounds[c + 1]] for c in range(len(sizes))]
+
+def clustered(depot, orders, points_per_cluster, plot=False):
+    """
+    Sweep-cluster the orders (see sweep_indices()).
+
+    Returns:
+        List of clusters, each a list of the Order objects in it.
+    """
+    lats = np.fromiter((order.lat for order in orders), dtype=float, count=len(orders))
+    lons = np.fromiter((order.lon for order in orders), dtype=float, count=len(orders))
+
+    cluster = [[orders[i] for i in idx] for idx in sweep_indices(depot, lats, lons, points_per_cluster)]
+    if plot:
+        plot_clusters(depot, cluster)
+    return cluster
+
+def split_vehicles(vehicles, clusters):
+    """
+    Split the vehicles into contiguous blocks, one per cluster, proportionally to
+    the number of orders in each cluster (largest remainder, at least one each).
+    """
+    if len(vehicles) < len(clusters):
+        raise ValueError("Need at least one vehicle per cluster ({0} vehicles, {1} clusters)".format(len(vehicles), len(clusters)))
+
+    num_orders = sum(len(c) for c in clusters)
+    spare = len(vehicles) - len(clusters)
+    shares = [spare * len(c) / num_orders for c in clusters]
+    counts = [1 + math.floor(share) for share in shares]
+
+    remainders = sorted(range(len(clusters)), key=lambda i: shares[i] - math.floor(shares[i]), reverse=True)
+    for i in remainders[:len(vehicles) - sum(counts)]:
+        counts[i] += 1
+
+    blocks = []
+    offset = 0
+    for count in counts:
+        blocks.append(vehicles[offset: offset + count])
+        offset += count
+    return blocks
+
+class _RoutesWarmStart():
+    """
+    In-memory counterpart of WarmStartStore for process_VRP(warm_start=...), starting
+    the search from the given routes (lists of orders, one per vehicle).
+    """
+    def __init__(self, routes):
+        self.routes = routes
+
+    def initial_routes(self, customers, fleet):
+        return [[order.current_vrp_index for order in route] for route in self.routes]
+
+    def record(self, routes_list):
+        pass
+
+def _routes_objective(customers, routes):
+    """
+    Objective of routes (lists of orders, one per vehicle from and to the depot) as
+    process_VRP counts it: the length of the routes plus the penalties of the orders
+    left out.
+    """
+    distmat = customers.distmat
+    penalties = customers.get_carryforward_penalties()
+    routed = set()
+    cost = 0
+    for route in routes:
+        path = [0] + [order.current_vrp_index for order in route] + [0]
+        cost += int(distmat[path[:-1], path[1:]].sum())
+        routed.update(path[1:-1])
+    return cost + sum(int(penalties[node - 1]) for node in range(1, customers.number) if node not in routed)
+
+def _solve_cluster(depot, orders, vehicles, solver_kwargs, initial=None):
+    """
+    Solve one cluster in a worker process. Order objects are copies on this side
+    of the pool, so the routes are returned as positions into the cluster's orders
+    (-1 for the depot) together with the predicted times and order statuses.
+
+    initial optionally gives the starting routes, as positions into orders for every
+    vehicle. The objective of these routes and of the solution are then returned too.
+    """
+    from vehicle_routing.vrp import VRP
+
+    t1 = time.time()
+    warm_start = None
+    if initial is not None:
+        warm_start = _RoutesWarmStart([[orders[pos] for pos in route] for route in initial])
+        solver_kwargs = dict(solver_kwargs, warm_start=warm_start)
+    vrp_instance = VRP(depot, orders, vehicles)
+    result = vrp_instance.process_VRP(**solver_kwargs)
+    t2 = time.time()
+
+    positions = {id(order): pos for pos, order in enumerate(orders)}
+    routes = {}
+    objective = initial_objective = None
+    if result is not None:
+        for vehicle_idx, route in vrp_instance.get_routes().items():
+            if route == -1:
+                routes[vehicle_idx] = -1
+                continue
+            routes[vehicle_idx] = [(positions.get(id(node), -1), node.predicted_time) for node in route.route]
+
+        objective = vrp_instance.metrics.objective
+        if warm_start is not None:
+            initial_objective = _routes_objective(vrp_instance.customers, warm_start.routes)
+
+    return {
+        'routes': routes,
+        'statuses': [order.status for order in orders],
+        'time': t2 - t1,
+        'objective': objective,
+        'initial_objective': initial_objective
+    }
+
+def solve_clustered(depot, orders, vehicles, points_per_cluster, workers=None, **solver_kwargs):
+    """
+    Sweep-cluster the orders and solve every cluster as an independent VRP in a process pool.
+
+    Arguments:
+    ------------------
+    depot: Node
+    orders: List[Order]
+    vehicles: List[Vehicle]
+        Split between the clusters by split_vehicles().
+    points_per_cluster: int
+        Passed on to clustered().
+    workers: int
+        Number of worker processes (defaults to the number of CPUs).
+    **solver_kwargs:
+        Passed on to VRP.process_VRP() for every cluster.
+
+    Returns:
+        (RoutesList, timings) where the routes list is keyed by the index of the
+        vehicle in `vehicles` (-1 for unused vehicles), and timings holds the
+        orders, vehicles and solve time of each cluster.
+    """
+    clusters = clustered(depot, orders, points_per_cluster)
+    vehicle_blocks = split_vehicles(vehicles, clusters)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_solve_cluster, depot, cluster, block, solver_kwargs)
+                    for cluster, block in zip(clusters, vehicle_blocks)]
+        results = [future.result() for future in futures]
+
+    routes_list = {}
+    timings = []
+    offset = 0
+    for cluster_idx, (cluster, block, result) in enumerate(zip(clusters, vehicle_blocks, results)):
+        for order, status in zip(cluster, result['statuses']):
+            order.status = status
+
+        for local_idx, vehicle in enumerate(block):
+            vehicle_idx = offset + local_idx
+            vehicle.vehicle_index = vehicle_idx
+            stops = result['routes'].get(local_idx, -1)
+
+            if stops == -1:
+                routes_list[vehicle_idx] = -1
+            else:
+                route = []
+                for i, (pos, predicted_time) in enumerate(stops):
+                    # -1 is the start or the end of the vehicle
+                    if pos == -1:
+                        node = vehicle.start if i == 0 else vehicle.end
+                    else:
+                        node = cluster[pos]
+                    node.predicted_time = predicted_time
+                    node.vehicle = vehicle
+                    route.append(node)
+                routes_list[vehicle_idx] = Route(route, vehicle)
+
+            vehicle.route = routes_list[vehicle_idx]
+
+        timings.append({
+            'cluster': cluster_idx,
+            'orders': len(cluster),
+            'vehicles': len(block),
+            'time': result['time']
+        })
+        offset += len(block)
+
+    return RoutesList(routes_list), timings
+
+def _route_orders(route):
+    # The stops between the start and the end of the vehicle
+    return [] if route == -1 else route.route[1:-1]
+
+def solve_decomposed(depot, orders, vehicles, points_per_cluster, time_budget, window_routes=3,
+        subproblem_time=None, initial_share=0.3, workers=None, **solver_kwargs):
+    """
+    Solve a large instance by decomposition: sweep-cluster and solve the clusters
+    independently (see solve_clustered()), then repair the routes along the cluster
+    boundaries by re-optimizing small windows of neighbouring routes (POPMUSIC).
+
+    Every window is a seed route and its window_routes - 1 nearest routes (by the
+    centroid of their orders), together with the unrouted orders closest to them. It is
+    solved as a VRP of its own, warm started from the current routes, and the new
+    routes are kept when they lower its objective. Disjoint windows are solved in
+    parallel. The routes of an improved window become seeds again, and the repair ends
+    when every route has been a seed without improvement or the time budget runs out.
+
+    Arguments:
+    ------------------
+    depot: Node
+    orders: List[Order]
+    vehicles: List[Vehicle]
+    points_per_cluster: int
+        Size of the initial clusters, passed on to clustered().
+    time_budget: float
+        Seconds for the whole solve.
+    window_routes: int
+        Number of routes in each window.
+    subproblem_time: int
+        Time limit of every window in seconds (defaults to the rest of the budget,
+        split over the rounds of windows the untried seeds still need).
+    initial_share: float
+        Share of the budget given to the initial clusters.
+    workers: int
+        Number of worker processes (defaults to the number of CPUs).
+    **solver_kwargs:
+        Passed on to VRP.process_VRP() for the clusters and the windows (but time_limit).
+
+    Returns:
+        (RoutesList, stats) where the routes list is keyed by the index of the vehicle
+        in `vehicles` (-1 for unused vehicles), and stats holds the 'clusters' timings
+        of solve_clustered() and the 'rounds' of the repair.
+    """
+    start = time.time()
+    workers = workers or os.cpu_count()
+    solver_kwargs.pop('time_limit', None)
+
+    num_clusters = max(1, len(orders) // points_per_cluster)
+    rounds = math.ceil(num_clusters / workers)
+    cluster_time = max(1, int(time_budget * initial_share / rounds))
+    routes_list, cluster_timings = solve_clustered(depot, orders, vehicles, points_per_cluster, workers=workers,
+                                        time_limit=cluster_time, **solver_kwargs)
+    routes = {vehicle_idx: _route_orders(route) for vehicle_idx, route in routes_list.routes_list.items()}
+
+    history = []
+    untried = [vehicle_idx for vehicle_idx, route in routes.items() if route]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while untried:
+            remaining = time_budget - (time.time() - start)
+            if remaining < 1:
+                break
+            # Every round solves up to `workers` windows of window_routes seeds each
+            rounds_left = math.ceil(len(untried) / (workers * window_routes))
+            time_limit = max(1, int(min(subproblem_time or remaining / rounds_left, remaining)))
+
+            used = [vehicle_idx for vehicle_idx, route in routes.items() if route]
+            centroids = np.array([[np.mean([o.lat for o in routes[v]]), np.mean([o.lon for o in routes[v]])] for v in used])
+
+            # Disjoint windows around the untried seeds, one per worker
+            windows = []
+            taken = set()
+            for seed in list(untried):
+                untried.remove(seed)
+                if seed in taken or seed not in used:
+                    continue
+                distances = np.linalg.norm(centroids - centroids[used.index(seed)], axis=1)
+                window = [used[i] for i in np.argsort(distances, kind='stable') if used[i] not in taken][:window_routes]
+                windows.append(window)
+                taken.update(window)
+                if len(windows) == workers:
+                    break
+
+            # Unrouted orders join the window of their closest route
+            unrouted = [order for order in orders if order.status in [0, 1]]
+            extra = {tuple(window): [] for window in windows}
+            if unrouted:
+                points = np.array([[o.lat, o.lon] for o in unrouted])
+                closest = np.argmin(np.linalg.norm(points[:, None, :] - centroids[None, :, :], axis=2), axis=1)
+                for order, i in zip(unrouted, closest.tolist()):
+                    for window in windows:
+                        if used[i] in window:
+                            extra[tuple(window)].append(order)
+
+            submitted = []
+            for window in windows:
+                window_orders = [order for v in window for order in routes[v]] + extra[tuple(window)]
+                for order in extra[tuple(window)]:
+                    order.status = 0
+                positions = {id(order): pos for pos, order in enumerate(window_orders)}
+                initial = [[positions[id(order)] for order in routes[v]] for v in window]
+                future = executor.submit(_solve_cluster, depot, window_orders, [vehicles[v] for v in window],
+                            dict(solver_kwargs, time_limit=time_limit), initial)
+                submitted.append((window, window_orders, future))
+
+            round_stats = {'round': len(history), 'windows': len(windows), 'improved': 0, 'gain': 0}
+            for window, window_orders, future in submitted:
+                result = future.result()
+                improved = (result['objective'] is not None and result['initial_objective'] is not None
+                                and result['objective'] < result['initial_objective'])
+                if not improved:
+                    for order in extra[tuple(window)]:
+                        order.status = 1
+                    continue
+
+                round_stats['improved'] += 1
+                round_stats['gain'] += result['initial_objective'] - result['objective']
+                for order, status in zip(window_orders, result['statuses']):
+                    order.status = status
+                for local_idx, vehicle_idx in enumerate(window):
+                    stops = result['routes'].get(local_idx, -1)
+                    routes[vehicle_idx] = []
+                    if stops != -1:
+                        for pos, predicted_time in stops[1:-1]:
+                            window_orders[pos].predicted_time = predicted_time
+                            routes[vehicle_idx].append(window_orders[pos])
+                    # The routes of an improved window are worth another look
+                    if routes[vehicle_idx] and vehicle_idx not in untried:
+                        untried.append(vehicle_idx)
+
+            round_stats['time'] = time.time() - start
+            history.append(round_stats)
+
+    routes_list = {}
+    for vehicle_idx, vehicle in enumerate(vehicles):
+        vehicle.vehicle_index = vehicle_idx
+        if routes.get(vehicle_idx):
+            for order in routes[vehicle_idx]:
+                order.vehicle = vehicle
+            routes_list[vehicle_idx] = Route([vehicle.start] + routes[vehicle_idx] + [vehicle.end], vehicle)
         else:
-            break
-    plot_clusters(depot, cluster)
-    return cluster
\ No newline at end of file
+            routes_list[vehicle_idx] = -1
+        vehicle.route = routes_list[vehicle_idx]
+
+    return RoutesList(routes_list), {'clusters': cluster_timings, 'rounds': history}
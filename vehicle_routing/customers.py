@@ -1,10 +1,173 @@
-import json
 import time
 import math
-import requests
-import constants
+import logging
+import os
+import tempfile
 import numpy as np
-from sklearn.metrics import pairwise
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Distance of the pairs without a route (null in the OSRM table): longer than any
+# max_route_distance, so the Distance dimension rules them out, and still an int32
+UNROUTABLE_DISTANCE = 1_000_000_000
+
+def euclidean_distances(X, Y):
+    """
+    Euclidean distances between the rows of X and the rows of Y.
+    """
+    diff = X[:, None, :] - Y[None, :, :]
+    return np.sqrt((diff ** 2).sum(axis=-1))
+
+def carryforward_penalties(deadline, priority):
+    """
+    Vectorized Order.carryforward_penalty for arrays of deadlines and priorities.
+    """
+    return 1000_000 * np.exp(-np.asarray(deadline, dtype=float)) + 1000 * np.exp(7 * np.asarray(priority, dtype=float))
+
+def load_change(node):
+    """
+    Change of the vehicle load at a node: -volume for a delivery, +volume for a pickup
+    (see Customers.return_load_vector).
+    """
+    if node.type == 1:
+        return -node.volume
+    if node.type == 2:
+        return node.volume
+    return 0
+
+def insertion_peak_loads(changes, change):
+    """
+    Return the highest load of a route after inserting a node with load change
+    `change` after each of its points but the last.
+
+    changes holds the load change at every point of the route (start and end
+    included). As in the Deliveries/Loads dimensions, everything to deliver is on
+    board at the start, so a delivery raises the load before it and a pickup the
+    load after it.
+    """
+    changes = np.asarray(changes)
+    loads = np.cumsum(changes) - changes[changes < 0].sum()
+    before = np.maximum.accumulate(loads)[:-1]
+    after = np.maximum.accumulate(loads[::-1])[::-1][1:]
+    if change < 0:
+        return np.maximum(before - change, after)
+    return np.maximum(np.maximum(before, loads[:-1] + change), after + change)
+
+def segment_maximum_accumulate(values, segments, reverse=False):
+    """
+    np.maximum.accumulate of the (finite) values, restarted at every segment, given
+    the segment number of every value (non-decreasing). With reverse, the maximum of
+    every value and those after it in its segment.
+
+    The segments are lifted above each other by an offset, so a single accumulate
+    covers all of them.
+    """
+    values = np.asarray(values, dtype=float)
+    segments = np.asarray(segments)
+    if len(values) == 0:
+        return values
+    if reverse:
+        return segment_maximum_accumulate(values[::-1], segments[-1] - segments[::-1])[::-1]
+    offsets = segments * (values.max() - values.min() + 1)
+    return np.maximum.accumulate(values + offsets) - offsets
+
+def haversine_distances(X, Y):
+    """
+    Great circle distances (in radians) between the (lat, lon) rows of X and Y, given in radians.
+    """
+    dlat = Y[None, :, 0] - X[:, None, 0]
+    dlon = Y[None, :, 1] - X[:, None, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(X[:, None, 0]) * np.cos(Y[None, :, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(a))
+
+def paired_euclidean_distances(X, Y):
+    """
+    Euclidean distances between each row of X and the same row of Y.
+    """
+    return np.sqrt(((X - Y) ** 2).sum(axis=-1))
+
+def paired_haversine_distances(X, Y):
+    """
+    Great circle distances (in radians) between each (lat, lon) row of X and the same
+    row of Y, given in radians.
+    """
+    dlat = Y[:, 0] - X[:, 0]
+    dlon = Y[:, 1] - X[:, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(X[:, 0]) * np.cos(Y[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(a))
+
+def nearest_neighbour_arcs(locations, neighbours, method='haversine'):
+    """
+    Return the arcs (rows, cols) from every location to its `neighbours` nearest
+    other locations, found with a KD-tree. For 'haversine' the (lat, lon) degrees are
+    mapped onto the unit sphere, where the straight-line distance orders the points
+    as the great circle distance does.
+    """
+    from scipy.spatial import cKDTree
+
+    if method == 'haversine':
+        lat, lon = np.radians(locations[:, 0]), np.radians(locations[:, 1])
+        points = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    else:
+        points = locations
+
+    k = min(neighbours + 1, len(points))
+    _, cols = cKDTree(points).query(points, k=k)
+    cols = cols.reshape(len(points), k)
+    rows = np.repeat(np.arange(len(points)), k)
+    cols = cols.reshape(-1)
+    # Drop the location itself
+    keep = rows != cols
+    return rows[keep], cols[keep]
+
+def matrix_output(shape, max_bytes=None, directory=None):
+    """
+    Return an empty int32 array for a distance matrix. When it would take more than
+    max_bytes, it is a np.memmap on an anonymous temporary file in directory (default:
+    the system temporary directory) instead, paged in and out by the OS.
+    """
+    dtype = np.dtype(np.int32)
+    if max_bytes is not None and int(np.prod(shape)) * dtype.itemsize > max_bytes:
+        return np.memmap(tempfile.TemporaryFile(dir=directory), dtype=dtype, mode='w+', shape=shape)
+    return np.empty(shape, dtype=dtype)
+
+def transit_matrix_rows(rows):
+    """
+    Return the rows of an integer matrix as the list of lists that
+    RoutingModel.RegisterTransitMatrix takes. The rows are converted one at a time,
+    so no wider copy of the whole matrix is made and a memory-mapped one is read
+    row by row.
+    """
+    return [np.asarray(row).tolist() for row in rows]
+
+def blocked_distances(X, Y, distance, scale, out=None, block_bytes=4 * 1024 * 1024, max_workers=None):
+    """
+    Return ceil(distance(X, Y) * scale) as int32, computed in blocks of rows of X
+    across a thread pool and written straight into out (a new array by default).
+
+    The float temporaries of a block take about block_bytes each, so the memory
+    beyond the output stays bounded, and NumPy releases the GIL inside its ufuncs,
+    so the blocks are computed in parallel (max_workers defaults to the number of CPUs).
+    """
+    max_workers = max_workers or os.cpu_count()
+    if out is None:
+        out = np.empty((len(X), len(Y)), dtype=np.int32)
+    block_rows = max(1, block_bytes // (8 * max(1, len(Y))))
+
+    def fill(start):
+        block = distance(X[start: start + block_rows], Y)
+        block *= scale
+        out[start: start + block_rows] = np.ceil(block, out=block)
+
+    starts = range(0, len(X), block_rows)
+    if len(starts) == 1:
+        fill(0)
+    elif len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list() re-raises the first failed block
+            list(executor.map(fill, starts))
+    return out
 
 class Node:
     def __init__(self, coordinates, type, volume=0, status=0, start_time=None, end_time=None):
@@ -144,6 +307,13 @@ class Customers():
     """
     def __init__(self, depot, orders, service_time = 5):
         self.depot = depot
+        # Options of the dense matrix builder, see make_distance_mat()
+        self.max_matrix_bytes = None
+        self.matrix_dir = None
+        self.matrix_workers = None
+        # OSRM server and session of the 'osrm' method, see osrm.table()
+        self.osrm_base_url = None
+        self.osrm_session = None
         self.number = None
         self.orders = self.process_orders(orders)
         self.customers = self.process_customers()
@@ -165,10 +335,47 @@ class Customers():
         self.number = len(customer_list)
         return customer_list
 
+    def node_limits(self):
+        """
+        Return the load change (see load_change()), and the opening and closing time of
+        the time window (-inf and inf without one) of every node as arrays, extended
+        by add_order().
+        """
+        if getattr(self, '_node_limits', None) is None or len(self._node_limits[0]) != self.number:
+            self._node_limits = tuple(np.array(values, dtype=float) for values in zip(*map(self._limits, self.customers)))
+        return self._node_limits
+
+    def node_positions(self):
+        """
+        Return a dict from the id() of every node to its index in the matrix, extended
+        by add_order().
+        """
+        if getattr(self, '_node_positions', None) is None or len(self._node_positions) != self.number:
+            self._node_positions = {id(node): i for i, node in enumerate(self.customers)}
+        return self._node_positions
+
+    def _limits(self, node):
+        if node.type == 1 and node.start_time and node.end_time:
+            return load_change(node), node.start_time, node.end_time
+        return load_change(node), -np.inf, np.inf
+
+    def get_carryforward_penalties(self):
+        """
+        Return the carry-forward penalty of every order as an array, read straight from
+        the columns when the orders are rows of one OrderTable.
+        """
+        table = getattr(self.orders[0], '_table', None) if self.orders else None
+        if table is not None and all(getattr(o, '_table', None) is table for o in self.orders):
+            idx = np.fromiter((o._idx for o in self.orders), dtype=np.int64, count=len(self.orders))
+            return carryforward_penalties(table.deadline[idx], table.priority[idx])
+
+        return carryforward_penalties([o.deadline for o in self.orders], [o.priority for o in self.orders])
+
     def set_manager(self, manager):
         self.manager = manager
 
-    def make_distance_mat(self, method='haversine'):
+    def make_distance_mat(self, method='haversine', store=None, previous=None, max_matrix_bytes=None,
+            matrix_dir=None, matrix_workers=None, osrm_base_url=None, osrm_session=None):
         """
         Return a distance matrix and make it a member of Customer, using the
         method given in the call. Currently only Haversine (GC distance) is
@@ -176,40 +383,240 @@ class Customers():
         Raises an AssertionError for all other methods.
         Args: method (Optional[str]): method of distance calculation to use. The
         Haversine formula is the only method implemented.
+        store (Optional[MatrixStore]): persistent store to assemble the matrix from,
+        only the distances of unseen locations are computed.
+        previous (Optional[Customers]): the Customers of the last solve, whose matrix
+        is reused for the nodes it shares with this one (same method only).
+        max_matrix_bytes (Optional[int]): above this size the matrix is a np.memmap
+        in matrix_dir (Optional[str]) rather than in memory.
+        matrix_workers (Optional[int]): number of threads computing the matrix blocks.
+        osrm_base_url (Optional[str]), osrm_session (Optional[requests.Session]):
+        server and pooled session the 'osrm' tables are fetched from and over.
         Returns:
-            Numpy array of node to node distances.
+            Numpy int32 array of node to node distances (float for osrm).
         Examples:
             >>> dist_mat = customers.make_distance_mat(method='haversine')
             >>> dist_mat = customers.make_distance_mat(method='manhattan')
             AssertionError
         """
+        self.max_matrix_bytes = max_matrix_bytes
+        self.matrix_dir = matrix_dir
+        self.matrix_workers = matrix_workers
+        self.osrm_base_url = osrm_base_url
+        self.osrm_session = osrm_session
+        compute = self._compute(method)
+
+        if getattr(previous, 'distmat', None) is not None and getattr(previous, 'method', None) == method:
+            self.distmat = self._extend_distance_mat(previous, compute)
+        elif store is not None:
+            self.distmat = store.get_matrix(self.customers, method, compute)
+        else:
+            self.distmat = compute(self.customers)
+        self.method = method
+
+    def _compute(self, method):
         if method == 'haversine':
-            self.distmat = self._haversine(self.customers)
+            return self._haversine
         elif method == 'euclidean':
-            self.distmat = self._euclidean(self.customers)
+            return self._euclidean
+        else:
+            return self._osrm
+
+    def add_order(self, order):
+        """
+        Append an order to the customers, extending the distance matrix with its row
+        and column (computed with the method of the matrix) rather than rebuilding it.
+        Returns:
+            The node index of the order.
+        """
+        compute = self._compute(self.method)
+        n = self.number
+
+        # The matrix is a view of a buffer that doubles when full, so that adding orders
+        # one at a time doesn't copy it every time. Like the matrix, it is memory-mapped
+        # above max_matrix_bytes.
+        buffer = getattr(self, '_distmat_buffer', None)
+        if buffer is None or self.distmat.base is not buffer or len(buffer) <= n:
+            if self.distmat.dtype == np.int32:
+                buffer = matrix_output((2 * n + 1, 2 * n + 1), self.max_matrix_bytes, self.matrix_dir)
+            else:
+                buffer = np.empty((2 * n + 1, 2 * n + 1), dtype=self.distmat.dtype)
+            buffer[:n, :n] = self.distmat
+            self._distmat_buffer = buffer
+
+        buffer[n, :n] = compute([order], self.customers)[0]
+        # Only OSRM distances depend on the direction
+        if self.method in ('haversine', 'euclidean'):
+            buffer[:n, n] = buffer[n, :n]
         else:
-            self.distmat = self._osrm(self.customers)
+            buffer[:n, n] = compute(self.customers, [order])[:, 0]
+        buffer[n, n] = 0
+        self.distmat = buffer[:n + 1, :n + 1]
+
+        order.current_vrp_index = n
+        self.orders.append(order)
+        self.customers.append(order)
+        if getattr(self, '_locations', None) is not None:
+            self._locations = np.concatenate([self._locations, self._locations_of([order])])
+        if getattr(self, '_node_positions', None) is not None:
+            self._node_positions[id(order)] = n
+        if getattr(self, '_node_limits', None) is not None:
+            self._node_limits = tuple(np.append(values, limit) for values, limit in zip(self._node_limits, self._limits(order)))
+        self.number += 1
+        return n
+
+    def _extend_distance_mat(self, previous, compute):
+        """
+        Build the distance matrix from the one of a previous Customers, computing only
+        the rows and columns of the nodes that are new. Nodes that are no longer
+        customers (delivered or failed orders) are left out.
+        """
+        positions = {id(node): i for i, node in enumerate(previous.customers)}
+        prev_idx = np.array([positions.get(id(node), -1) for node in self.customers])
+        kept = np.flatnonzero(prev_idx >= 0)
+        new = np.flatnonzero(prev_idx < 0)
 
-    def _euclidean(self, nodes):
+        if previous.distmat.dtype == np.int32:
+            distmat = matrix_output((self.number, self.number), self.max_matrix_bytes, self.matrix_dir)
+        else:
+            distmat = np.empty((self.number, self.number), dtype=previous.distmat.dtype)
+        distmat[np.ix_(kept, kept)] = previous.distmat[np.ix_(prev_idx[kept], prev_idx[kept])]
+
+        if len(new):
+            new_nodes = [self.customers[i] for i in new]
+            distmat[new, :] = compute(new_nodes, self.customers)
+            if len(kept):
+                distmat[np.ix_(kept, new)] = compute([self.customers[i] for i in kept], new_nodes)
+
+        return distmat
+
+    # Each method returns the distances from nodes to destinations (default: nodes)
+
+    def _locations_of(self, nodes):
+        # (lat, lon) of the nodes, kept for the customers as add_order() reads them on every call
+        if nodes is self.customers:
+            if getattr(self, '_locations', None) is None or len(self._locations) != len(nodes):
+                self._locations = self._locations_of(list(nodes))
+            return self._locations
+        return np.array([[float(o.lat), float(o.lon)] for o in nodes]).reshape(-1, 2)
+
+    def _blocked(self, nodes, destinations, distance, scale, radians=False):
+        # int32 distances computed block by block into the output (see blocked_distances())
+        input_locations = self._locations_of(nodes)
+        if destinations is None:
+            output_locations = input_locations
+        else:
+            output_locations = self._locations_of(destinations)
+        if radians:
+            input_locations, output_locations = np.radians(input_locations), np.radians(output_locations)
+
+        out = matrix_output((len(input_locations), len(output_locations)), self.max_matrix_bytes, self.matrix_dir)
+        return blocked_distances(input_locations, output_locations, distance, scale, out=out,
+                    max_workers=self.matrix_workers)
+
+    def _euclidean(self, nodes, destinations=None):
         # calculate the distance matrix using the euclidean method
-        input_locations = [[float(o.lat), float(o.lon)] for o in nodes]
-        return np.ceil(pairwise.euclidean_distances(input_locations) * 1000)
+        return self._blocked(nodes, destinations, euclidean_distances, 1000)
 
-    def _haversine(self, nodes):
+    def _haversine(self, nodes, destinations=None):
         # calculate the distance matrix using the haversine method
-        input_locations = [[math.radians(float(o.lat)), math.radians(float(o.lon))] for o in nodes]
-        return np.ceil(pairwise.haversine_distances(input_locations) * 6371000)
+        return self._blocked(nodes, destinations, haversine_distances, 6371000, radians=True)
+
+    def _osrm(self, nodes, destinations=None):
+        # fetched in concurrent blocks, see osrm.table()
+        import vehicle_routing.osrm as osrm
+        distances = osrm.table(nodes, destinations, base_url=self.osrm_base_url, session=self.osrm_session)
+        return np.where(np.isnan(distances), UNROUTABLE_DISTANCE, np.ceil(distances))
+
+    def make_sparse_distance_mat(self, method='haversine', neighbours=10, keep=(0,)):
+        """
+        Make the sparse distance matrix of the k nearest neighbour arcs a member of
+        Customer (as sparse_distmat, a scipy CSR matrix), instead of the dense N x N one.
+
+        Only the arcs from every node to its `neighbours` nearest nodes, their
+        reverse arcs and the arcs from and to the nodes in keep (the depot and the
+        vehicle starts) are kept, so the memory grows as N * neighbours.
+        Args: method (Optional[str]): 'haversine' or 'euclidean'.
+        neighbours (int): number of nearest neighbours of every node.
+        keep (Iterable[int]): nodes connected to every other node.
+        Raises a ValueError for 'osrm', as the table service has no per-arc queries.
+        """
+        from scipy.sparse import csr_matrix
+
+        if method not in ('haversine', 'euclidean'):
+            raise ValueError("Sparse distance matrices support 'haversine' and 'euclidean', not {0!r}".format(method))
+
+        locations = np.array([[float(o.lat), float(o.lon)] for o in self.customers]).reshape(-1, 2)
+        n = len(locations)
+
+        knn_rows, knn_cols = nearest_neighbour_arcs(locations, neighbours, method=method)
+        keep = np.array(sorted(set(keep)), dtype=np.int64)
+        everyone = np.arange(n)
+        # k nearest neighbour arcs both ways, arcs from and to the kept nodes, and the diagonal
+        rows = np.concatenate([knn_rows, knn_cols, np.repeat(keep, n), np.tile(everyone, len(keep)), everyone])
+        cols = np.concatenate([knn_cols, knn_rows, np.tile(everyone, len(keep)), np.repeat(keep, n), everyone])
+
+        arcs = np.unique(rows * n + cols)
+        rows, cols = arcs // n, arcs % n
+
+        if method == 'haversine':
+            radians = np.radians(locations)
+            data = np.ceil(paired_haversine_distances(radians[rows], radians[cols]) * 6371000)
+        else:
+            data = np.ceil(paired_euclidean_distances(locations[rows], locations[cols]) * 1000)
+
+        self.sparse_distmat = csr_matrix((data.astype(np.int32), (rows, cols)), shape=(n, n))
+        self.distmat = None
+        self.method = method
+
+    def neighbour_nodes(self, node):
+        """
+        Return the nodes the sparse distance matrix has an arc to from node.
+        """
+        indptr = self.sparse_distmat.indptr
+        return self.sparse_distmat.indices[indptr[node]: indptr[node + 1]]
+
+    def _sparse_rows(self, values):
+        # One {to_node: value} dict per from_node, the fastest lookup from a Python callback
+        indptr, indices = self.sparse_distmat.indptr, self.sparse_distmat.indices.tolist()
+        values = values.tolist()
+        return [dict(zip(indices[indptr[i]: indptr[i + 1]], values[indptr[i]: indptr[i + 1]]))
+                    for i in range(self.sparse_distmat.shape[0])]
+
+    def _index_to_node(self):
+        # The manager's IndexToNode as a list, saving a call into the solver per lookup
+        return [self.manager.IndexToNode(i) for i in range(self.manager.GetNumberOfIndices())]
+
+    def return_sparse_dist_callback(self, no_arc, **kwargs):
+        """
+        Return a callback function for the sparse distance matrix, returning no_arc
+        for the arcs that are not in it.
+        Args: **kwargs: Arbitrary keyword arguments passed on to
+        make_sparse_distance_mat()
+        """
+        self.make_sparse_distance_mat(**kwargs)
+        rows = self._sparse_rows(self.sparse_distmat.data)
+        index_to_node = self._index_to_node()
+
+        def dist_return(from_index, to_index):
+            return rows[index_to_node[from_index]].get(index_to_node[to_index], no_arc)
+
+        return dist_return
 
-    def _osrm(self, nodes):
-        url = constants.OSRM_BASE_URL + 'table/v1/driving/'
+    def make_sparse_total_time_callback(self, no_arc, speed_kmph=25):
+        """
+        Return a callback function of the total time (transit time + service time) of
+        the arcs of the sparse distance matrix, returning no_arc for the others.
+        make_sparse_distance_mat() must be called first.
+        """
+        transit_time = (self.sparse_distmat.data / (speed_kmph * 1000 / 60)).astype(np.int64)
+        rows = self._sparse_rows(transit_time + self.service_time)
+        index_to_node = self._index_to_node()
 
-        for node in nodes:
-            url += str(node.lon) + ',' + str(node.lat) + ';'
-        url = url[:-1] + '?annotations=distance'
-        r = requests.get(url)
-        json_object = json.loads(r.text)
-        # print(json_object)
-        return np.ceil(json_object['distances'])
+        def total_time_return(from_index, to_index):
+            return rows[index_to_node[from_index]].get(index_to_node[to_index], no_arc)
+
+        return total_time_return
 
     def get_total_volume(self):
         """
@@ -227,7 +634,7 @@ class Customers():
                 index and the 'to' node index and returns the distance in km.
         """
         self.make_distance_mat(**kwargs)
-        print(self.distmat)
+        logger.debug('distance matrix:\n%s', self.distmat)
 
         def dist_return(from_index, to_index):
             # Convert from routing variable Index to distance matrix NodeIndex.
@@ -237,6 +644,20 @@ class Customers():
 
         return dist_return
 
+    def return_dist_matrix(self, **kwargs):
+        """
+        Return the distance matrix as integers, ready to be registered natively
+        with RoutingModel.RegisterTransitMatrix so that no Python callback is
+        invoked during the search.
+        Args: **kwargs: Arbitrary keyword arguments passed on to
+        make_distance_mat()
+        Returns:
+            Numpy int32 array of node to node distances (the distance matrix itself,
+            not a copy), to be passed through transit_matrix_rows().
+        """
+        self.make_distance_mat(**kwargs)
+        return self.distmat
+
     def return_delivery_callback(self):
         """
         Return a callback function for the delivery volume.
@@ -277,6 +698,28 @@ class Customers():
 
         return load_return
 
+    def return_delivery_vector(self):
+        """
+        Return the delivery volume of every node as a list, the vector counterpart
+        of return_delivery_callback() for RoutingModel.RegisterUnaryTransitVector.
+        """
+        return [int(-c.volume) if c.type == 1 else 0 for c in self.customers]
+
+    def return_load_vector(self):
+        """
+        Return the load volume ((+pickup) + (-delivery)) of every node as a list, the
+        vector counterpart of return_load_callback().
+        """
+        load = []
+        for c in self.customers:
+            if c.type == 1:
+                load.append(int(-c.volume))
+            elif c.type == 2:
+                load.append(int(c.volume))
+            else:
+                load.append(0)
+        return load
+
     def make_service_time_call_callback(self):
         """
         Return a callback function that provides the time spent servicing the
@@ -306,4 +749,32 @@ class Customers():
         def transit_time_return(a, b):
             return (self.distmat[a][b] / (speed_kmph * 1000 / 60))
 
-        return transit_time_return
\ No newline at end of file
+        return transit_time_return
+
+    def make_total_time_mat(self, speed_kmph=25):
+        """
+        Return the integer total time matrix (transit time + service time), the
+        matrix counterpart of make_transit_time_callback() and
+        make_service_time_call_callback(). make_distance_mat() must be called first.
+        Args:
+            speed_kmph: the average speed in km/h
+        Returns:
+            Numpy int64 array of node to node total times.
+        """
+        return self.total_time(slice(None), slice(None), speed_kmph=speed_kmph)
+
+    def total_time_rows(self, speed_kmph=25):
+        """
+        Yield the rows of make_total_time_mat() one at a time, so that the whole
+        matrix is never held as int64.
+        """
+        for node in range(self.number):
+            yield self.total_time(node, slice(None), speed_kmph=speed_kmph)
+
+    def total_time(self, from_nodes, to_nodes, speed_kmph=25):
+        """
+        Return the integer total times (transit time + service time) between node
+        indices, looked up in the distance matrix with NumPy indexing.
+        """
+        transit_time = (self.distmat[from_nodes, to_nodes] / (speed_kmph * 1000 / 60)).astype(np.int64)
+        return transit_time + self.service_time
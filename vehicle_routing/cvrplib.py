@@ -0,0 +1,172 @@
+import os
+import re
+import math
+from vehicle_routing.customers import Node, Order
+from vehicle_routing.vehicle import Vehicle
+
+# Coordinates are scaled down so that Customers' euclidean matrix (which multiplies
+# by 1000 and rounds up) yields distances in the instance's own units.
+COORD_SCALE = 1000
+
+def read_instance(path):
+    """
+    Parse a TSPLIB/CVRPLIB .vrp file with EUC_2D edge weights.
+
+    Returns:
+        dict with the keys name, dimension, capacity, coords ({node_id: (x, y)}),
+        demands ({node_id: demand}) and depot (node_id).
+    """
+    instance = {'coords': {}, 'demands': {}, 'depot': None}
+    section = None
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == 'EOF':
+                continue
+
+            if ':' in line:
+                key, value = [part.strip() for part in line.split(':', 1)]
+                if key == 'NAME':
+                    instance['name'] = value
+                elif key == 'DIMENSION':
+                    instance['dimension'] = int(value)
+                elif key == 'CAPACITY':
+                    instance['capacity'] = int(value)
+                elif key == 'EDGE_WEIGHT_TYPE' and value != 'EUC_2D':
+                    raise ValueError("Unsupported EDGE_WEIGHT_TYPE {0}".format(value))
+                section = None
+                continue
+
+            if line.endswith('_SECTION'):
+                section = line
+                continue
+
+            fields = line.split()
+            if section == 'NODE_COORD_SECTION':
+                instance['coords'][int(fields[0])] = (float(fields[1]), float(fields[2]))
+            elif section == 'DEMAND_SECTION':
+                instance['demands'][int(fields[0])] = int(fields[1])
+            elif section == 'DEPOT_SECTION':
+                if int(fields[0]) != -1 and instance['depot'] is None:
+                    instance['depot'] = int(fields[0])
+
+    if 'name' not in instance:
+        instance['name'] = os.path.splitext(os.path.basename(path))[0]
+    if instance['depot'] is None:
+        instance['depot'] = 1
+
+    return instance
+
+def read_solution(path):
+    """
+    Parse a CVRPLIB .sol file.
+
+    Returns:
+        (routes, cost) where routes is a list of customer id lists, using the
+        instance's node ids.
+    """
+    routes = []
+    cost = None
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('Route'):
+                # Solution files number customers from 1, with the depot left out.
+                routes.append([int(c) + 1 for c in line.split(':', 1)[1].split()])
+            elif line.startswith('Cost'):
+                cost = float(line.split()[1])
+
+    return routes, cost
+
+def num_vehicles_from_name(name):
+    """
+    Return the k in an X-n<nodes>-k<vehicles> instance name, or None.
+    """
+    match = re.search(r'-k(\d+)', name)
+    return int(match.group(1)) if match else None
+
+def euc_2d(a, b):
+    """
+    TSPLIB EUC_2D distance: euclidean distance rounded to the nearest integer.
+    """
+    return int(math.hypot(a[0] - b[0], a[1] - b[1]) + 0.5)
+
+def route_cost(instance, routes):
+    """
+    Return the EUC_2D cost of a list of customer id routes, each starting and
+    ending at the depot.
+    """
+    coords = instance['coords']
+    depot = instance['depot']
+    cost = 0
+    for route in routes:
+        path = [depot] + list(route) + [depot]
+        for a, b in zip(path[:-1], path[1:]):
+            cost += euc_2d(coords[a], coords[b])
+    return cost
+
+def build_problem(instance, num_vehicles=None):
+    """
+    Build the depot, orders and vehicles of a CVRPLIB instance.
+    Every customer becomes a delivery Order whose AWB is its node id.
+
+    Arguments:
+    ------------------
+    instance: dict
+        As returned by read_instance().
+    num_vehicles: int
+        Size of the fleet (defaults to the k in the instance name).
+    """
+    def to_coordinates(node_id):
+        x, y = instance['coords'][node_id]
+        return [x / COORD_SCALE, y / COORD_SCALE]
+
+    depot = Node(to_coordinates(instance['depot']), 0)
+
+    orders = []
+    for node_id in sorted(instance['coords']):
+        if node_id == instance['depot']:
+            continue
+        orders.append(Order(instance['demands'][node_id], to_coordinates(node_id), 1, AWB=node_id))
+
+    if num_vehicles is None:
+        num_vehicles = num_vehicles_from_name(instance['name']) or len(orders)
+
+    vehicles = []
+    for i in range(num_vehicles):
+        vehicles.append(Vehicle(instance['capacity'], start=depot, end=depot))
+
+    return depot, orders, vehicles
+
+def routes_from_search(vrp_instance, routing):
+    """
+    Return the routes of the solution the search of vrp_instance.process_VRP() has
+    just found as lists of node ids, to be called from its solution_callback.
+    """
+    manager = vrp_instance.customers.manager
+    customers = vrp_instance.customers.customers
+    routes = []
+    for vehicle_idx in range(routing.vehicles()):
+        index = routing.NextVar(routing.Start(vehicle_idx)).Value()
+        route = []
+        while not routing.IsEnd(index):
+            route.append(int(customers[manager.IndexToNode(index)].AWB))
+            index = routing.NextVar(index).Value()
+        if route:
+            routes.append(route)
+    return routes
+
+def routes_from_vrp(vrp_instance):
+    """
+    Return the solved routes of a VRP built by build_problem() as lists of node ids.
+    """
+    routes = []
+    for vehicle_idx, route in vrp_instance.get_routes().items():
+        if route == -1:
+            continue
+        customers = [int(order.AWB) for order in route.route if order.type != 0]
+        if customers:
+            routes.append(customers)
+    return routes
@@ -0,0 +1,91 @@
+import os
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString
+import vehicle_routing.osrm as osrm
+
+def _leg_key(source, destination, precision):
+    return (round(float(source[0]), precision), round(float(source[1]), precision),
+            round(float(destination[0]), precision), round(float(destination[1]), precision))
+
+def route_geometries(vrp_instance, cache=None, precision=5, base_url=None, max_workers=4, retries=3, timeout=30):
+    """
+    Return the road geometry of every route as a GeoDataFrame (one LineString per
+    used vehicle, in lon/lat).
+
+    The geometry is fetched from the OSRM route service leg by leg (between
+    consecutive stops), and every leg is kept in cache, keyed by its coordinates
+    rounded to precision decimals. Only the legs that are not in the cache are
+    fetched, concurrently (see osrm.legs()), so exporting again after a reroute only
+    fetches the legs that changed.
+
+    Arguments:
+    ------------------
+    vrp_instance: VRP
+    cache: Dict
+        Leg geometries (defaults to vrp_instance.leg_geometries).
+    precision: int
+        Number of decimals the coordinates are rounded to before keying (5 ~ 1m).
+    base_url, max_workers, retries, timeout:
+        Passed on to osrm.legs().
+
+    Returns:
+        GeoDataFrame with the 'Route' number (from 1) and 'Vehicle' index of every route.
+    """
+    if cache is None:
+        cache = vrp_instance.leg_geometries
+
+    routes = []
+    for vehicle_idx, route_obj in vrp_instance.get_routes().items():
+        if route_obj == -1:
+            continue
+        stops = [order.coordinates for order in route_obj.route]
+        routes.append((vehicle_idx, stops, [_leg_key(a, b, precision) for a, b in zip(stops[:-1], stops[1:])]))
+
+    missing = {}
+    for _, stops, keys in routes:
+        for (source, destination), key in zip(zip(stops[:-1], stops[1:]), keys):
+            if key not in cache and key not in missing:
+                missing[key] = (source, destination)
+    if missing:
+        fetched = osrm.legs(list(missing.values()), base_url=base_url, max_workers=max_workers,
+                        retries=retries, timeout=timeout)
+        cache.update(zip(missing.keys(), fetched))
+
+    geo_routes = []
+    for _, stops, keys in routes:
+        points = []
+        for key in keys:
+            leg = cache[key]
+            # Every leg starts where the previous one ended
+            points.extend(leg[1:] if points else leg)
+        if len(points) < 2:
+            points = [[stops[0][1], stops[0][0]]] * 2
+        geo_routes.append(LineString(points))
+
+    data = pd.DataFrame({'Route': [str(i+1) for i in range(len(routes))],
+                        'Vehicle': [vehicle_idx for vehicle_idx, _, _ in routes]})
+    return gpd.GeoDataFrame(data, geometry=geo_routes, crs='EPSG:4326')
+
+def export_routes(vrp_instance, path, **kwargs):
+    """
+    Write the road geometry of the routes (see route_geometries()) to a single file:
+    GeoParquet when path ends with '.parquet', GeoPackage otherwise.
+
+    Returns:
+        The GeoDataFrame, to be handed on to plotting without reading the file back.
+    """
+    geometries = route_geometries(vrp_instance, **kwargs)
+    if path.endswith('.parquet'):
+        geometries.to_parquet(path)
+    else:
+        geometries.to_file(path, driver='GPKG', layer='routes', mode='w')
+    return geometries
+
+def export_shapefile(vrp_instance, shapefilename='_test', **kwargs):
+    geometries = route_geometries(vrp_instance, **kwargs)
+    export_dir = os.path.join(os.path.dirname(__file__), '../shapefile')
+    os.makedirs(export_dir, exist_ok=True)
+    # myGDF.to_file(filename='myshapefile_test.shp.zip', driver='ESRI Shapefile')
+    geometries.to_file(os.path.join(export_dir, '{0}.shp'.format(shapefilename)), mode='w')
+    return geometries
@@ -1,12 +1,15 @@
 import time
 import math
 import random 
+import logging
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 from vehicle_routing.customers import Node, Order
+from vehicle_routing.order_table import OrderTable
 from vehicle_routing.vehicle import Vehicle
 from ortools.constraint_solver import routing_enums_pb2  
+
+logger = logging.getLogger(__name__)
   
 def timer_func(func):
     # This function shows the execution time of 
@@ -15,7 +18,7 @@ def timer_func(func):
         t1 = time.time()
         result = func(*args, **kwargs)
         t2 = time.time()
-        print(f'Function {func.__name__!r} executed in {(t2-t1):.4f}s')
+        logger.info('Function %r executed in %.4fs', func.__name__, t2 - t1)
         return result
     return wrap_func
 
@@ -33,27 +36,31 @@ def generate_locs(num_rows):
     
     return np.array(result)
 
-def generate_problem_from_file(path_to_delivery, path_to_pickup):
+def generate_problem_from_file(path_to_delivery, path_to_pickup, cache_dir=None, chunksize=None):
+    """
+    Build a problem from a delivery and a pickup file (CSV, Parquet or Excel).
+    The columns are parsed in bulk by vehicle_routing.loader, and cached in cache_dir
+    (keyed by the file hash) when given.
+    """
+    import vehicle_routing.loader as loader
+
     depot = Node([12.9716, 77.5946], 0)
 
-    delivery_df = pd.read_excel(path_to_delivery)
-    pickup_df = pd.read_excel(path_to_pickup)
+    deliveries = loader.load(path_to_delivery, 'delivery', cache_dir=cache_dir, chunksize=chunksize)
+    pickups = loader.load(path_to_pickup, 'pickup', cache_dir=cache_dir, chunksize=chunksize)
 
-    orders = []
     vehicles = []
 
-    for index, row in delivery_df.iterrows():
-        if pd.notnull(row["lat"]) and pd.notnull(row["lon"]):
-            if pd.notnull(row["EDD"]):
-                deadline = math.ceil((datetime.strptime(row['EDD'], "%d-%m-%Y") - datetime.now()).total_seconds() / (60 * 60 * 24))
-            else:
-                deadline = 0
-            orders.append(Order(1, [row['lat'], row['lon']],  1, AWB=row['AWB'], SKU=row['product_id'], deadline=deadline))
-
-    for index, row in pickup_df.iterrows():
-        if row['lat'] is not None and row['lon'] is not None:
-            orders.append(Order(1, [row['lat'], row['lon']], 2, SKU=row['product_id']))
-    
+    n_deliveries = len(deliveries['lat'])
+    n_pickups = len(pickups['lat'])
+    table = OrderTable(np.concatenate([deliveries['lat'], pickups['lat']]),
+                np.concatenate([deliveries['lon'], pickups['lon']]),
+                np.repeat([1, 2], [n_deliveries, n_pickups]),
+                deadline=np.concatenate([loader.deadlines(deliveries['EDD']), np.zeros(n_pickups, dtype=int)]),
+                AWB=[awb or None for awb in deliveries['AWB'].tolist()] + [None] * n_pickups,
+                SKU=[sku or None for sku in deliveries['product_id'].tolist() + pickups['product_id'].tolist()])
+    orders = table.orders
+
     num_vehicles = max(1, len(orders) // 20)
 
     for i in range(num_vehicles):
@@ -93,7 +100,7 @@ def generate_random_problem(num_orders=50, **kwargs):
     for i in range(num_vehicles):
         vehicles.append(Vehicle(25, start=depot, end=depot))
     
-    print(len(orders), len(vehicles))
+    logger.debug('%d orders, %d vehicles', len(orders), len(vehicles))
     return depot, orders, vehicles
 
 def get_local_search_metaheuristic(local_mh):
@@ -140,7 +147,7 @@ def vehicle_output_string(manager, routing, plan):
         (string) plan_output: describing each vehicle's plan.
         (List) dropped: list of dropped orders.
     """
-    print('The Objective Value is {0}'.format(plan.ObjectiveValue()))
+    logger.info('The Objective Value is %s', plan.ObjectiveValue())
     dropped = []
     for order in range(routing.Size()):
         if (plan.Value(routing.NextVar(order)) == order):
@@ -182,5 +189,5 @@ def vehicle_output_string(manager, routing, plan):
         plan_output += ' Total Distance Travelled: {0}'.format(total_distance)
         plan_output += '\n'
 
-    print('Total Distance: ', total_distance)
+    logger.info('Total Distance: %s', total_distance)
     return (plan_output, dropped, total_distance)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 1
+
+DELIVERY_COLUMNS = ['lat', 'lon', 'AWB', 'product_id', 'EDD']
+PICKUP_COLUMNS = ['lat', 'lon', 'product_id']
+
+def _name(source):
+    # Uploaded files (e.g. from Streamlit) carry their name in .name
+    return source if isinstance(source, str) else getattr(source, 'name', '')
+
+def file_hash(source):
+    """
+    Return the sha1 of the contents of a path or file-like object.
+    """
+    digest = hashlib.sha1()
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()
+
+def read_table(source, columns, chunksize=None):
+    """
+    Read the columns of a CSV, Parquet or Excel file into a DataFrame, dropping the
+    rows without coordinates.
+
+    Arguments:
+    ------------------
+    source: str or file-like
+    columns: List[str]
+    chunksize: int
+        Read CSV files this many rows at a time, filtering every chunk before the
+        next one is read.
+    """
+    extension = os.path.splitext(_name(source))[1].lower()
+
+    if extension == '.csv':
+        if chunksize is None:
+            chunks = [pd.read_csv(source, usecols=columns)]
+        else:
+            chunks = pd.read_csv(source, usecols=columns, chunksize=chunksize)
+        df = pd.concat([chunk[chunk['lat'].notnull() & chunk['lon'].notnull()] for chunk in chunks],
+                    ignore_index=True)
+    else:
+        if extension == '.parquet':
+            df = pd.read_parquet(source, columns=columns)
+        else:
+            df = pd.read_excel(source, usecols=columns)
+        df = df[df['lat'].notnull() & df['lon'].notnull()].reset_index(drop=True)
+
+    return df[columns]
+
+def _strings(series):
+    # Missing values become ''
+    return series.astype(str).where(series.notnull(), '').to_numpy(dtype=str)
+
+def parse_deliveries(df):
+    """
+    Return the columns of a delivery table as arrays, with EDD parsed to dates
+    (NaT when missing).
+    """
+    return {
+        'lat': df['lat'].to_numpy(dtype=float),
+        'lon': df['lon'].to_numpy(dtype=float),
+        'AWB': _strings(df['AWB']),
+        'product_id': _strings(df['product_id']),
+        'EDD': pd.to_datetime(df['EDD'], format='%d-%m-%Y').to_numpy(dtype='datetime64[s]')
+    }
+
+def parse_pickups(df):
+    """
+    Return the columns of a pickup table as arrays.
+    """
+    return {
+        'lat': df['lat'].to_numpy(dtype=float),
+        'lon': df['lon'].to_numpy(dtype=float),
+        'product_id': _strings(df['product_id'])
+    }
+
+def load(source, kind, cache_dir=None, chunksize=None):
+    """
+    Load a delivery or pickup file as a dict of column arrays.
+
+    When cache_dir is given, the parsed columns are cached there as an NPZ keyed by
+    the hash of the file, so unchanged files are not parsed again.
+
+    Arguments:
+    ------------------
+    source: str or file-like
+        CSV, Parquet or Excel file.
+    kind: str
+        'delivery' or 'pickup'.
+    """
+    columns, parse = {
+        'delivery': (DELIVERY_COLUMNS, parse_deliveries),
+        'pickup': (PICKUP_COLUMNS, parse_pickups)
+    }[kind]
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, '{0}-v{1}-{2}.npz'.format(kind, CACHE_VERSION, file_hash(source)))
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                return {column: data[column] for column in data.files}
+
+    parsed = parse(read_table(source, columns, chunksize=chunksize))
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = cache_file + '.tmp.npz'
+        np.savez(tmp_file, **parsed)
+        os.replace(tmp_file, cache_file)
+
+    return parsed
+
+def deadlines(edd, now=None):
+    """
+    Return the number of days left until each EDD, rounded up (0 where it is missing).
+    """
+    if now is None:
+        now = datetime.now()
+    days = np.ceil((edd - np.datetime64(now, 's')) / np.timedelta64(1, 'D'))
+    return np.where(np.isnat(edd), 0, days).astype(int)
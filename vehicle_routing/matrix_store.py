@@ -0,0 +1,282 @@
+import os
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from vehicle_routing.customers import UNROUTABLE_DISTANCE
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Matrix entries of the pairs that were never computed, and of those without a route
+# (NaN in the distances of compute())
+NOT_COMPUTED = -1
+UNROUTABLE = -2
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on the file at path (created if needed), across threads
+    and processes.
+    """
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _stamp(path):
+    # Identifies the version of a file: os.replace() gives every version a new inode
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class MatrixStore():
+    """
+    An on-disk store of node to node distances, keyed by rounded coordinates and
+    the edge weight method, so that repeat solves only compute the distances of
+    locations they have not seen before.
+
+    Each method is kept in its own '<method>.npz' file holding the location keys and
+    an int32 distance matrix between them (NOT_COMPUTED where a pair was never
+    computed, UNROUTABLE where it has no route), and a small '<method>.lru.npz' file
+    with the tick at which every location was last used. The matrix file is only
+    rewritten when new distances were computed, the ticks on every call. When the
+    matrix would grow past max_bytes, the least recently used locations are evicted.
+
+    Several threads or processes can share a store: files are written to a unique
+    temporary file and renamed over the old one, the read-merge-write of every call
+    holds a lock on '<method>.lock', and the distances are computed outside of it.
+
+        Attributes:
+        -----------
+        path: str
+            Directory holding the store files.
+        precision: int
+            Number of decimals the coordinates are rounded to before keying (5 ~ 1m).
+        max_bytes: int
+            Size budget of the matrix of each method.
+        unroutable_distance: int
+            Distance returned for the pairs without a route.
+
+        Methods:
+        -----------
+        get_matrix(nodes, method, compute) -> np.ndarray: Assemble the distance matrix of the nodes.
+        clear(method=None) -> None: Delete the stored matrices.
+    """
+    def __init__(self, path, precision=5, max_bytes=256 * 1024 * 1024, unroutable_distance=UNROUTABLE_DISTANCE):
+        self.path = path
+        self.precision = precision
+        self.max_bytes = max_bytes
+        self.max_locations = int((max_bytes / np.dtype(np.int32).itemsize) ** 0.5)
+        self.unroutable_distance = unroutable_distance
+        self._stores = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, method):
+        return os.path.join(self.path, '{0}.npz'.format(method))
+
+    def _lru_file(self, method):
+        return os.path.join(self.path, '{0}.lru.npz'.format(method))
+
+    def _lock(self, method):
+        return file_lock(os.path.join(self.path, '{0}.lock'.format(method)))
+
+    def _load(self, method):
+        """
+        Return the store of the method, reading the matrix file again when another
+        process replaced it since. Called with the lock held.
+        """
+        stamp = _stamp(self._file(method))
+        store = self._stores.get(method)
+        if store is None or store['stamp'] != stamp:
+            if stamp is not None:
+                with np.load(self._file(method)) as data:
+                    store = {'keys': data['keys'], 'matrix': data['matrix']}
+            else:
+                store = {'keys': np.empty((0, 2)), 'matrix': np.empty((0, 0), dtype=np.int32)}
+            store['stamp'] = stamp
+            store['index'] = {tuple(key): i for i, key in enumerate(store['keys'].tolist())}
+            self._stores[method] = store
+
+        # The ticks change on every call, from any process
+        store['last_used'] = np.zeros(len(store['keys']), dtype=np.int64)
+        store['tick'] = 0
+        if os.path.exists(self._lru_file(method)):
+            with np.load(self._lru_file(method)) as data:
+                store['tick'] = int(data['tick'])
+                if len(data['last_used']) == len(store['keys']):
+                    store['last_used'] = data['last_used']
+        return store
+
+    def _write(self, file, **arrays):
+        # Readers see either the old or the new file, never a partly written one
+        fd, tmp_file = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_file, file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def _save(self, method, store, matrix=True):
+        if matrix:
+            self._write(self._file(method), keys=store['keys'], matrix=store['matrix'])
+            store['stamp'] = _stamp(self._file(method))
+        self._write(self._lru_file(method), last_used=store['last_used'], tick=store['tick'])
+
+    def _grow(self, store, new_keys):
+        old_n = len(store['keys'])
+        new_n = old_n + len(new_keys)
+
+        matrix = np.full((new_n, new_n), NOT_COMPUTED, dtype=np.int32)
+        matrix[:old_n, :old_n] = store['matrix']
+        store['matrix'] = matrix
+        store['keys'] = np.concatenate([store['keys'], np.asarray(new_keys, dtype=float).reshape(-1, 2)])
+        store['last_used'] = np.concatenate([store['last_used'], np.zeros(len(new_keys), dtype=np.int64)])
+        for i, key in enumerate(new_keys):
+            store['index'][key] = old_n + i
+
+    def _encode(self, distances):
+        # NaN distances (no route) can't be cast to int32, they are stored as UNROUTABLE
+        distances = np.asarray(distances)
+        if distances.dtype.kind == 'f':
+            distances = np.where(np.isnan(distances), UNROUTABLE, distances)
+        return distances.astype(np.int32)
+
+    def _missing(self, store, keys):
+        """
+        Return the (rows, cols) blocks of positions into keys whose distances are not
+        in the store.
+        """
+        known = np.array([key in store['index'] for key in keys], dtype=bool)
+        new_pos = np.flatnonzero(~known)
+        old_pos = np.flatnonzero(known)
+        everyone = np.arange(len(keys))
+
+        blocks = []
+        # Rows and columns of the new locations
+        if len(new_pos):
+            blocks.append((new_pos, everyone))
+            if len(old_pos):
+                blocks.append((old_pos, new_pos))
+
+        # Pairs of known locations that were never needed together before
+        idx = np.array([store['index'][keys[i]] for i in old_pos], dtype=np.int64)
+        sub = store['matrix'][np.ix_(idx, idx)]
+        missing_rows = old_pos[(sub == NOT_COMPUTED).any(axis=1)]
+        if len(missing_rows):
+            blocks.append((missing_rows, old_pos))
+        return blocks
+
+    def _compute(self, blocks, nodes, compute):
+        return [(rows, cols, self._encode(compute([nodes[i] for i in rows], [nodes[j] for j in cols])))
+                    for rows, cols in blocks]
+
+    def _merge(self, store, keys, computed):
+        new_keys = list(dict.fromkeys(keys[i] for rows, cols, _ in computed for i in np.concatenate([rows, cols])
+                        if keys[i] not in store['index']))
+        if new_keys:
+            self._grow(store, new_keys)
+        for rows, cols, distances in computed:
+            row_idx = [store['index'][keys[i]] for i in rows]
+            col_idx = [store['index'][keys[j]] for j in cols]
+            store['matrix'][np.ix_(row_idx, col_idx)] = distances
+
+    def _evict(self, store, keep):
+        """
+        Drop the least recently used locations until the store fits max_locations,
+        never dropping the locations in keep.
+        """
+        excess = len(store['keys']) - self.max_locations
+        if excess <= 0:
+            return
+
+        last_used = store['last_used'].copy()
+        last_used[keep] = np.iinfo(np.int64).max
+        drop = np.argsort(last_used, kind='stable')[:excess]
+        drop = drop[last_used[drop] != np.iinfo(np.int64).max]
+
+        kept = np.setdiff1d(np.arange(len(store['keys'])), drop)
+        store['keys'] = store['keys'][kept]
+        store['matrix'] = store['matrix'][np.ix_(kept, kept)]
+        store['last_used'] = store['last_used'][kept]
+        store['index'] = {tuple(key): i for i, key in enumerate(store['keys'].tolist())}
+
+    def get_matrix(self, nodes, method, compute):
+        """
+        Return the distance matrix between the nodes, computing only the pairs that are
+        not in the store yet.
+
+        Arguments:
+        ------------------
+        nodes: List[Node]
+        method: str
+            The edge weight method ('haversine', 'euclidean', 'osrm'), stored separately.
+        compute: function
+            compute(sources, destinations) -> array of distances from every source node
+            to every destination node, NaN where there is no route.
+
+        Returns:
+            Numpy int32 array of node to node distances, unroutable_distance for the
+            pairs without a route.
+        """
+        keys = np.round(np.array([[float(n.lat), float(n.lon)] for n in nodes]).reshape(-1, 2), self.precision)
+        uniq_keys, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        uniq_keys = [tuple(key) for key in uniq_keys.tolist()]
+        uniq_nodes = [nodes[i] for i in first]
+
+        with self._lock(method):
+            blocks = self._missing(self._load(method), uniq_keys)
+        # Computed without the lock, so that solves sharing the store don't wait on each other
+        computed = self._compute(blocks, uniq_nodes, compute)
+
+        with self._lock(method):
+            # Merged into the latest file, which other processes may have written meanwhile
+            store = self._load(method)
+            self._merge(store, uniq_keys, computed)
+            # Locations another process evicted in the meantime
+            late = self._compute(self._missing(store, uniq_keys), uniq_nodes, compute)
+            self._merge(store, uniq_keys, late)
+            changed = len(computed) + len(late) > 0
+
+            idx = np.array([store['index'][key] for key in uniq_keys], dtype=np.int64)
+            store['tick'] += 1
+            store['last_used'][idx] = store['tick']
+            distmat = store['matrix'][np.ix_(idx, idx)][np.ix_(inverse, inverse)]
+
+            if changed:
+                self._evict(store, idx)
+            self._save(method, store, matrix=changed)
+
+        distmat[distmat == UNROUTABLE] = self.unroutable_distance
+        return distmat
+
+    def clear(self, method=None):
+        """
+        Delete the stored matrix of the method, or of every method.
+        """
+        methods = [method] if method is not None else sorted({f.split('.')[0] for f in os.listdir(self.path) if f.endswith('.npz')})
+        for m in methods:
+            with self._lock(m):
+                self._stores.pop(m, None)
+                for file in (self._file(m), self._lru_file(m)):
+                    if os.path.exists(file):
+                        os.remove(file)
@@ -0,0 +1,141 @@
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is reported as None there
+    resource = None
+
+def peak_rss_mb():
+    """
+    Return the peak resident memory of the process in MB (None on Windows).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class SolveMetrics():
+    """
+    Timings and counters of a single process_VRP call, kept in VRP.metrics.
+
+        Attributes:
+        -----------
+        phases: Dict[str, float]
+            Seconds spent in each phase:
+                matrix : building the distance and time matrices
+                model : building the customers, fleet, dimensions and constraints
+                first_solution : from the start of the search to its first solution
+                local_search : from the first solution to the end of the search
+                total : the whole call
+        solutions: int
+            Number of solutions reported by the search.
+        trajectory: List[Tuple[float, int]]
+            (seconds since the start of the search, objective) of every improving solution.
+        objective: int
+            Objective of the returned solution (None when none was found).
+        dropped: int
+            Number of orders left unrouted (postponed).
+        peak_rss_mb: float
+            Peak resident memory of the process at the end of the call.
+        labels: Dict[str, str]
+            Extra labels of the Prometheus samples.
+
+        Methods:
+        -----------
+        phase(name): Context manager adding the time of its block to a phase.
+        to_json() -> str: The metrics as a JSON record.
+        to_prometheus(prefix='vrp_solve') -> str: The metrics in the Prometheus text exposition format.
+    """
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.phases = {'matrix': 0.0, 'model': 0.0, 'first_solution': 0.0, 'local_search': 0.0, 'total': 0.0}
+        self.solutions = 0
+        self.trajectory = []
+        self.objective = None
+        self.dropped = None
+        self.peak_rss_mb = None
+
+        self._start = time.perf_counter()
+        self._search_start = None
+        self._first_solution = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def start_search(self):
+        self._search_start = time.perf_counter()
+        self.phases['model'] = self._search_start - self._start - self.phases['matrix']
+
+    def add_solution(self, objective):
+        now = time.perf_counter()
+        self.solutions += 1
+        if self._first_solution is None:
+            self._first_solution = now
+        if not self.trajectory or objective < self.trajectory[-1][1]:
+            self.trajectory.append((round(now - self._search_start, 6), objective))
+
+    def finish(self, objective=None, dropped=None):
+        end = time.perf_counter()
+        if self._search_start is not None:
+            first_solution = self._first_solution if self._first_solution is not None else end
+            self.phases['first_solution'] = first_solution - self._search_start
+            self.phases['local_search'] = end - first_solution
+        self.phases['total'] = end - self._start
+        self.objective = objective
+        self.dropped = dropped
+        self.peak_rss_mb = peak_rss_mb()
+
+    def to_dict(self):
+        return {
+            'labels': self.labels,
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'solutions': self.solutions,
+            'trajectory': self.trajectory,
+            'objective': self.objective,
+            'dropped': self.dropped,
+            'peak_rss_mb': self.peak_rss_mb
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix='vrp_solve'):
+        def labels(extra=None):
+            merged = dict(self.labels, **(extra or {}))
+            if not merged:
+                return ''
+            return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                            for k, v in sorted(merged.items())) + '}'
+
+        lines = [
+            '# HELP {0}_phase_seconds Time spent in each phase of process_VRP.'.format(prefix),
+            '# TYPE {0}_phase_seconds gauge'.format(prefix)
+        ]
+        for name, seconds in self.phases.items():
+            lines.append('{0}_phase_seconds{1} {2}'.format(prefix, labels({'phase': name}), repr(seconds)))
+
+        gauges = [
+            ('solutions', 'Number of solutions found by the search.', self.solutions),
+            ('objective', 'Objective of the returned solution.', self.objective),
+            ('dropped_orders', 'Number of orders left unrouted.', self.dropped),
+            ('peak_rss_bytes', 'Peak resident memory of the process.',
+                None if self.peak_rss_mb is None else int(self.peak_rss_mb * 1024 * 1024))
+        ]
+        for name, help_text, value in gauges:
+            if value is None:
+                continue
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, name, help_text))
+            lines.append('# TYPE {0}_{1} gauge'.format(prefix, name))
+            lines.append('{0}_{1}{2} {3}'.format(prefix, name, labels(), value))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,210 @@
+import time
+import numpy as np
+from vehicle_routing.customers import Order, carryforward_penalties
+
+# Stands in for None in the integer columns
+MISSING = np.iinfo(np.int64).min
+
+class OrderTable():
+    """
+    Struct-of-arrays storage for a large number of orders.
+
+    Every numeric attribute of Order is a NumPy column, and the few free-form ones
+    (AWB, SKU, vehicle, orientation, position) are plain lists. The orders themselves
+    are OrderView objects, which only hold the table and a row index, so that code
+    written against Order keeps working while the penalties and any other bulk
+    computation run on the columns.
+
+        Attributes:
+        -----------
+        lat, lon: np.ndarray (float64)
+        type, status, volume, deadline: np.ndarray (int64)
+        priority, routing_time: np.ndarray (float64)
+        start_time, end_time, predicted_time, current_vrp_index, vehicle_index: np.ndarray (int64)
+            MISSING where the Order attribute is None.
+        orders: List[OrderView]
+            One view per row, created once so that the orders keep their identity.
+
+        Methods:
+        -----------
+        from_orders(orders) -> OrderTable: Copy a list of orders into a table.
+        append(...) -> OrderView: Add an order and return its view.
+        carryforward_penalties() -> np.ndarray: Penalties of all orders.
+    """
+    INT_COLUMNS = ['type', 'status', 'volume', 'deadline', 'start_time', 'end_time',
+                    'predicted_time', 'current_vrp_index', 'vehicle_index']
+    FLOAT_COLUMNS = ['lat', 'lon', 'priority', 'routing_time']
+    OBJECT_COLUMNS = ['AWB', 'SKU', 'vehicle', 'orientation', 'position']
+
+    def __init__(self, lat, lon, type, volume=1, status=0, deadline=0, priority=0, start_time=None,
+            end_time=None, AWB=None, SKU=None, routing_time=None):
+        n = len(lat)
+
+        def column(values, dtype, default):
+            if values is None:
+                return np.full(n, default, dtype=dtype)
+            values = np.array(values, dtype=dtype)
+            # Scalars fill the column, and per-order values of shape (1,) are flattened
+            return np.full(n, values, dtype=dtype) if values.ndim == 0 else values.reshape(n)
+
+        self.lat = column(lat, np.float64, 0)
+        self.lon = column(lon, np.float64, 0)
+        self.type = column(type, np.int64, 0)
+        self.volume = column(volume, np.int64, 0)
+        self.status = column(status, np.int64, 0)
+        self.deadline = column(deadline, np.int64, 0)
+        self.priority = column(priority, np.float64, 0)
+        self.start_time = column(start_time, np.int64, MISSING)
+        self.end_time = column(end_time, np.int64, MISSING)
+        self.routing_time = column(routing_time, np.float64, time.time())
+        self.predicted_time = column(None, np.int64, MISSING)
+        self.current_vrp_index = column(None, np.int64, MISSING)
+        self.vehicle_index = column(None, np.int64, MISSING)
+
+        self.AWB = [None if a is None else str(a) for a in AWB] if AWB is not None else [None] * n
+        self.SKU = list(SKU) if SKU is not None else [None] * n
+        self.vehicle = [None] * n
+        self.orientation = [None] * n
+        self.position = [None] * n
+
+        self.orders = [OrderView(self, i) for i in range(n)]
+
+    @classmethod
+    def from_orders(cls, orders):
+        """
+        Copy a list of Order objects into a new table.
+        """
+        def ints(name):
+            return [MISSING if getattr(o, name) is None else getattr(o, name) for o in orders]
+
+        table = cls([o.lat for o in orders], [o.lon for o in orders], [o.type for o in orders],
+                volume=[o.volume for o in orders], status=[o.status for o in orders],
+                deadline=[o.deadline for o in orders], priority=[o.priority for o in orders],
+                start_time=ints('start_time'), end_time=ints('end_time'),
+                AWB=[o.AWB for o in orders], SKU=[o.SKU for o in orders],
+                routing_time=[o.routing_time for o in orders])
+        for view, order in zip(table.orders, orders):
+            view.vehicle = order.vehicle
+            view.orientation = order.orientation
+            view.position = order.position
+            view.predicted_time = order.predicted_time
+        return table
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __getitem__(self, idx):
+        return self.orders[idx]
+
+    def append(self, coordinates, type, volume=1, status=0, deadline=0, priority=0, start_time=None,
+            end_time=None, AWB=None, SKU=None):
+        """
+        Add an order to the table and return its view. Columns grow by one, so bulk
+        loading should go through the constructor instead.
+        """
+        values = {
+            'lat': coordinates[0], 'lon': coordinates[1], 'type': type, 'volume': volume,
+            'status': status, 'deadline': deadline, 'priority': priority,
+            'start_time': MISSING if start_time is None else start_time,
+            'end_time': MISSING if end_time is None else end_time,
+            'routing_time': time.time(), 'predicted_time': MISSING, 'current_vrp_index': MISSING,
+            'vehicle_index': MISSING
+        }
+        for name, value in values.items():
+            setattr(self, name, np.append(getattr(self, name), value))
+
+        self.AWB.append(None if AWB is None else str(AWB))
+        self.SKU.append(SKU)
+        self.vehicle.append(None)
+        self.orientation.append(None)
+        self.position.append(None)
+
+        view = OrderView(self, len(self.orders))
+        self.orders.append(view)
+        return view
+
+    def carryforward_penalties(self):
+        """
+        Return the carry-forward penalty of every order, see Order.carryforward_penalty.
+        """
+        return carryforward_penalties(self.deadline, self.priority)
+
+def _int_column(name):
+    def get(self):
+        value = getattr(self._table, name)[self._idx]
+        return None if value == MISSING else int(value)
+
+    def set(self, value):
+        getattr(self._table, name)[self._idx] = MISSING if value is None else value
+
+    return property(get, set)
+
+def _float_column(name):
+    def get(self):
+        return float(getattr(self._table, name)[self._idx])
+
+    def set(self, value):
+        getattr(self._table, name)[self._idx] = value
+
+    return property(get, set)
+
+def _object_column(name):
+    def get(self):
+        return getattr(self._table, name)[self._idx]
+
+    def set(self, value):
+        getattr(self._table, name)[self._idx] = value
+
+    return property(get, set)
+
+class OrderView():
+    """
+    A row of an OrderTable with the attributes and methods of Order.
+    """
+    __slots__ = ('_table', '_idx')
+
+    def __init__(self, table, idx):
+        self._table = table
+        self._idx = idx
+
+    for _name in OrderTable.INT_COLUMNS:
+        locals()[_name] = _int_column(_name)
+    for _name in OrderTable.FLOAT_COLUMNS:
+        locals()[_name] = _float_column(_name)
+    for _name in OrderTable.OBJECT_COLUMNS:
+        locals()[_name] = _object_column(_name)
+    del _name
+
+    @property
+    def vehicle(self):
+        return self._table.vehicle[self._idx]
+
+    @vehicle.setter
+    def vehicle(self, vehicle):
+        self._table.vehicle[self._idx] = vehicle
+        index = getattr(vehicle, 'vehicle_index', None)
+        self._table.vehicle_index[self._idx] = MISSING if index is None else index
+
+    @property
+    def coordinates(self):
+        return [self.lat, self.lon]
+
+    @coordinates.setter
+    def coordinates(self, coordinates):
+        self.lat, self.lon = coordinates[0], coordinates[1]
+
+    @property
+    def carryforward_penalty(self):
+        return float(carryforward_penalties(self._table.deadline[self._idx], self._table.priority[self._idx]))
+
+    __lt__ = Order.__lt__
+    update_order_status = Order.update_order_status
+
+    def __getstate__(self):
+        # Pickled as the table and the row: the table of views pickled together (e.g.
+        # the orders sent to a worker process) is pickled once, and the unpickled
+        # views are rows of the same unpickled table again
+        return self._table, self._idx
+
+    def __setstate__(self, state):
+        self._table, self._idx = state
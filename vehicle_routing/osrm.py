@@ -0,0 +1,142 @@
+import numpy as np
+import requests
+import constants
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def make_session(pool_size=4, retries=3, backoff_factor=0.5):
+    """
+    Return a requests Session with a connection pool of pool_size and retries with
+    exponential backoff on connection errors and transient HTTP statuses.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _coordinates(nodes):
+    return ';'.join(str(node.lon) + ',' + str(node.lat) for node in nodes)
+
+def fetch_block(session, sources, destinations, base_url=None, annotation='distance', timeout=30):
+    """
+    Fetch one block of the table service: the annotation from every source node to
+    every destination node, using the sources=/destinations= parameters.
+    """
+    if base_url is None:
+        base_url = constants.OSRM_BASE_URL
+
+    # The query is built by hand, as the ';' separators must not be percent-encoded
+    url = base_url + 'table/v1/driving/' + _coordinates(list(sources) + list(destinations))
+    url += '?annotations=' + annotation
+    url += '&sources=' + ';'.join(str(i) for i in range(len(sources)))
+    url += '&destinations=' + ';'.join(str(len(sources) + i) for i in range(len(destinations)))
+    r = session.get(url, timeout=timeout)
+    r.raise_for_status()
+    json_object = r.json()
+    if json_object.get('code') != 'Ok':
+        raise ValueError("OSRM table request failed: {0}".format(json_object.get('message', json_object.get('code'))))
+
+    # Unreachable pairs come back as null
+    return np.array(json_object[annotation + 's'], dtype=float)
+
+def table(sources, destinations=None, base_url=None, annotation='distance', block_size=50,
+        max_workers=4, retries=3, timeout=30, session=None):
+    """
+    Return the OSRM table (distances or durations) from every source node to every
+    destination node (default: the sources).
+
+    The node sets are split into blocks of block_size so that a single request
+    stays within the URL length and the server's max-table-size, and the blocks are
+    fetched concurrently over a pooled session.
+
+    Arguments:
+    ------------------
+    sources, destinations: List[Node]
+    base_url: str
+        Address of the OSRM server (defaults to constants.OSRM_BASE_URL).
+    annotation: str
+        'distance' or 'duration'.
+    block_size: int
+        Number of sources and of destinations in each request.
+    max_workers: int
+        Number of requests in flight at once.
+    retries: int
+        Number of retries of each request.
+    session: requests.Session
+        Session to reuse (defaults to a new make_session()).
+
+    Returns:
+        Numpy float array of shape (len(sources), len(destinations)).
+    """
+    sources = list(sources)
+    destinations = sources if destinations is None else list(destinations)
+
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=max_workers, retries=retries)
+
+    src_blocks = [(i, sources[i: i + block_size]) for i in range(0, len(sources), block_size)]
+    dst_blocks = [(j, destinations[j: j + block_size]) for j in range(0, len(destinations), block_size)]
+
+    result = np.empty((len(sources), len(destinations)))
+
+    def fetch(blocks):
+        (i, src), (j, dst) = blocks
+        result[i: i + len(src), j: j + len(dst)] = fetch_block(session, src, dst, base_url=base_url,
+                                                    annotation=annotation, timeout=timeout)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list() re-raises the first failed block
+            list(executor.map(fetch, [(s, d) for s in src_blocks for d in dst_blocks]))
+    finally:
+        if own_session:
+            session.close()
+
+    return result
+
+def fetch_leg(session, source, destination, base_url=None, timeout=30):
+    """
+    Fetch the road geometry of one leg from the route service, from source to
+    destination (both (lat, lon)).
+
+    Returns:
+        List of [lon, lat] points along the road.
+    """
+    if base_url is None:
+        base_url = constants.OSRM_BASE_URL
+
+    url = base_url + 'route/v1/driving/{0},{1};{2},{3}'.format(source[1], source[0], destination[1], destination[0])
+    url += '?overview=full&geometries=geojson'
+    r = session.get(url, timeout=timeout)
+    r.raise_for_status()
+    json_object = r.json()
+    if json_object.get('code') != 'Ok':
+        raise ValueError("OSRM route request failed: {0}".format(json_object.get('message', json_object.get('code'))))
+
+    return json_object['routes'][0]['geometry']['coordinates']
+
+def legs(pairs, base_url=None, max_workers=4, retries=3, timeout=30, session=None):
+    """
+    Fetch the road geometry of every (source, destination) pair concurrently over a
+    pooled session (see fetch_leg()).
+
+    Returns:
+        List of geometries, in the order of pairs.
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=max_workers, retries=retries)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda pair: fetch_leg(session, pair[0], pair[1], base_url=base_url,
+                                                    timeout=timeout), pairs))
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,192 @@
+import io
+import os
+import math
+import logging
+import numpy as np
+import shapefile as shp
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+
+logger = logging.getLogger(__name__)
+
+# Rasterized ward basemaps, keyed by the wards file and the figure size and dpi
+_basemaps = {}
+
+def _coordinates(nodes):
+    # (lon, lat) of the nodes as an (n, 2) array, the x and y of the plots
+    return np.array([[n.lon, n.lat] for n in nodes], dtype=float).reshape(-1, 2)
+
+def _route_arrays(vrp_instance):
+    return [_coordinates(route.route) for route in vrp_instance.get_routes().values() if route != -1]
+
+def _route_lines(geometries=None, shapefilename='test.shp'):
+    # (lon, lat) point arrays of the road geometry, from the GeoDataFrame of
+    # export.route_geometries() when given, else read back from the shapefile
+    if geometries is not None:
+        return [np.asarray(line.coords) for line in geometries.geometry]
+    sf = shp.Reader(os.path.join(os.path.dirname(__file__), '../shapefile/'+shapefilename))
+    return [np.asarray(shape.shape.points) for shape in sf.shapeRecords()]
+
+def draw_routes(ax, lines, **kwargs):
+    """
+    Draw all the lines ((n, 2) arrays of lon, lat) as a single LineCollection,
+    coloured by the default colour cycle as successive ax.plot calls would be.
+    """
+    if not lines:
+        return None
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    collection = LineCollection(lines, colors=[colors[i % len(colors)] for i in range(len(lines))], **kwargs)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
+
+def basemap(city_graph, figsize, dpi):
+    """
+    Return the ward layer of city_graph rasterized at the pixel size of a figure of
+    figsize and dpi, as (RGBA image, (left, right, bottom, top) extent). Every size
+    is rendered once per process and cached.
+    """
+    key = (city_graph.wards_file, tuple(figsize), dpi)
+    if key not in _basemaps:
+        city = city_graph.city
+        minx, miny, maxx, maxy = city.total_bounds
+
+        fig = Figure(figsize=figsize, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        fig.patch.set_alpha(0)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3, ax=ax)
+        ax.set_aspect('auto')
+        ax.set_xlim(minx, maxx)
+        ax.set_ylim(miny, maxy)
+        canvas.draw()
+
+        _basemaps[key] = (np.asarray(canvas.buffer_rgba()).copy(), (minx, maxx, miny, maxy))
+    return _basemaps[key]
+
+def draw_basemap(ax, city_graph):
+    """
+    Draw the cached ward basemap (see basemap()) under everything else on ax.
+    """
+    fig = ax.figure
+    image, extent = basemap(city_graph, tuple(fig.get_size_inches()), fig.dpi)
+    # Same aspect as GeoDataFrame.plot gives geographic coordinates
+    aspect = 1 / math.cos(math.radians((extent[2] + extent[3]) / 2))
+    ax.imshow(image, extent=extent, aspect=aspect, interpolation='bilinear', zorder=0)
+
+def to_png(fig, dpi=None):
+    """
+    Render a figure headlessly to PNG bytes.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi or fig.dpi)
+    return buffer.getvalue()
+
+def vehicle_output_plot_routes(vrp_instance, block=True, city_graph=False, shapefilename='test.shp', geometries=None):
+    ax = plt.gca()
+    if city_graph is True:
+        draw_basemap(ax, vrp_instance.city_graph)
+
+    draw_routes(ax, _route_lines(geometries, shapefilename))
+
+    plt.scatter(vrp_instance.depot.lon, vrp_instance.depot.lat, color='black', s=70, label='Depot')
+
+    stops = [route[1:-1] for route in _route_arrays(vrp_instance)]
+    if stops:
+        stops = np.concatenate(stops)
+        plt.scatter(stops[:, 0], stops[:, 1], color='red', s=10)
+
+    plt.title('Vehicle Routes')
+    plt.legend()
+    plt.grid()
+    plt.savefig(os.path.join(os.path.dirname(__file__), r'../plots/osrm_routes.png'), dpi=300)
+    plt.show(block=block)
+
+def vehicle_return_plot_routes(vrp_instance, block=True, city_graph=False, geometries=None):
+    fig = Figure()
+    ax = fig.subplots()
+    if city_graph is True:
+        draw_basemap(ax, vrp_instance.city_graph)
+        logger.debug('city printed')
+
+    draw_routes(ax, _route_lines(geometries))
+
+    ax.scatter(vrp_instance.depot.lon, vrp_instance.depot.lat, color='black', s=70, label='Depot')
+
+    stops = [route[1:-1] for route in _route_arrays(vrp_instance)]
+    if stops:
+        stops = np.concatenate(stops)
+        ax.scatter(stops[:, 0], stops[:, 1], color='red', s=10)
+
+    ax.set_title('Vehicle Routes')
+    ax.legend()
+    ax.grid()
+    return fig
+
+def _scatter_orders(ax, deliveries, pickups, unrouted, depot):
+    unrouted, deliveries, pickups = _coordinates(unrouted), _coordinates(deliveries), _coordinates(pickups)
+    ax.scatter(unrouted[:, 0], unrouted[:, 1], color='r', label='Unrouted', marker='*', s=30)
+    ax.scatter(deliveries[:, 0], deliveries[:, 1], color='b', label='Delivery', s=20)
+    ax.scatter(pickups[:, 0], pickups[:, 1], color='g', label='Pickup', s=20)
+    ax.scatter(depot.lon, depot.lat, color='black', s=70, label='Depot')
+
+def vehicle_return_plot(vrp_instance, block=True, city_graph=False):
+    fig = Figure()
+    ax = fig.subplots()
+    if city_graph is True:
+        draw_basemap(ax, vrp_instance.city_graph)
+
+    orders = vrp_instance.customers.orders
+    _scatter_orders(ax, [o for o in orders if o.type == 1], [o for o in orders if o.type != 1],
+                [o for o in vrp_instance.orders if o.status == 0], vrp_instance.depot)
+
+    draw_routes(ax, _route_arrays(vrp_instance))
+
+    ax.set_title('Routes')
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.legend()
+    return fig
+
+def vehicle_return_scatter(vrp_instance, block=True, city_graph=False, dynamic=False):
+    fig = Figure()
+    ax = fig.subplots()
+    if city_graph is True:
+        draw_basemap(ax, vrp_instance.city_graph)
+
+    orders = vrp_instance.orders
+    unrouted = [o for o in orders if o.status == 0 and dynamic]
+    routed = [o for o in orders if not (o.status == 0 and dynamic)]
+    _scatter_orders(ax, [o for o in routed if o.type == 1], [o for o in routed if o.type != 1], unrouted,
+                vrp_instance.depot)
+
+    ax.set_title('Distribution')
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.legend()
+    return fig
+
+def vehicle_output_plot(vrp_instance, block=True, city_graph=False, filename='0'):
+    ax = plt.gca()
+    if city_graph is True:
+        draw_basemap(ax, vrp_instance.city_graph)
+
+    orders = vrp_instance.customers.orders
+    deliveries = _coordinates([o for o in orders if o.type == 1])
+    pickups = _coordinates([o for o in orders if o.type != 1])
+    plt.scatter(deliveries[:, 0], deliveries[:, 1], color='b', label='Delivery', s=20)
+    plt.scatter(pickups[:, 0], pickups[:, 1], color='g', label='Pickup', s=20)
+    plt.scatter(vrp_instance.depot.lon, vrp_instance.depot.lat, color='black', s=70, label='Depot')
+
+    draw_routes(ax, _route_arrays(vrp_instance))
+
+    plt.title('Routes')
+    plt.xlabel('Longitude')
+    plt.ylabel('Latitude')
+    plt.legend()
+    plt.show(block=block)
+    plt.savefig(os.path.join(os.path.dirname(__file__), '..\plots\output_plot_{0}.png'.format(filename)), dpi=300)
+    # plt.figure()
@@ -0,0 +1,240 @@
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from vehicle_routing.customers import Customers
+from vehicle_routing.vehicle import Fleet
+from vehicle_routing.route import Route, RoutesList
+
+logger = logging.getLogger(__name__)
+
+# (first solution strategy, metaheuristic, seed) of the default portfolio, the most
+# promising first. Seed 0 keeps the orders as given, any other seed shuffles them.
+DEFAULT_PORTFOLIO = [
+    ('PATH_CHEAPEST_ARC', 'GUIDED_LOCAL_SEARCH', 0),
+    ('PARALLEL_CHEAPEST_INSERTION', 'GUIDED_LOCAL_SEARCH', 0),
+    ('SAVINGS', 'GUIDED_LOCAL_SEARCH', 0),
+    ('PATH_CHEAPEST_ARC', 'SIMULATED_ANNEALING', 0),
+    ('PATH_CHEAPEST_ARC', 'TABU_SEARCH', 0),
+    ('LOCAL_CHEAPEST_INSERTION', 'GUIDED_LOCAL_SEARCH', 0),
+    ('PATH_CHEAPEST_ARC', 'GUIDED_LOCAL_SEARCH', 1),
+    ('AUTOMATIC', 'AUTOMATIC', 0)
+]
+
+# Share of the time left that a round of runs searches for, the rest is kept for
+# starting the workers and building their models before the deadline
+SEARCH_SHARE = 0.8
+
+class SharedMatrix():
+    """
+    A distance matrix computed once and saved to an .npy file, which every worker
+    opens memory-mapped, so that the OS keeps a single copy of it. It stands in for
+    the MatrixStore of process_VRP(matrix_store=...).
+
+    Nodes are looked up by their coordinates, so the workers can reorder them. The
+    matrix is returned as is when they come in the original order, and as a copy of
+    the reordered rows and columns otherwise.
+    """
+    def __init__(self, path, nodes, method):
+        self.path = path
+        self.method = method
+        self.index = {(float(n.lat), float(n.lon)): i for i, n in enumerate(nodes)}
+
+    def get_matrix(self, nodes, method, compute):
+        keys = [(float(n.lat), float(n.lon)) for n in nodes]
+        if method != self.method or any(key not in self.index for key in keys):
+            return compute(nodes)
+
+        matrix = np.load(self.path, mmap_mode='r')
+        idx = np.array([self.index[key] for key in keys])
+        if len(idx) == len(matrix) and (idx == np.arange(len(matrix))).all():
+            return matrix
+        return matrix[np.ix_(idx, idx)]
+
+def _run_config(vrp_instance, config, solver_kwargs, matrix):
+    """
+    Solve the instance with one configuration of the portfolio in a worker process.
+    As in clustering._solve_cluster, the routes are returned as positions into the
+    orders (-1 for the depot) together with the predicted times and order statuses.
+    """
+    first_sol_strategy, metaheuristic, seed = config
+    orders = list(vrp_instance.orders)
+    if seed:
+        # The search has no seed of its own, but the order of the nodes steers its
+        # tie-breaking
+        vrp_instance.orders = [orders[i] for i in np.random.RandomState(seed).permutation(len(orders))]
+
+    t1 = time.time()
+    result = vrp_instance.process_VRP(first_sol_strategy=first_sol_strategy, initial_metaheuristic=metaheuristic,
+                rerouting_metaheuristic=metaheuristic, matrix_store=matrix, **solver_kwargs)
+    t2 = time.time()
+
+    positions = {id(order): pos for pos, order in enumerate(orders)}
+    routes = {}
+    if result is not None:
+        for vehicle_idx, route in vrp_instance.get_routes().items():
+            if route == -1:
+                routes[vehicle_idx] = -1
+                continue
+            routes[vehicle_idx] = [(positions.get(id(node), -1), node.predicted_time) for node in route.route]
+
+    return {
+        'config': _config_dict(config),
+        'objective': vrp_instance.metrics.objective,
+        'dropped': vrp_instance.metrics.dropped,
+        'time': t2 - t1,
+        'trajectory': vrp_instance.metrics.trajectory,
+        'routes': routes,
+        'statuses': [order.status for order in orders],
+        'metrics': vrp_instance.metrics,
+        'solve_limits': vrp_instance.solve_limits
+    }
+
+def _config_dict(config):
+    first_sol_strategy, metaheuristic, seed = config
+    return {'first_sol_strategy': first_sol_strategy, 'metaheuristic': metaheuristic, 'seed': seed}
+
+def solve_portfolio(vrp_instance, configs=None, time_limit=60, workers=None, edge_weight_type='haversine',
+        history=None, **solver_kwargs):
+    """
+    Race several first solution strategy / metaheuristic / seed combinations on the
+    same instance in a process pool, and keep the best solution.
+
+    The distance matrix is computed once, from the matrix_store, osrm_base_url,
+    osrm_session, max_matrix_bytes and matrix_dir of solver_kwargs, and shared by the
+    workers (see SharedMatrix). time_limit is a wall-clock deadline: when there are
+    more configurations than workers, they run in rounds that split the time left
+    between them, and the runs that have not finished by the deadline are ignored
+    (left to finish in the background).
+
+    Arguments:
+    ------------------
+    vrp_instance: VRP
+        Updated with the best routes, as at the end of process_VRP.
+    configs: List[Tuple[str, str, int]]
+        (first_sol_strategy, metaheuristic, seed) of every run (defaults to
+        DEFAULT_PORTFOLIO), see helper.get_first_sol_strategy and
+        helper.get_local_search_metaheuristic for the names.
+    time_limit: int
+        Seconds for the whole portfolio.
+    workers: int
+        Number of worker processes (defaults to the number of CPUs).
+    history: str
+        Path of a JSON lines file to append the outcome of every run to, to tune the
+        defaults from.
+    **solver_kwargs:
+        Passed on to VRP.process_VRP() for every run.
+
+    Returns:
+        The result of every run (configuration, objective, dropped orders, time and
+        objective trajectory), best first. Runs without a solution come last, and
+        those that did not finish in time have a time of None.
+    """
+    from vehicle_routing.vrp import VRP
+
+    deadline = time.time() + time_limit
+    configs = list(configs or DEFAULT_PORTFOLIO)
+    workers = workers or os.cpu_count()
+    rounds = math.ceil(len(configs) / workers)
+    solver_kwargs['edge_weight_type'] = edge_weight_type
+    # The workers read the shared matrix instead of the store, and don't fetch anything
+    store = solver_kwargs.pop('matrix_store', None)
+    osrm_session = solver_kwargs.pop('osrm_session', None)
+
+    customers = Customers(vrp_instance.depot, vrp_instance.orders)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+        customers.make_distance_mat(method=edge_weight_type, store=store,
+            max_matrix_bytes=solver_kwargs.get('max_matrix_bytes'), matrix_dir=solver_kwargs.get('matrix_dir'),
+            osrm_base_url=solver_kwargs.get('osrm_base_url'), osrm_session=osrm_session)
+        path = os.path.join(directory, 'distmat.npy')
+        np.save(path, customers.distmat)
+        matrix = SharedMatrix(path, customers.customers, edge_weight_type)
+
+        solver_kwargs['time_limit'] = max(1, int(SEARCH_SHARE * (deadline - time.time()) / rounds))
+        snapshot = VRP(vrp_instance.depot, vrp_instance.orders, vrp_instance.vehicles,
+                        vrp_instance.routes_list)
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(configs)))
+        try:
+            futures = [executor.submit(_run_config, snapshot, config, solver_kwargs, matrix) for config in configs]
+            done, _ = wait(futures, timeout=max(0, deadline - time.time()))
+            results = [future.result() if future in done else _unfinished(config)
+                        for config, future in zip(configs, futures)]
+        finally:
+            # Runs still going are not waited for, those not started are cancelled
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    results.sort(key=lambda r: (r['objective'] is None, r['objective'] if r['objective'] is not None else 0))
+    for result in results:
+        if result['time'] is None:
+            logger.info('portfolio run %s: not finished by the deadline', result['config'])
+        else:
+            logger.info('portfolio run %s: objective %s, %d dropped, %.1fs', result['config'], result['objective'],
+                        result['dropped'] or 0, result['time'])
+
+    best = results[0]
+    if best['objective'] is not None:
+        logger.info('portfolio winner: %s with objective %s', best['config'], best['objective'])
+        _apply(vrp_instance, best, customers)
+    else:
+        logger.warning("NO SOLUTION FOUND by any configuration of the portfolio")
+
+    if history is not None:
+        record = {
+            'time': time.time(),
+            'orders': len(vrp_instance.orders),
+            'vehicles': len(vrp_instance.vehicles),
+            'time_limit': time_limit,
+            'runs': [{'config': r['config'], 'objective': r['objective'], 'dropped': r['dropped']} for r in results]
+        }
+        with open(history, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    return [{key: value for key, value in result.items() if key not in ('routes', 'statuses', 'metrics', 'solve_limits')}
+                for result in results]
+
+def _unfinished(config):
+    return {'config': _config_dict(config), 'objective': None, 'dropped': None, 'time': None, 'trajectory': [],
+            'routes': {}, 'statuses': [], 'metrics': None, 'solve_limits': None}
+
+def _apply(vrp_instance, result, customers):
+    """
+    Update the instance with the routes of a run, as process_VRP does at the end of
+    a solve: the customers (with the shared distance matrix) and the fleet of the
+    solve, the order statuses, the routes, the metrics and the solve limits.
+    """
+    # Built before the statuses change, as the customers of process_VRP are
+    vrp_instance.customers = customers
+    vrp_instance.fleet = Fleet(vrp_instance.vehicles)
+    vrp_instance.fleet.set_starts_ends()
+
+    orders = vrp_instance.orders
+    for order, status in zip(orders, result['statuses']):
+        order.status = status
+
+    routes_list = {}
+    for vehicle_idx, vehicle in enumerate(vrp_instance.vehicles):
+        stops = result['routes'].get(vehicle_idx, -1)
+        if stops == -1:
+            routes_list[vehicle_idx] = -1
+        else:
+            route = []
+            for i, (pos, predicted_time) in enumerate(stops):
+                # -1 is the start or the end of the vehicle
+                if pos == -1:
+                    node = vehicle.start if i == 0 else vehicle.end
+                else:
+                    node = orders[pos]
+                node.predicted_time = predicted_time
+                node.vehicle = vehicle
+                route.append(node)
+            routes_list[vehicle_idx] = Route(route, vehicle)
+        vehicle.route = routes_list[vehicle_idx]
+
+    vrp_instance.routes_list = RoutesList(routes_list)
+    vrp_instance.metrics = result['metrics']
+    vrp_instance.metrics.labels.update({key: str(value) for key, value in result['config'].items()})
+    vrp_instance.solve_limits = result['solve_limits']
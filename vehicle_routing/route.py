@@ -1,6 +1,9 @@
 import time
+import logging
 from vehicle_routing.customers import Order, Node
 
+logger = logging.getLogger(__name__)
+
 class Route:
     """
         Stores the info about a created route.
@@ -30,7 +33,7 @@ class Route:
 
         if self.current_node != 0:
             self.route[self.current_node].update_order_status(new_status)
-            print("status", self.route[self.current_node].status)
+            logger.debug("status %s", self.route[self.current_node].status)
 
         if self.current_node < len(self.route):
             self.current_node += 1
@@ -0,0 +1,437 @@
+import json
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from vehicle_routing.vrp import VRP
+from vehicle_routing.customers import Node, Order
+from vehicle_routing.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+# process_VRP arguments a solve request may set
+SOLVER_OPTIONS = ['first_sol_strategy', 'initial_metaheuristic', 'rerouting_metaheuristic', 'edge_weight_type',
+                'transit_matrix', 'neighbours', 'max_route_distance', 'equalize_routes']
+
+REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _solve(vrp_instance, solver_kwargs, stop):
+    """
+    Run a solve in a worker process and return the solved instance (without its
+    solver objects, which don't pickle) and whether a solution was found.
+    """
+    result = vrp_instance.solve_anytime(stop=stop, **solver_kwargs)
+    vrp_instance.customers = None
+    vrp_instance.fleet = None
+    return vrp_instance, result is not None
+
+def parse_order(spec):
+    """
+    Build an Order from its JSON object: lat, lon and optionally type (1 delivery,
+    2 pickup), volume, AWB, deadline (days), start_time and end_time (minutes).
+    """
+    try:
+        return Order(spec.get('volume', 1), [float(spec['lat']), float(spec['lon'])], int(spec.get('type', 1)),
+                    AWB=spec.get('AWB'), deadline=int(spec.get('deadline', 0)),
+                    start_time=spec.get('start_time'), end_time=spec.get('end_time'))
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPError(400, "Invalid order {0!r}: {1}".format(spec, e))
+
+def parse_problem(body):
+    """
+    Build a VRP from its JSON object: depot ([lat, lon]), orders (see parse_order())
+    and either vehicles (a list of capacities) or num_vehicles and capacity.
+    """
+    try:
+        depot = Node([float(body['depot'][0]), float(body['depot'][1])], 0)
+        orders = [parse_order(spec) for spec in body.get('orders', [])]
+        if 'vehicles' in body:
+            capacities = [int(capacity) for capacity in body['vehicles']]
+        else:
+            capacities = [int(body.get('capacity', 25))] * int(body.get('num_vehicles', max(1, len(orders) // 20)))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise HTTPError(400, "Invalid problem: {0}".format(e))
+    if not capacities:
+        raise HTTPError(400, "Invalid problem: no vehicles")
+
+    vehicles = [Vehicle(capacity, start=depot, end=depot) for capacity in capacities]
+    return VRP(depot, orders, vehicles)
+
+def routes_payload(vrp_instance):
+    """
+    The routes of a VRP as a JSON object. Every stop refers to its order by position
+    in the problem's orders (null for the depot).
+    """
+    positions = {id(order): i for i, order in enumerate(vrp_instance.orders)}
+    routes = []
+    if vrp_instance.routes_list is not None:
+        for vehicle_idx, route in vrp_instance.get_routes().items():
+            if route == -1:
+                continue
+            routes.append({
+                'vehicle': vehicle_idx,
+                'current_node': route.current_node,
+                'stops': [{
+                    'order': positions.get(id(node)),
+                    'lat': float(node.lat),
+                    'lon': float(node.lon),
+                    'type': int(node.type),
+                    'status': int(node.status),
+                    'predicted_time': None if getattr(node, 'predicted_time', None) is None else int(node.predicted_time)
+                } for node in route.route]
+            })
+
+    metrics = vrp_instance.metrics
+    return {
+        'routes': routes,
+        'dropped': [i for i, order in enumerate(vrp_instance.orders) if order.status == 1],
+        'objective': metrics.objective if metrics is not None else None
+    }
+
+class Problem():
+    """
+    A hub's VRP and the job currently solving it (None when idle).
+    """
+    def __init__(self, problem_id, vrp_instance):
+        self.problem_id = problem_id
+        self.vrp_instance = vrp_instance
+        self.job = None
+
+    def check_idle(self):
+        if self.job is not None:
+            raise HTTPError(409, "Problem {0} is being solved by job {1}".format(self.problem_id, self.job.job_id))
+
+class Job():
+    """
+    A queued, running or finished solve of a problem.
+
+        Attributes:
+        -----------
+        status: str
+            'queued', 'running', 'done', 'failed' or 'cancelled'.
+        stop: multiprocessing Event
+            Set to stop the search of the worker at its next solution.
+        result: dict
+            The routes of a done job (see routes_payload()).
+    """
+    def __init__(self, job_id, problem, reroute, time_limit, solver_kwargs, stop):
+        self.job_id = job_id
+        self.problem = problem
+        self.reroute = reroute
+        self.time_limit = time_limit
+        self.solver_kwargs = solver_kwargs
+        self.stop = stop
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'problem_id': self.problem.problem_id,
+            'reroute': self.reroute,
+            'status': self.status,
+            'time_limit': self.time_limit,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+            'result': self.result
+        }
+
+class DispatchService():
+    """
+    A local HTTP dispatch service over VRP, built on asyncio and the standard library
+    only. Every hub posts its problem once and then drives it through its day
+    (dynamic orders, skipped time, reroutes), while the solves run on a bounded
+    process pool.
+
+        POST   /problems                  Submit a problem, returns its problem_id.
+        GET    /problems/<id>/routes      Current routes of the problem.
+        POST   /problems/<id>/orders      Add dynamic orders.
+        POST   /problems/<id>/skip_time   Skip time ({"minutes": 30}).
+        POST   /problems/<id>/solve       Queue a solve, returns its job_id.
+        POST   /problems/<id>/reroute     Queue a reroute from the current routes.
+        GET    /jobs/<id>                 Status (and result) of a job.
+        DELETE /jobs/<id>                 Cancel a queued or running job.
+
+    Solves run on a pool of `workers` processes; further jobs wait in a queue of at
+    most max_queue jobs (beyond that submissions get a 503). A problem has at most
+    one job at a time and can't be changed while it is being solved. A running job
+    is cancelled at the next solution of its search (bounded by its time_limit).
+    Finished jobs keep their result for polling; the oldest are forgotten past
+    max_jobs.
+
+    Run with: python -m vehicle_routing.service --port 8080 --workers 4
+
+        Attributes:
+        -----------
+        workers: int
+            Number of solver processes.
+        max_queue: int
+            Number of jobs that may wait for a worker.
+        max_time_limit: int
+            Upper bound on the time_limit of a job, in seconds.
+        max_jobs: int
+            Number of finished jobs kept.
+    """
+    def __init__(self, workers=None, max_queue=100, max_time_limit=300, max_jobs=1000):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_queue = max_queue
+        self.max_time_limit = max_time_limit
+        self.max_jobs = max_jobs
+        self.problems = {}
+        self.jobs = OrderedDict()
+        self.executor = None
+        self.manager = None
+        self.slots = None
+
+    def start(self):
+        # Spawned rather than forked, so that the workers don't inherit the sockets of
+        # the open connections (the clients would never see them closed) nor the
+        # threads of the event loop
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        # Events that the worker processes can see, to cancel running jobs
+        self.manager = multiprocessing.Manager()
+        self.slots = asyncio.Semaphore(self.workers)
+
+    def close(self):
+        for job in self.jobs.values():
+            if job.status in ('queued', 'running'):
+                job.stop.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+    def _problem(self, problem_id):
+        if problem_id not in self.problems:
+            raise HTTPError(404, "Unknown problem {0}".format(problem_id))
+        return self.problems[problem_id]
+
+    def _job(self, job_id):
+        if job_id not in self.jobs:
+            raise HTTPError(404, "Unknown job {0}".format(job_id))
+        return self.jobs[job_id]
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in ('queued', 'running')]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def submit_problem(self, body):
+        problem_id = uuid.uuid4().hex
+        self.problems[problem_id] = Problem(problem_id, parse_problem(body))
+        return 201, {'problem_id': problem_id}
+
+    def add_orders(self, problem_id, body):
+        problem = self._problem(problem_id)
+        problem.check_idle()
+        specs = body.get('orders', [body]) if isinstance(body, dict) else body
+        orders = [parse_order(spec) for spec in specs]
+        first = len(problem.vrp_instance.orders)
+        for order in orders:
+            problem.vrp_instance.add_dynamic_order(order)
+        return 200, {'orders': list(range(first, first + len(orders)))}
+
+    def skip_time(self, problem_id, body):
+        problem = self._problem(problem_id)
+        problem.check_idle()
+        if problem.vrp_instance.routes_list is None:
+            raise HTTPError(409, "Problem {0} has no routes yet".format(problem_id))
+        try:
+            minutes = float(body['minutes'])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, "skip_time needs a number of minutes")
+        problem.vrp_instance.routes_list.skip_time(minutes)
+        return 200, routes_payload(problem.vrp_instance)
+
+    def submit_job(self, problem_id, body, reroute=False):
+        problem = self._problem(problem_id)
+        problem.check_idle()
+        if reroute and problem.vrp_instance.routes_list is None:
+            raise HTTPError(409, "Problem {0} has no routes to reroute".format(problem_id))
+        queued = sum(job.status == 'queued' for job in self.jobs.values())
+        if queued >= self.max_queue:
+            raise HTTPError(503, "The job queue is full")
+
+        try:
+            time_limit = min(int(body.get('time_limit', self.max_time_limit)), self.max_time_limit)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "time_limit must be a number of seconds")
+        solver_kwargs = {key: body[key] for key in SOLVER_OPTIONS if key in body}
+        # The worker has the GIL to itself, so the matrices are registered natively by default
+        solver_kwargs.setdefault('transit_matrix', True)
+        solver_kwargs.update(time_limit=max(1, time_limit), isReroute=reroute)
+
+        job = Job(uuid.uuid4().hex, problem, reroute, time_limit, solver_kwargs, self.manager.Event())
+        self.jobs[job.job_id] = job
+        problem.job = job
+        asyncio.get_running_loop().create_task(self._run(job))
+        self._forget_finished()
+        return 202, {'job_id': job.job_id}
+
+    def cancel_job(self, job_id):
+        job = self._job(job_id)
+        if job.status in ('queued', 'running'):
+            job.stop.set()
+            if job.status == 'queued':
+                self._finish(job, 'cancelled')
+        return 200, job.to_dict()
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        if job.problem.job is job:
+            job.problem.job = None
+
+    async def _run(self, job):
+        async with self.slots:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started = time.time()
+
+            vrp_instance = job.problem.vrp_instance
+            # A fresh VRP over the same state, without the solver objects of the last solve
+            snapshot = VRP(vrp_instance.depot, vrp_instance.orders, vrp_instance.vehicles, vrp_instance.routes_list)
+            loop = asyncio.get_running_loop()
+            try:
+                solved_instance, solved = await loop.run_in_executor(self.executor, _solve, snapshot,
+                                                job.solver_kwargs, job.stop)
+            except Exception as e:
+                logger.exception('job %s failed', job.job_id)
+                self._finish(job, 'failed', str(e))
+                return
+
+        if job.stop.is_set():
+            # The routes of a cancelled solve are not applied
+            self._finish(job, 'cancelled')
+        elif not solved:
+            self._finish(job, 'failed', 'No solution found')
+        else:
+            job.problem.vrp_instance = solved_instance
+            job.result = routes_payload(solved_instance)
+            self._finish(job, 'done')
+
+    def route(self, method, path, body):
+        """
+        Dispatch a request to its endpoint, returning (status, payload).
+        """
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['problems'] and method == 'POST':
+            return self.submit_problem(body)
+        if len(parts) == 3 and parts[0] == 'problems':
+            problem_id, action = parts[1], parts[2]
+            if action == 'routes' and method == 'GET':
+                return 200, routes_payload(self._problem(problem_id).vrp_instance)
+            if action == 'orders' and method == 'POST':
+                return self.add_orders(problem_id, body)
+            if action == 'skip_time' and method == 'POST':
+                return self.skip_time(problem_id, body)
+            if action in ('solve', 'reroute') and method == 'POST':
+                return self.submit_job(problem_id, body, reroute=action == 'reroute')
+        if len(parts) == 2 and parts[0] == 'jobs':
+            if method == 'GET':
+                return 200, self._job(parts[1]).to_dict()
+            if method == 'DELETE':
+                return self.cancel_job(parts[1])
+        raise HTTPError(404 if method in ('GET', 'POST', 'DELETE') else 405, "No endpoint {0} {1}".format(method, path))
+
+async def handle_connection(service, reader, writer, max_body=64 * 1024 * 1024):
+    """
+    Serve one HTTP/1.1 request with a JSON body and a JSON response, then close.
+    """
+    try:
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            if len(request_line) != 3:
+                raise HTTPError(400, "Malformed request line")
+            method, path, _ = request_line
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if length > max_body:
+                raise HTTPError(413, "Body larger than {0} bytes".format(max_body))
+            raw = await reader.readexactly(length) if length else b''
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                raise HTTPError(400, "The body is not valid JSON")
+
+            status, payload = service.route(method.upper(), path, body)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            logger.exception('request failed')
+            status, payload = 500, {'error': str(e)}
+
+        data = json.dumps(payload).encode('utf-8')
+        writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\nConnection: close\r\n\r\n'
+                    .format(status, REASONS.get(status, ''), len(data)).encode('latin-1') + data)
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(host='127.0.0.1', port=8080, **kwargs):
+    """
+    Run the dispatch service until cancelled. Keyword arguments are passed on to
+    DispatchService.
+    """
+    service = DispatchService(**kwargs)
+    service.start()
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    # Shut the worker processes down on SIGTERM too, not only on Ctrl+C
+    if hasattr(signal, 'SIGTERM'):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+    logger.info('dispatch service listening on %s:%s with %d workers', host, port, service.workers)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP dispatch service for the VRP solver.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help='solver processes (default: number of CPUs)')
+    parser.add_argument('--max-queue', type=int, default=100, help='jobs that may wait for a worker')
+    parser.add_argument('--max-time-limit', type=int, default=300, help='upper bound on the time limit of a job')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_queue=args.max_queue,
+                    max_time_limit=args.max_time_limit))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
-import matplotlib.pyplot as plt
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Vehicle:
     """
@@ -129,7 +131,7 @@ class Fleet:
         return sum([vehicle.total_volume_capacity for vehicle in self.vehicle_list])
 
     def set_starts_ends(self):
-        print(self.vehicle_list[0].start.current_vrp_index)
+        logger.debug('start of the first vehicle: %s', self.vehicle_list[0].start.current_vrp_index)
         self.starts = [v.start.current_vrp_index for v in self.vehicle_list]
         self.ends = [0] * len(self.starts)
         
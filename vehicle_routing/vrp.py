@@ -1,23 +1,19 @@
-import os
 import time
-import json
-import constants
-import requests
-import pandas as pd
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import shapefile as shp 
+import logging
 import vehicle_routing.helper as helper
-from vehicle_routing.customers import Customers
+from vehicle_routing.metrics import SolveMetrics
+from vehicle_routing.customers import Customers, segment_maximum_accumulate, transit_matrix_rows
 from vehicle_routing.vehicle import Fleet
-from shapely.geometry import Point, LineString
 from vehicle_routing.route import Route, RoutesList
 from ortools.constraint_solver import pywrapcp
-from vehicle_routing.city_graph import CityGraph
 from ortools.constraint_solver import routing_enums_pb2
-import matplotlib
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Smallest number of nodes (depot included) process_VRP(neighbours=k) prunes the arcs of
+SPARSE_MIN_NODES = 2500
+
 class VRP:
     """
        The main solver class for solving the VRP problem.
@@ -39,10 +35,19 @@ class VRP:
             The Fleet class represents a collection of vehicles and their properties
         routes_list: RoutesList
             The list of routes (route object) generated by the solver.
+        metrics: SolveMetrics
+            Phase timings and counters of the last process_VRP call.
+        leg_geometries: Dict
+            Road geometry of the route legs fetched so far, see export.route_geometries.
+        solve_limits: Dict
+            max_route_distance, total_transit_time and max_wait_time of the last solve
+            that found routes, which insert_order_fast keeps to.
 
         Methods:
         -----------
         add_dynamic_order(new_order: Order) -> None: Add orders dynamically.
+        insert_order_fast(order: Order) -> Tuple[int, int]: Insert an order into the live routes without a new search.
+        solve_portfolio(configs, time_limit) -> List[dict]: Race several search configurations across processes.
         get_routes() -> Dict[int, Route]: Returns the list of routes generated by the solver.
         update_routed_order_status(manager: RoutingIndexManager, routing: RoutingModel, solution: Assignment) -> None: Set the status of each order after the routing is completed.
         build_vehicle_routes(manager: RoutingIndexManager, routing: RoutingModel, solution: Assignment) -> None: Build the routes for each vehicle using the solution generated by the solver.
@@ -55,7 +60,23 @@ class VRP:
         self.customers = None
         self.fleet = None   
         self.routes_list = routes_list
-        self.city_graph = CityGraph()
+        self._city_graph = None
+        self.metrics = None
+        self.leg_geometries = {}
+        self.solve_limits = None
+
+    @property
+    def city_graph(self):
+        # The city graph (networkx, geopandas) is only imported and built when first used
+        if self._city_graph is None:
+            from vehicle_routing.city_graph import CityGraph
+            self._city_graph = CityGraph()
+        return self._city_graph
+
+    @city_graph.setter
+    def city_graph(self, city_graph):
+        # e.g. a CityGraph shared between instances, so the ward layer is only loaded once
+        self._city_graph = city_graph
 
     def add_dynamic_order(self, new_order):
         self.orders.append(new_order)
@@ -110,223 +131,47 @@ class VRP:
         
         self.routes_list = RoutesList(routes_list)
 
-    def vehicle_output_plot_routes(self, block=True, city_graph=False, shapefilename='test.shp'):
-        if city_graph is True:
-            self.city_graph.city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3)
-
-        sf = shp.Reader(os.path.join(os.path.dirname(__file__), '../shapefile/'+shapefilename))
-        for shape in sf.shapeRecords():
-            y = [i[0] for i in shape.shape.points[:]]
-            x = [i[1] for i in shape.shape.points[:]]
-            plt.plot(y,x)
-
-        plt.scatter(self.depot.lon, self.depot.lat, color='black', s=70, label='Depot')
-
-        colors = ['red', 'blue', 'green', 'purple', 'darkblue', 'orange', 'brown', 'pink', 'olive', 'purple', 'tomato']
-        for vehicle_idx, route in self.get_routes().items():
-            if route == -1:
-                continue
-
-            x_coords = []
-            y_coords = []
-
-            for n in route.route:
-                x_coords.append(n.lon)
-                y_coords.append(n.lat)
-            plt.scatter(x_coords[1:-1], y_coords[1:-1], color=colors[0], s=10)
-            # plt.scatter(x_coords[1:-1], y_coords[1:-1], color=colors[vehicle_idx % len(colors)], s=10)
-            # plt.plot(x_coords[1:-1], y_coords[1:-1], color=colors[vehicle_idx % len(colors)])
-            # plt.plot(x_coords[:2], y_coords[:2], color=colors[vehicle_idx % len(colors)], linestyle='--', linewidth=1)
-            # plt.plot(x_coords[-2:], y_coords[-2:], color=colors[vehicle_idx % len(colors)], linestyle='--', linewidth=1)
-            
-        plt.title('Vehicle Routes')
-        plt.legend()
-        plt.grid()
-        plt.savefig(os.path.join(os.path.dirname(__file__), r'../plots/osrm_routes.png'), dpi=300)
-        plt.show(block=block)
-
-    def vehicle_return_plot_routes(self, block=True, city_graph=False):
-        fig, ax = plt.subplots()
-        if city_graph is True:
-            self.city_graph.city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3, ax=ax)
-            print('city printed')
-
-        sf = shp.Reader(os.path.join(os.path.dirname(__file__), '../shapefile/test.shp'))
-        
-        for shape in sf.shapeRecords():
-            y = [i[0] for i in shape.shape.points[:]]
-            x = [i[1] for i in shape.shape.points[:]]
-            ax.plot(y,x)
-
-        ax.scatter(self.depot.lon, self.depot.lat, color='black', s=70, label='Depot')
+    def vehicle_output_plot_routes(self, block=True, city_graph=False, shapefilename='test.shp', geometries=None):
+        from vehicle_routing import plotting
+        return plotting.vehicle_output_plot_routes(self, block=block, city_graph=city_graph, shapefilename=shapefilename,
+                    geometries=geometries)
 
-        colors = ['red', 'blue', 'green', 'purple', 'darkblue', 'orange', 'brown', 'pink', 'olive', 'purple', 'tomato']
-        for vehicle_idx, route in self.get_routes().items():
-            if route == -1:
-                continue
-
-            x_coords = []
-            y_coords = []
-
-            for n in route.route:
-                x_coords.append(n.lon)
-                y_coords.append(n.lat)
-            ax.scatter(x_coords[1:-1], y_coords[1:-1], color=colors[0], s=10)
-            # plt.scatter(x_coords[1:-1], y_coords[1:-1], color=colors[vehicle_idx % len(colors)], s=10)
-            # plt.plot(x_coords[1:-1], y_coords[1:-1], color=colors[vehicle_idx % len(colors)])
-            # plt.plot(x_coords[:2], y_coords[:2], color=colors[vehicle_idx % len(colors)], linestyle='--', linewidth=1)
-            # plt.plot(x_coords[-2:], y_coords[-2:], color=colors[vehicle_idx % len(colors)], linestyle='--', linewidth=1)
-            
-        ax.set_title('Vehicle Routes')
-        ax.legend()
-        ax.grid()
-        # plt.savefig(os.path.join(os.path.dirname(__file__), '../plots/osrm_routes.png'), dpi=300)
-        return fig
+    def vehicle_return_plot_routes(self, block=True, city_graph=False, geometries=None):
+        from vehicle_routing import plotting
+        return plotting.vehicle_return_plot_routes(self, block=block, city_graph=city_graph, geometries=geometries)
 
     def vehicle_return_plot(self, block=True, city_graph=False):
-        fig, ax = plt.subplots()
-        if city_graph is True:
-            self.city_graph.city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3, ax=ax)
-
-        s_del_lon = []
-        s_del_lat = []
-        s_pick_lon = []
-        s_pick_lat = []
-        s_dyn_lat = []
-        s_dyn_lon = []
-        for order in self.customers.orders:
-            if order.type == 1:
-                s_del_lon.append(order.lon)
-                s_del_lat.append(order.lat)
-            else:
-                s_pick_lon.append(order.lon)
-                s_pick_lat.append(order.lat)
-
-            # plt.text(order.lon, order.lat, order.current_vrp_index, fontsize = 8)
-        
-        for order in self.orders:
-            if order.status == 0:
-                s_dyn_lat.append(order.lat)
-                s_dyn_lon.append(order.lon)
-
-        ax.scatter(s_dyn_lon, s_dyn_lat, color='r', label='Unrouted', marker='*', s=30)
-        ax.scatter(s_del_lon, s_del_lat, color='b', label='Delivery', s=20)
-        ax.scatter(s_pick_lon, s_pick_lat, color='g', label='Pickup', s=20)
-        ax.scatter(self.depot.lon, self.depot.lat, color='black', s=70, label='Depot')
-
-        for vehicle_idx, route in self.get_routes().items():
-            if route == -1:
-                continue
-
-            lon_coords = []
-            lat_coords = []
-
-            for n in route.route:
-                lon_coords.append(n.lon)
-                lat_coords.append(n.lat)
-            ax.plot(lon_coords, lat_coords)
-            
-        ax.set_title('Routes')
-        ax.set_xlabel('Longitude')
-        ax.set_ylabel('Latitude')
-        ax.legend()
-        # ax.show(block=block)
-        # ax.figure()
-        return fig
+        from vehicle_routing import plotting
+        return plotting.vehicle_return_plot(self, block=block, city_graph=city_graph)
 
     def vehicle_return_scatter(self, block=True, city_graph=False, dynamic=False):
-        fig, ax = plt.subplots()
-        if city_graph is True:
-            self.city_graph.city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3, ax=ax)
-
-        s_del_lon = []
-        s_del_lat = []
-        s_pick_lon = []
-        s_pick_lat = []
-        s_dyn_lat = []
-        s_dyn_lon = []
-        for order in self.orders:
-            if order.status == 0 and dynamic:
-                s_dyn_lat.append(order.lat)
-                s_dyn_lon.append(order.lon)
-            elif order.type == 1:
-                s_del_lon.append(order.lon)
-                s_del_lat.append(order.lat)
-            else:
-                s_pick_lon.append(order.lon)
-                s_pick_lat.append(order.lat)
-
-            # plt.text(order.lon, order.lat, order.current_vrp_index, fontsize = 8)
-
-        ax.scatter(s_dyn_lon, s_dyn_lat, color='r', label='Unrouted', marker='*', s=30)
-        ax.scatter(s_del_lon, s_del_lat, color='b', label='Delivery', s=20)
-        ax.scatter(s_pick_lon, s_pick_lat, color='g', label='Pickup', s=20)
-        ax.scatter(self.depot.lon, self.depot.lat, color='black', s=70, label='Depot')
-            
-        ax.set_title('Distribution')
-        ax.set_xlabel('Longitude')
-        ax.set_ylabel('Latitude')
-        ax.legend()
-        # ax.show(block=block)
-        # ax.figure()
-        return fig
+        from vehicle_routing import plotting
+        return plotting.vehicle_return_scatter(self, block=block, city_graph=city_graph, dynamic=dynamic)
 
     def vehicle_output_plot(self, block=True, city_graph=False, filename='0'):
-        if city_graph is True:
-            self.city_graph.city.plot(facecolor="lightgrey", edgecolor="grey", linewidth=0.3)
-
-        s_del_lon = []
-        s_del_lat = []
-        s_pick_lon = []
-        s_pick_lat = []
-
-        for order in self.customers.orders:
-            if order.type == 1:
-                s_del_lon.append(order.lon)
-                s_del_lat.append(order.lat)
-            else:
-                s_pick_lon.append(order.lon)
-                s_pick_lat.append(order.lat)
-
-            # plt.text(order.lon, order.lat, order.current_vrp_index, fontsize = 8)
-
-        plt.scatter(s_del_lon, s_del_lat, color='b', label='Delivery', s=20)
-        plt.scatter(s_pick_lon, s_pick_lat, color='g', label='Pickup', s=20)
-        plt.scatter(self.depot.lon, self.depot.lat, color='black', s=70, label='Depot')
-
-        for vehicle_idx, route in self.get_routes().items():
-            if route == -1:
-                continue
-
-            lon_coords = []
-            lat_coords = []
-
-            for n in route.route:
-                lon_coords.append(n.lon)
-                lat_coords.append(n.lat)
-            plt.plot(lon_coords, lat_coords)
-            
-        plt.title('Routes')
-        plt.xlabel('Longitude')
-        plt.ylabel('Latitude')
-        plt.legend()
-        plt.show(block=block)
-        plt.savefig(os.path.join(os.path.dirname(__file__), '..\plots\output_plot_{0}.png'.format(filename)), dpi=300)
-        # plt.figure()
+        from vehicle_routing import plotting
+        return plotting.vehicle_output_plot(self, block=block, city_graph=city_graph, filename=filename)
 
     @helper.timer_func
     def process_VRP(self, isReroute=False, centrality_check=False, edge_weight_type='haversine',
             time_limit=300, total_transit_time = 10_000_000, max_wait_time=10_000, 
             max_route_distance=2000_000, equalize_routes=False, equalize_routes_penalty=10_000,
-            first_sol_strategy="AUTOMATIC", initial_metaheuristic="AUTOMATIC", rerouting_metaheuristic="AUTOMATIC"):
+            first_sol_strategy="AUTOMATIC", initial_metaheuristic="AUTOMATIC", rerouting_metaheuristic="AUTOMATIC",
+            transit_matrix=False, solution_callback=None, matrix_store=None, reuse_matrix=True,
+            warm_start=None, max_matrix_bytes=None, matrix_dir=None, osrm_base_url=None,
+            osrm_session=None, neighbours=None, sparse_min_nodes=SPARSE_MIN_NODES):
+
+        self.metrics = SolveMetrics()
+
+        # The distance matrix of the last solve is extended rather than recomputed
+        previous_customers = self.customers if reuse_matrix else None
 
         self.fleet = Fleet(self.vehicles)
         self.customers = Customers(self.depot, self.orders)
         self.fleet.set_starts_ends()
 
-        self.city_graph.set_orders(self.orders)
-
         if centrality_check:
+            self.city_graph.set_orders(self.orders)
             self.priorities = self.city_graph.get_priorities()
 
         # for order in self.customers.orders:
@@ -348,8 +193,32 @@ class VRP:
         routing = pywrapcp.RoutingModel(manager)
 
         # Create callback fns for distances.
-        dist_fn = self.customers.return_dist_callback(method=edge_weight_type)
-        dist_fn_index = routing.RegisterTransitCallback(dist_fn)
+        # With transit_matrix the precomputed matrices are registered natively so the
+        # search never calls back into Python.
+        # Dense matrices larger than max_matrix_bytes are memory-mapped in matrix_dir.
+        # 'osrm' tables come from osrm_base_url (default constants.OSRM_BASE_URL) over
+        # osrm_session, e.g. one osrm.make_session() shared by every solve.
+        # With neighbours, problems of at least sparse_min_nodes nodes only keep the arcs
+        # of the k nearest neighbour graph in a sparse matrix (see _restrict_arcs()),
+        # smaller ones are solved densely.
+        sparse = neighbours is not None and self.customers.number >= sparse_min_nodes
+        if sparse:
+            with self.metrics.phase('matrix'):
+                dist_fn = self.customers.return_sparse_dist_callback(max_route_distance + 1, method=edge_weight_type,
+                                neighbours=neighbours, keep=set(self.fleet.starts) | set(self.fleet.ends))
+            dist_fn_index = routing.RegisterTransitCallback(dist_fn)
+        elif transit_matrix:
+            with self.metrics.phase('matrix'):
+                dist_mat = self.customers.return_dist_matrix(method=edge_weight_type, store=matrix_store,
+                                previous=previous_customers, max_matrix_bytes=max_matrix_bytes, matrix_dir=matrix_dir,
+                                osrm_base_url=osrm_base_url, osrm_session=osrm_session)
+            dist_fn_index = routing.RegisterTransitMatrix(transit_matrix_rows(dist_mat))
+        else:
+            with self.metrics.phase('matrix'):
+                dist_fn = self.customers.return_dist_callback(method=edge_weight_type, store=matrix_store,
+                                previous=previous_customers, max_matrix_bytes=max_matrix_bytes, matrix_dir=matrix_dir,
+                                osrm_base_url=osrm_base_url, osrm_session=osrm_session)
+            dist_fn_index = routing.RegisterTransitCallback(dist_fn)
         routing.SetArcCostEvaluatorOfAllVehicles(dist_fn_index)
 
         routing.AddDimension(
@@ -382,27 +251,36 @@ class VRP:
                     equalize_routes_penalty # penalty
                 )
 
-        print(
-            self.customers.number,  # int number
-            self.fleet.num_vehicles,  # int number
-            self.fleet.starts,  # List of int start depot
-            self.fleet.ends, 
+        logger.debug('%d customers, %d vehicles, starts %s, ends %s, capacities %s',
+            self.customers.number,
+            self.fleet.num_vehicles,
+            self.fleet.starts,
+            self.fleet.ends,
             self.fleet.capacities)
 
         # Create callback fns for service and transit-times.
-        serv_time_fn = self.customers.make_service_time_call_callback()
-        transit_time_fn = self.customers.make_transit_time_callback()
-
-        def tot_time_fn(from_index, to_index):
-            """
-            The time function we want is both transit time and service time.
-            """
-            # Convert from routing variable Index to distance matrix NodeIndex.
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return serv_time_fn(from_node, to_node) + transit_time_fn(from_node, to_node)
-
-        tot_time_fn_index = routing.RegisterTransitCallback(tot_time_fn)
+        if sparse:
+            with self.metrics.phase('matrix'):
+                tot_time_fn = self.customers.make_sparse_total_time_callback(total_transit_time + 1)
+            tot_time_fn_index = routing.RegisterTransitCallback(tot_time_fn)
+        elif transit_matrix:
+            with self.metrics.phase('matrix'):
+                tot_time_mat = transit_matrix_rows(self.customers.total_time_rows())
+            tot_time_fn_index = routing.RegisterTransitMatrix(tot_time_mat)
+        else:
+            serv_time_fn = self.customers.make_service_time_call_callback()
+            transit_time_fn = self.customers.make_transit_time_callback()
+
+            def tot_time_fn(from_index, to_index):
+                """
+                The time function we want is both transit time and service time.
+                """
+                # Convert from routing variable Index to distance matrix NodeIndex.
+                from_node = manager.IndexToNode(from_index)
+                to_node = manager.IndexToNode(to_index)
+                return int(serv_time_fn(from_node, to_node) + transit_time_fn(from_node, to_node))
+
+            tot_time_fn_index = routing.RegisterTransitCallback(tot_time_fn)
         routing.AddDimension(
             tot_time_fn_index,  # total time function callback
             max_wait_time, 
@@ -424,11 +302,15 @@ class VRP:
             routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.Start(vehicle_idx)))
             routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(vehicle_idx)))
 
-        delivery_fn = self.customers.return_delivery_callback()
-        delivery_fn_index = routing.RegisterUnaryTransitCallback(delivery_fn)
+        if transit_matrix:
+            delivery_fn_index = routing.RegisterUnaryTransitVector(self.customers.return_delivery_vector())
+            load_fn_index = routing.RegisterUnaryTransitVector(self.customers.return_load_vector())
+        else:
+            delivery_fn = self.customers.return_delivery_callback()
+            delivery_fn_index = routing.RegisterUnaryTransitCallback(delivery_fn)
 
-        load_fn = self.customers.return_load_callback()
-        load_fn_index = routing.RegisterUnaryTransitCallback(load_fn)
+            load_fn = self.customers.return_load_callback()
+            load_fn_index = routing.RegisterUnaryTransitCallback(load_fn)
 
         routing.AddDimensionWithVehicleCapacity(
             delivery_fn_index,
@@ -451,8 +333,9 @@ class VRP:
             index = routing.Start(vehicle_id)
             routing.solver().Add(deliveries_dimension.CumulVar(index) == loads_dimension.CumulVar(index))
 
+        penalties = self.customers.get_carryforward_penalties()
         for node in range(1, self.customers.number):
-            routing.AddDisjunction([manager.NodeToIndex(node)], int(self.customers.customers[node].carryforward_penalty))
+            routing.AddDisjunction([manager.NodeToIndex(node)], int(penalties[node - 1]))
 
         """
         SETTING PARAMETERS
@@ -471,6 +354,15 @@ class VRP:
         parameters.time_limit.FromSeconds(time_limit)
         # parameters.use_full_propagation = True    
 
+        # solution_callback(routing) is invoked for every improving solution found by the search
+        def on_solution():
+            self.metrics.add_solution(routing.CostVar().Value())
+            if solution_callback is not None:
+                solution_callback(routing)
+
+        routing.AddAtSolutionCallback(on_solution)
+        self.metrics.start_search()
+
         if isReroute: 
             parameters.local_search_metaheuristic = (helper.get_local_search_metaheuristic(rerouting_metaheuristic))
 
@@ -478,67 +370,292 @@ class VRP:
                 if order.status == 2 and order.type == 1:
                     routing.VehicleVar(manager.NodeToIndex(i+1)).SetValues([order.vehicle.vehicle_index])
 
+            curr_solution = self.routes_list.get_initial_routes()
+            logger.debug('initial routes: %s', curr_solution)
+            if sparse:
+                self._restrict_arcs(manager, routing, curr_solution)
+
             routing.CloseModelWithParameters(parameters)
 
-            curr_solution = self.routes_list.get_initial_routes()
-            print(curr_solution)
             initial_solution = routing.ReadAssignmentFromRoutes(curr_solution,True)
             solution = routing.SolveFromAssignmentWithParameters( initial_solution, parameters)
             # solution = routing.SolveWithParameters(parameters)
         
+        elif warm_start is not None:
+            # Start from the routes the stored locations were served on last time
+            initial_routes = warm_start.initial_routes(self.customers, self.fleet)
+            if sparse:
+                self._restrict_arcs(manager, routing, initial_routes)
+
+            routing.CloseModelWithParameters(parameters)
+
+            initial_solution = None
+            if initial_routes is not None:
+                initial_solution = routing.ReadAssignmentFromRoutes(initial_routes, True)
+            if initial_solution:
+                solution = routing.SolveFromAssignmentWithParameters(initial_solution, parameters)
+            else:
+                # Nothing stored yet, or the stored routes violate a constraint of today's problem
+                solution = routing.SolveWithParameters(parameters)
+
         else:
+            if sparse:
+                self._restrict_arcs(manager, routing)
             solution = routing.SolveWithParameters(parameters)
 
+        if sparse and (not solution or any(solution.Value(routing.NextVar(i)) == i for i in range(routing.Size()))):
+            # The pruned arcs may be the only way to serve some orders
+            logger.warning('Sparse solve of %d nodes dropped orders or found no solution, solving densely',
+                self.customers.number)
+            return self.process_VRP(isReroute=isReroute, centrality_check=centrality_check,
+                        edge_weight_type=edge_weight_type, time_limit=time_limit, total_transit_time=total_transit_time,
+                        max_wait_time=max_wait_time, max_route_distance=max_route_distance, equalize_routes=equalize_routes,
+                        equalize_routes_penalty=equalize_routes_penalty, first_sol_strategy=first_sol_strategy,
+                        initial_metaheuristic=initial_metaheuristic, rerouting_metaheuristic=rerouting_metaheuristic,
+                        transit_matrix=transit_matrix, solution_callback=solution_callback, matrix_store=matrix_store,
+                        reuse_matrix=reuse_matrix, warm_start=warm_start, max_matrix_bytes=max_matrix_bytes,
+                        matrix_dir=matrix_dir, osrm_base_url=osrm_base_url, osrm_session=osrm_session)
+
         if solution: 
             self.update_routed_order_status(manager, routing, solution)
             self.build_vehicle_routes(manager, routing, solution)
+            self.solve_limits = {'max_route_distance': max_route_distance, 'total_transit_time': total_transit_time,
+                                'max_wait_time': max_wait_time}
+            if warm_start is not None and not isReroute:
+                # Only full solves, whose routes start at the depot
+                warm_start.record(self.routes_list)
+            self.metrics.finish(solution.ObjectiveValue(), sum(order.status == 1 for order in self.customers.orders))
+            logger.info('process_VRP metrics: %s', self.metrics.to_json())
             return manager, routing, solution
         else:
-            print("NO SOLUTION FOUND")
+            self.metrics.finish(None, len(self.customers.orders))
+            logger.warning("NO SOLUTION FOUND")
+            logger.info('process_VRP metrics: %s', self.metrics.to_json())
             return None
 
-    def export_shapefile(self, shapefilename='_test'):
-        all_route_coords = []
-        all_route_awbs = []
-
-        route_list = self.get_routes()
-        for route_index, route_obj in route_list.items():
-            route_coords= []
-            route_awb = []
-            if route_obj == -1:
+    def _restrict_arcs(self, manager, routing, routes=None):
+        """
+        Take the arcs that are not in the sparse distance matrix out of the model, so
+        that neither the first solution strategy nor the local search evaluate them.
+        Every order can still end a route (or be left out), starting a route is not
+        restricted, and the arcs of routes (lists of node indices, e.g. the initial
+        routes of a reroute) are kept.
+        """
+        fixed = set(self.fleet.starts) | set(self.fleet.ends)
+        ends = [routing.End(vehicle_idx) for vehicle_idx in range(self.fleet.num_vehicles)]
+        route_arcs = {}
+        for route in routes or []:
+            for from_node, to_node in zip(route[:-1], route[1:]):
+                route_arcs.setdefault(from_node, set()).add(to_node)
+
+        for node in range(self.customers.number):
+            if node in fixed:
                 continue
-            for order in route_obj.route:
-                route_coords.append(order.coordinates)
-                if order.type == 0:
-                    continue
-                route_awb.append([order.AWB, order.coordinates])
-                    
-            all_route_coords.append(route_coords)
-            all_route_awbs.append(route_awb)
-
-        # print(all_route_coords)
-        # print(all_route_awbs)
-
-        geo_routes = []
-        data = pd.DataFrame({'Route': [str(i+1) for i in range(len(all_route_coords))]})
-        #http://router.project-osrm.org/route/v1/driving/77.586607,12.909694;77.652492,12.91763?overview=full&geometries=geojson
-        # osrm_url_base = "https://routing.openstreetmap.de/routed-bike/route/v1/driving/"
-        osrm_url_base = constants.OSRM_BASE_URL + "route/v1/driving/"
-
-        for route in all_route_coords:
-            points_list = []
-            for point in route:
-                points_list.append(str(point[1])  + "," + str(point[0]))
-            osrm_url = osrm_url_base + ";".join(points_list) + "?overview=full&geometries=geojson"
-            r = requests.get(osrm_url)
-            t = json.loads(r.text)
-            coordinates = t['routes'][0]['geometry']['coordinates']
-            points_list = []
-            for point in coordinates:
-                points_list.append(Point(point[0], point[1]))
-            geo_routes.append(LineString(points_list))
-
-        myGDF = gpd.GeoDataFrame(data, geometry=geo_routes)
-        # myGDF.to_file(filename='myshapefile_test.shp.zip', driver='ESRI Shapefile')
-        myGDF.to_file(os.path.join(os.path.dirname(__file__), '../shapefile/{0}.shp'.format(shapefilename)), mode='w')
+            nexts = (set(self.customers.neighbour_nodes(node).tolist()) | route_arcs.get(node, set())) - fixed
+            routing.NextVar(manager.NodeToIndex(node)).SetValues(sorted(manager.NodeToIndex(j) for j in nexts) + ends)
+
+    def _schedule(self, path_nodes, path):
+        """
+        Return the arrival time at every node of a route path (node indices path),
+        starting at the predicted time of its first node and waiting for the opening
+        of the time windows, as the Time dimension does.
+        """
+        start_time = getattr(path_nodes[0], 'predicted_time', None) or 0
+        cumulative = np.concatenate([[0], np.cumsum(self.customers.total_time(path[:-1], path[1:]))])
+        opens = np.array([n.start_time if (n.type == 1 and n.start_time and n.end_time) else -np.inf for n in path_nodes], dtype=float)
+        opens[0] = start_time
+        # arrival[i] = max(arrival[i-1] + time[i-1, i], opens[i])
+        return cumulative + np.maximum.accumulate(opens - cumulative)
+
+    def insert_order_fast(self, order):
+        """
+        Insert a single dynamic order into the live routes at its cheapest feasible
+        position, without running a search. Only the part of every route after its
+        current node is considered, and a position is feasible when it keeps the
+        vehicle load (Deliveries/Loads), the time windows of the order and of the
+        nodes after it, and the route distance, waiting and arrival times within the
+        limits of the last solve (see solve_limits). Delays are assumed to carry over
+        to every later node, so the time checks are conservative.
+
+        The order is added to the orders, the customers and the distance matrix, and
+        the route and the predicted times of its nodes are updated in place. A full
+        process_VRP(isReroute=True) is still needed from time to time to re-optimize
+        the routes.
+
+        Returns:
+            (vehicle index, position in Route.route) of the order, or None when it fits
+            nowhere, in which case it stays unrouted until the next process_VRP.
+        """
+        if self.customers is None or self.routes_list is None or self.solve_limits is None:
+            raise ValueError("insert_order_fast needs the routes of a previous process_VRP")
+        if getattr(self.customers, 'distmat', None) is None:
+            raise ValueError("insert_order_fast needs the distance matrix of the previous process_VRP")
+        limits = self.solve_limits
+
+        self.add_dynamic_order(order)
+        node = self.customers.add_order(order)
+        distmat = self.customers.distmat
+        order_time = self.customers.total_time
+        change, opens, closes = self.customers.node_limits()
+        order_open, order_close = opens[node], closes[node]
+
+        # The routes (whole, the Distance dimension counts the part already driven too)
+        # one after the other, every position of every route is checked at once
+        routes = []
+        nodes = []
+        for vehicle_idx, route in self.routes_list.routes_list.items():
+            vehicle = self.fleet.vehicle_list[vehicle_idx]
+            route_nodes = [vehicle.start, vehicle.end] if route == -1 else route.route
+            current_node = 0 if route == -1 else route.current_node
+            if len(route_nodes) - current_node >= 2:
+                routes.append((vehicle_idx, vehicle, route_nodes, current_node))
+                nodes.extend(route_nodes)
+        if not routes:
+            return None
+
+        lengths = np.array([len(route_nodes) for _, _, route_nodes, _ in routes])
+        route_of = np.repeat(np.arange(len(routes)), lengths)
+        rank = np.arange(len(nodes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        # Routes through nodes that are not in the last solve (e.g. delivered ones)
+        # can't be looked up in the matrix
+        positions = self.customers.node_positions()
+        indices = np.fromiter((positions.get(id(n), -1) for n in nodes), dtype=np.int64, count=len(nodes))
+        usable = np.bincount(route_of, weights=indices < 0, minlength=len(routes)) == 0
+        if not usable.any():
+            return None
+
+        # The driven part of the usable routes
+        current = np.array([current_node for _, _, _, current_node in routes])
+        same = (route_of[:-1] == route_of[1:]) & usable[route_of[:-1]]
+        driven_leg = same & (rank[1:] <= current[route_of[1:]])
+        driven = np.bincount(route_of[:-1][driven_leg], minlength=len(routes),
+                    weights=distmat[indices[:-1][driven_leg], indices[1:][driven_leg]])
+
+        # Their paths from the current node on
+        kept = usable[route_of] & (rank >= current[route_of])
+        path_route = route_of[kept]
+        path = indices[kept]
+        first = np.flatnonzero(np.r_[True, path_route[1:] != path_route[:-1]])
+        last = np.r_[first[1:] - 1, len(path) - 1]
+        by_route = np.zeros(len(routes), dtype=np.int64)
+        by_route[path_route[first]] = np.arange(len(first))
+        segment = by_route[path_route]
+
+        # Insertion after every node of the paths but the last
+        src = np.flatnonzero(segment[:-1] == segment[1:])
+        dst = src + 1
+        leg_segment = segment[src]
+        legs = distmat[path[src], path[dst]]
+        deltas = distmat[path[src], node] + distmat[node, path[dst]] - legs
+        length = driven[path_route[first]] + np.bincount(leg_segment, weights=legs, minlength=len(first))
+        feasible = length[leg_segment] + deltas <= limits['max_route_distance']
+
+        # Loads, as in insertion_peak_loads(): everything to deliver is on board at the start
+        changes = change[path]
+        loads = np.cumsum(changes)
+        loads -= (loads - changes)[first][segment]
+        loads -= np.bincount(segment, weights=np.minimum(changes, 0), minlength=len(first))[segment]
+        before = segment_maximum_accumulate(loads, segment)[src]
+        after = segment_maximum_accumulate(loads, segment, reverse=True)[dst]
+        if change[node] < 0:
+            new_peak = np.maximum(before - change[node], after)
+        else:
+            new_peak = np.maximum(np.maximum(before, loads[src] + change[node]), after + change[node])
+        capacities = np.array([vehicle.actual_volume_capacity for _, vehicle, _, _ in routes])
+        feasible &= new_peak <= capacities[path_route[src]]
+
+        # Arrival times, as in _schedule()
+        leg_times = np.zeros(len(path))
+        leg_times[dst] = order_time(path[src], path[dst])
+        cumulative = np.cumsum(leg_times)
+        cumulative -= cumulative[first][segment]
+        path_opens = opens[path]
+        path_opens[first] = [getattr(routes[r][2][routes[r][3]], 'predicted_time', None) or 0 for r in path_route[first]]
+        waits = path_opens - cumulative
+        waits = np.where(np.isfinite(waits), waits, waits[np.isfinite(waits)].min())
+        arrival = cumulative + segment_maximum_accumulate(waits, segment)
+
+        reach = arrival[src] + order_time(path[src], node)
+        order_arrival = np.maximum(reach, order_open)
+        delay = np.maximum(order_arrival + order_time(node, path[dst]) - arrival[dst], 0)
+        # Smallest slack of the nodes after each position. No delay beyond total_transit_time
+        # is feasible anyway, so the slack is capped there to keep it finite.
+        slack = np.minimum(closes[path] - arrival, limits['total_transit_time'])
+        slack_after = -segment_maximum_accumulate(-slack, segment, reverse=True)[dst]
+        feasible &= (order_arrival <= order_close) & (delay <= slack_after)
+        # The Time dimension bounds the wait at the order and every arrival time
+        feasible &= (order_arrival - reach <= limits['max_wait_time']) \
+            & (arrival[last][leg_segment] + delay <= limits['total_transit_time'])
+
+        cost = np.where(feasible, deltas, np.inf)
+        best = int(np.argmin(cost))
+        if not np.isfinite(cost[best]):
+            return None
+
+        vehicle_idx, vehicle, _, _ = routes[path_route[src[best]]]
+        pos = int(src[best] - first[leg_segment[best]])
+        route = self.routes_list.routes_list[vehicle_idx]
+        if route == -1:
+            route = Route([vehicle.start, order, vehicle.end], vehicle)
+            self.routes_list.routes_list[vehicle_idx] = route
+            vehicle.route = route
+        else:
+            route.route.insert(route.current_node + pos + 1, order)
+
+        order.vehicle = vehicle
+        order.status = 2
+        order.routing_time = time.time()
+
+        path_nodes = route.route[route.current_node:]
+        arrival = self._schedule(path_nodes, np.array([n.current_vrp_index for n in path_nodes]))
+        for n, t in zip(path_nodes[1:-1], arrival[1:-1].tolist()):
+            n.predicted_time = int(t)
+
+        return vehicle_idx, route.route.index(order)
+
+    def solve_anytime(self, on_solution=None, plateau_window=None, plateau_improvement=0.001, stop=None, **kwargs):
+        """
+        Run process_VRP, calling on_solution(Improvement) with the objective, elapsed
+        time and routes of every improved solution as soon as the solver finds it.
+
+        The search stops early when on_solution returns False, or when plateau_window
+        is given and the best objective improved by less than plateau_improvement
+        (relative) over the last plateau_window seconds, or at the first solution after
+        the stop event (threading.Event) is set. All other keyword arguments are
+        passed on to process_VRP.
+        """
+        from vehicle_routing.anytime import AnytimeMonitor, Plateau
+
+        plateau = Plateau(plateau_window, plateau_improvement) if plateau_window is not None else None
+        monitor = AnytimeMonitor(self, on_solution=on_solution, plateau=plateau, stop=stop)
+        return self.process_VRP(solution_callback=monitor, **kwargs)
+
+    def iter_solutions(self, plateau_window=None, plateau_improvement=0.001, **kwargs):
+        """
+        Generator version of solve_anytime, yielding every improved solution; see
+        anytime.iter_solutions.
+        """
+        from vehicle_routing import anytime
+        return anytime.iter_solutions(self, plateau_window=plateau_window,
+                    plateau_improvement=plateau_improvement, **kwargs)
+
+    def route_geometries(self, **kwargs):
+        from vehicle_routing import export
+        return export.route_geometries(self, **kwargs)
+
+    def export_routes(self, path, **kwargs):
+        from vehicle_routing import export
+        return export.export_routes(self, path, **kwargs)
+
+    def solve_portfolio(self, configs=None, time_limit=60, workers=None, **kwargs):
+        """
+        Race several first solution strategy / metaheuristic / seed combinations in
+        parallel processes and keep the best routes; see portfolio.solve_portfolio.
+        """
+        from vehicle_routing import portfolio
+        return portfolio.solve_portfolio(self, configs=configs, time_limit=time_limit, workers=workers, **kwargs)
 
+    def export_shapefile(self, shapefilename='_test', **kwargs):
+        from vehicle_routing import export
+        return export.export_shapefile(self, shapefilename=shapefilename, **kwargs)
\ No newline at end of file
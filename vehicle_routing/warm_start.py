@@ -0,0 +1,169 @@
+import os
+import numpy as np
+from vehicle_routing.customers import load_change, insertion_peak_loads
+
+class WarmStartStore():
+    """
+    An on-disk record of the route every delivery location was last served on, used
+    to build the initial assignment of the next solve. Territories change little
+    from one day to the next, so starting from yesterday's routes saves most of the
+    search the solver would otherwise spend rediscovering them.
+
+    Locations are keyed by their rounded coordinates, and for each the store keeps
+    the vehicle index and the relative position along that vehicle's route (0 at the
+    start, 1 at the end), so that routes recorded on different days interleave
+    sensibly. The store is kept in a single 'routes.npz' under path.
+
+        Attributes:
+        -----------
+        path: str
+            Directory holding the store file.
+        precision: int
+            Number of decimals the coordinates are rounded to before keying (5 ~ 1m).
+
+        Methods:
+        -----------
+        record(routes_list) -> None: Remember the routes of a solve.
+        initial_routes(customers, fleet) -> List[List[int]]: Routes to warm start the solver with.
+        clear() -> None: Delete the stored routes.
+    """
+    def __init__(self, path, precision=5):
+        self.path = path
+        self.precision = precision
+        self._routes = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self):
+        return os.path.join(self.path, 'routes.npz')
+
+    def _load(self):
+        if self._routes is None:
+            if os.path.exists(self._file()):
+                with np.load(self._file()) as data:
+                    keys, vehicle, position = data['keys'], data['vehicle'], data['position']
+            else:
+                keys, vehicle, position = np.empty((0, 2)), np.empty(0, dtype=np.int64), np.empty(0)
+            self._routes = {tuple(key): (v, p) for key, v, p in zip(keys.tolist(), vehicle.tolist(), position.tolist())}
+        return self._routes
+
+    def _save(self):
+        routes = self._routes
+        tmp_file = self._file() + '.tmp.npz'
+        np.savez(tmp_file, keys=np.array(list(routes.keys()), dtype=float).reshape(-1, 2),
+                vehicle=np.array([v for v, p in routes.values()], dtype=np.int64),
+                position=np.array([p for v, p in routes.values()], dtype=float))
+        os.replace(tmp_file, self._file())
+
+    def _keys(self, nodes):
+        keys = np.round(np.array([[float(n.lat), float(n.lon)] for n in nodes]).reshape(-1, 2), self.precision)
+        return [tuple(key) for key in keys.tolist()]
+
+    def record(self, routes_list):
+        """
+        Remember the vehicle and relative position of every order of the routes.
+        Locations that were not routed this time keep their earlier entry, and so do
+        those of routes that don't start at the depot (e.g. after a reroute, where a
+        route starts at the current order of its vehicle), as their positions are not
+        relative to the whole route.
+
+        Arguments:
+        ------------------
+        routes_list: RoutesList
+        """
+        routes = self._load()
+        for vehicle_idx, route in routes_list.routes_list.items():
+            if route == -1 or route.route[0].type != 0:
+                continue
+            orders = [node for node in route.route if node.type != 0]
+            for i, key in enumerate(self._keys(orders)):
+                routes[key] = (vehicle_idx, (i + 1) / (len(orders) + 1))
+        self._save()
+
+    def initial_routes(self, customers, fleet):
+        """
+        Build the initial routes of a solve from the stored ones.
+
+        Orders at known locations are placed on their previous vehicle in their
+        previous order. The remaining orders, and those that no longer fit their
+        vehicle, are added by cheapest insertion on the distance matrix of customers,
+        or left for the search to insert when it has none.
+
+        Arguments:
+        ------------------
+        customers: Customers
+            Normally with the distance matrix made (see Customers.make_distance_mat).
+        fleet: Fleet
+            With the starts and ends set.
+
+        Returns:
+            One list of node indices per vehicle (starts and ends excluded), ready for
+            RoutingModel.ReadAssignmentFromRoutes, or None when none of the locations is
+            in the store (the solver's first solution strategy does better then).
+        """
+        routes = self._load()
+        num_vehicles = fleet.num_vehicles
+        fixed = set(fleet.starts) | set(fleet.ends)
+
+        lookup = [routes.get(key, (-1, 0.)) for key in self._keys(customers.orders)]
+        vehicle = np.array([v for v, p in lookup], dtype=np.int64)
+        position = np.array([p for v, p in lookup], dtype=float)
+        if not (vehicle >= 0).any():
+            return None
+
+        initial = [[] for _ in range(num_vehicles)]
+        # Highest load along each route and load at its end. Deliveries are all loaded
+        # at the start, so appending one raises the load everywhere before it.
+        peak = [0] * num_vehicles
+        end_load = [0] * num_vehicles
+        unplaced = []
+
+        for i in np.lexsort((position, vehicle)).tolist():
+            node = i + 1
+            if node in fixed:
+                continue
+            v = int(vehicle[i])
+            change = load_change(customers.customers[node])
+            if not 0 <= v < num_vehicles:
+                unplaced.append(node)
+            elif change < 0 and peak[v] - change <= fleet.capacities[v]:
+                initial[v].append(node)
+                peak[v] -= change
+            elif change >= 0 and end_load[v] + change <= fleet.capacities[v]:
+                initial[v].append(node)
+                end_load[v] += change
+                peak[v] = max(peak[v], end_load[v])
+            else:
+                unplaced.append(node)
+
+        distmat = getattr(customers, 'distmat', None)
+        if distmat is None:
+            # Unperformed in the assignment, the search inserts them
+            return initial
+
+        for node in unplaced:
+            change = load_change(customers.customers[node])
+            best = None
+            for v in range(num_vehicles):
+                path = np.array([fleet.starts[v]] + initial[v] + [fleet.ends[v]])
+                # Added length of visiting node between each consecutive pair of the path
+                delta = distmat[path[:-1], node] + distmat[node, path[1:]] - distmat[path[:-1], path[1:]]
+
+                new_peak = insertion_peak_loads([load_change(customers.customers[n]) for n in path], change)
+                delta = np.where(new_peak <= fleet.capacities[v], delta, np.inf)
+                pos = int(np.argmin(delta))
+                if np.isfinite(delta[pos]) and (best is None or delta[pos] < best[0]):
+                    best = (delta[pos], v, pos)
+            # Orders that fit nowhere are left out of the assignment (unperformed)
+            if best is not None:
+                _, v, pos = best
+                initial[v].insert(pos, node)
+
+        return initial
+
+    def clear(self):
+        """
+        Delete the stored routes.
+        """
+        self._routes = None
+        if os.path.exists(self._file()):
+            os.remove(self._file())